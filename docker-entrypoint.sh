@@ -16,10 +16,6 @@ echo "PostgreSQL está listo!"
 echo "Ejecutando migraciones..."
 python manage.py migrate --noinput
 
-# Crear tabla de caché (ignora si ya existe)
-echo "Creando tabla de caché..."
-python manage.py createcachetable || true
-
 # Recoger archivos estáticos
 echo "Recolectando archivos estáticos..."
 python manage.py collectstatic --noinput
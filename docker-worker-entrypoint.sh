@@ -0,0 +1,19 @@
+#!/bin/bash
+set -e
+
+# Entrada de los workers (notificaciones, telegram_worker): no ejecutan
+# migrate ni collectstatic, eso lo hace solo el contenedor web
+
+echo "Esperando PostgreSQL..."
+while ! nc -z db 5432; do
+  sleep 0.1
+done
+
+# Esperar a que web haya aplicado las migraciones
+echo "Esperando migraciones..."
+until python manage.py migrate --check > /dev/null 2>&1; do
+  sleep 2
+done
+echo "Base de datos lista!"
+
+exec "$@"
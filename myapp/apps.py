@@ -10,6 +10,8 @@ class MyappConfig(AppConfig):
         Importa y registra los signals cuando la aplicación está lista.
 
         Este método se ejecuta una vez al iniciar Django y registra
-        automáticamente todos los signals definidos en signals.py
+        automáticamente todos los signals definidos en signals.py y las
+        comprobaciones de configuración de checks.py
         """
+        import myapp.checks  # noqa: F401
         import myapp.signals  # noqa: F401
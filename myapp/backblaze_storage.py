@@ -1,11 +1,30 @@
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from django.conf import settings
+import threading
 import uuid
 import os
 
+from .media_storage import TAMANO_PAGINA, ArchivoAlmacen, ArchivoSubido, MediaStorage
 
-class BackblazeStorage:
+# Subida multiparte: B2 exige partes de al menos 5 MB; los archivos por
+# encima del umbral se suben en partes de 5 MB, varias a la vez
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=5 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True,
+)
+
+# Carpetas del bucket para cada carpeta de MediaStorage
+CARPETAS_BUCKET = {'fotos': 'Fotos', 'miniaturas': 'miniaturas', 'videos': 'videos'}
+
+# Maximo de claves por llamada a delete_objects
+BORRAR_POR_LLAMADA = 1000
+
+
+class BackblazeStorage(MediaStorage):
     """
     Clase para gestionar la subida de archivos a Backblaze B2 usando S3 API.
     """
@@ -21,14 +40,19 @@ class BackblazeStorage:
         )
         self.bucket_name = settings.BACKBLAZE_BUCKET_NAME
 
-    def upload_file(self, file_obj, folder='Fotos', file_name=None):
+    @property
+    def nombre(self):
+        return self.bucket_name
+
+    def upload_file(self, file_obj, folder='Fotos', file_name=None, progreso=None):
         """
-        Sube un archivo a Backblaze B2.
+        Sube un archivo a Backblaze B2 (multiparte si supera el umbral de TRANSFER_CONFIG).
 
         Args:
             file_obj: Objeto de archivo de Django (UploadedFile)
             folder: Carpeta en el bucket ('Fotos' o 'videos')
             file_name: Nombre del archivo (opcional, se genera automáticamente si no se proporciona)
+            progreso: funcion opcional que recibe los bytes ya subidos
 
         Returns:
             str: URL pública del archivo subido o None si hay error
@@ -45,6 +69,17 @@ class BackblazeStorage:
             # Determinar el content type
             content_type = file_obj.content_type if hasattr(file_obj, 'content_type') else 'application/octet-stream'
 
+            # boto3 avisa de cada bloque enviado (desde varios hilos): se acumula
+            callback = None
+            if progreso:
+                subidos = [0]
+                lock = threading.Lock()
+
+                def callback(bytes_enviados):
+                    with lock:
+                        subidos[0] += bytes_enviados
+                        progreso(subidos[0])
+
             # Subir el archivo
             self.s3_client.upload_fileobj(
                 file_obj,
@@ -53,7 +88,9 @@ class BackblazeStorage:
                 ExtraArgs={
                     'ContentType': content_type,
                     'CacheControl': 'max-age=31536000',  # Cache por 1 año
-                }
+                },
+                Callback=callback,
+                Config=TRANSFER_CONFIG,
             )
 
             # Construir la URL pública
@@ -68,67 +105,115 @@ class BackblazeStorage:
             print(f"Error inesperado al subir archivo: {e}")
             return None
 
-    def delete_file(self, file_url):
-        """
-        Elimina un archivo de Backblaze B2.
+    # ==================== INTERFAZ MediaStorage ====================
 
-        Args:
-            file_url: URL completa del archivo a eliminar
+    def subir(self, fichero, carpeta, tipo='imagen', progreso=None):
+        """
+        Sube un archivo a la carpeta del bucket que corresponde a `carpeta`.
 
         Returns:
-            bool: True si se eliminó correctamente, False en caso contrario
+            ArchivoSubido: (URL pública, key), o None si hay error
         """
-        try:
-            # Extraer la clave (key) de la URL
-            # Ejemplo: https://asociacionanimales.s3.eu-central-003.backblazeb2.com/Fotos/imagen.jpg
-            # Extraemos: Fotos/imagen.jpg
-            parts = file_url.split(f"{self.bucket_name}.{settings.BACKBLAZE_ENDPOINT}/")
-            if len(parts) < 2:
-                print(f"URL no válida: {file_url}")
-                return False
-
-            key = parts[1]
-
-            # Eliminar el archivo
-            self.s3_client.delete_object(
-                Bucket=self.bucket_name,
-                Key=key
-            )
-
-            return True
-
-        except ClientError as e:
-            print(f"Error al eliminar archivo de Backblaze: {e}")
-            return False
-        except Exception as e:
-            print(f"Error inesperado al eliminar archivo: {e}")
-            return False
+        ext = os.path.splitext(getattr(fichero, 'name', '') or '')[1].lower()
+        folder = CARPETAS_BUCKET[carpeta]
+        file_name = f"{uuid.uuid4()}{ext}"
+        url = self.upload_file(fichero, folder=folder, file_name=file_name, progreso=progreso)
+        if not url:
+            return None
+        return ArchivoSubido(url, f"{folder}/{file_name}")
 
-    def upload_image(self, image_file, file_name=None):
+    def borrar(self, claves, tipo='imagen'):
         """
-        Sube una imagen a la carpeta Fotos.
-
-        Args:
-            image_file: Archivo de imagen
-            file_name: Nombre del archivo (opcional)
+        Elimina muchos archivos con delete_objects (hasta 1000 por llamada).
 
         Returns:
-            str: URL pública de la imagen subida
+            int: archivos eliminados
+        """
+        claves = list(claves)
+        borrados = 0
+        for inicio in range(0, len(claves), BORRAR_POR_LLAMADA):
+            lote = claves[inicio:inicio + BORRAR_POR_LLAMADA]
+            try:
+                result = self.s3_client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': clave} for clave in lote], 'Quiet': True},
+                )
+            except ClientError as e:
+                print(f"Error al eliminar archivos de Backblaze: {e}")
+                continue
+            # Con Quiet solo se devuelven los errores
+            borrados += len(lote) - len(result.get('Errors', []))
+        return borrados
+
+    def clave_desde_url(self, url):
         """
-        return self.upload_file(image_file, folder='Fotos', file_name=file_name)
+        Key de una URL pública del bucket.
+
+        Ejemplo: https://asociacionanimales.s3.eu-central-003.backblazeb2.com/Fotos/imagen.jpg
+        Key: Fotos/imagen.jpg
+        """
+        parts = (url or '').split(f"{self.bucket_name}.{settings.BACKBLAZE_ENDPOINT}/")
+        return parts[1] if len(parts) == 2 else None
+
+    def listar(self, carpeta, tipo='imagen'):
+        """Recorre la carpeta del bucket con list_objects_v2 (ContinuationToken)"""
+        paginador = self.s3_client.get_paginator('list_objects_v2')
+        paginas = paginador.paginate(
+            Bucket=self.bucket_name,
+            Prefix=f"{CARPETAS_BUCKET[carpeta]}/",
+            PaginationConfig={'PageSize': TAMANO_PAGINA},
+        )
+        for pagina in paginas:
+            yield [
+                ArchivoAlmacen(objeto['Key'], objeto['LastModified'], objeto['Size'])
+                for objeto in pagina.get('Contents', [])
+            ]
 
-    def upload_video(self, video_file, file_name=None):
+    def firmar_subida(self, folder, ext, content_type, expira=900):
         """
-        Sube un video a la carpeta videos.
+        URL prefirmada para que el navegador suba un archivo directamente a B2.
+
+        La API S3 de B2 no admite formularios POST con política, así que se
+        firma un PUT: la clave y el Content-Type forman parte de la firma.
 
         Args:
-            video_file: Archivo de video
-            file_name: Nombre del archivo (opcional)
+            folder: Carpeta en el bucket ('Fotos' o 'videos')
+            ext: Extensión del archivo (con punto)
+            content_type: Content-Type que debe enviar el navegador
+            expira: Segundos de validez de la firma
 
         Returns:
-            str: URL pública del video subido
+            dict: {'key', 'url': URL del PUT, 'cabeceras', 'public_url'} o None si hay error
         """
-        return self.upload_file(video_file, folder='videos', file_name=file_name)
+        try:
+            key = f"{folder}/{uuid.uuid4()}{ext}"
+            url = self.s3_client.generate_presigned_url(
+                'put_object',
+                Params={
+                    'Bucket': self.bucket_name,
+                    'Key': key,
+                    'ContentType': content_type,
+                },
+                ExpiresIn=expira,
+            )
+            return {
+                'key': key,
+                'url': url,
+                'cabeceras': {'Content-Type': content_type},
+                'public_url': f"https://{self.bucket_name}.{settings.BACKBLAZE_ENDPOINT}/{key}",
+            }
+        except ClientError as e:
+            print(f"Error al firmar la subida a Backblaze: {e}")
+            return None
+
+    def obtener_tamano(self, key):
+        """
+        Tamaño en bytes de un archivo del bucket (HEAD), o None si no existe.
+        """
+        try:
+            return self.s3_client.head_object(Bucket=self.bucket_name, Key=key)['ContentLength']
+        except ClientError:
+            return None
 
 
 # Instancia global para uso en views
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+# myapp/benchmark.py
+"""
+Benchmark de las paginas publicas y de los flujos de administracion
+
+Dos formas de medir los mismos escenarios (ESCENARIOS):
+
+- En proceso (medir_escenario): con el Client de Django sobre un conjunto de
+  datos sembrado con poblar_animales --offline. Mide latencia, consultas SQL
+  y bytes de cada respuesta. crear_animal sube los archivos a un storage
+  simulado (sin red).
+- Contra un servidor (medir_servidor): peticiones HTTP concurrentes a un
+  servidor ya arrancado (runserver, gunicorn), al estilo de wrk. Mide
+  latencia, peticiones por segundo y bytes; las consultas no se ven desde
+  fuera. Los escenarios que escriben (crear_animal, telegram_webhook) solo se
+  ejecutan en proceso.
+
+En proceso la BD es temporal, pero las caches serian las configuradas (con
+REDIS_URL, la de produccion): sembrar y crear animales sube la generacion
+real y el calentamiento guardaria paginas con animales sinteticos.
+caches_aisladas() sustituye 'default' y 'compartida' por caches en memoria
+durante toda la medicion.
+
+Lo ejecuta el comando: python manage.py benchmark (ver --help)
+"""
+
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from itertools import count
+from unittest.mock import patch
+
+import requests
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .media_storage import ArchivoSubido
+from .models import CreacionAnimales, RegistroAsociacion
+from .subida_medios import esperar_subidas
+
+# update_id de los updates falsos del webhook (muy por encima de los reales)
+_update_ids = count(10 ** 12)
+
+# Caches en memoria del proceso, solo para el benchmark en proceso
+CACHES_BENCHMARK = {
+    alias: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': f'benchmark-{alias}',
+        'KEY_PREFIX': 'benchmark',
+        'TIMEOUT': 300,
+    }
+    for alias in ('default', 'compartida')
+}
+
+
+def _vaciar_caches():
+    for alias in CACHES_BENCHMARK:
+        caches[alias].clear()
+
+
+@contextmanager
+def caches_aisladas():
+    """Usa CACHES_BENCHMARK (vacias al entrar y al salir) en vez de las caches configuradas"""
+    with override_settings(CACHES=CACHES_BENCHMARK):
+        _vaciar_caches()
+        try:
+            yield
+        finally:
+            _vaciar_caches()
+
+
+def _imagen_prueba():
+    """JPEG pequeno valido para el formulario de crear_animal"""
+    salida = BytesIO()
+    Image.new('RGB', (64, 48), (200, 120, 40)).save(salida, 'JPEG')
+    return SimpleUploadedFile('benchmark.jpg', salida.getvalue(), content_type='image/jpeg')
+
+
+# ==================== ESCENARIOS ====================
+# Cada escenario recibe el contexto del conjunto de datos y un random.Random
+# y devuelve la peticion: {'metodo', 'ruta', 'datos', 'cabeceras'}
+
+def _inicio(contexto, azar):
+    return {'ruta': reverse('inicio')}
+
+
+def _buscador_avanzado(contexto, azar):
+    return {'ruta': reverse('buscador_avanzado')}
+
+
+def _api_buscador(contexto, azar):
+    return {'ruta': reverse('api_buscador'), 'datos': {
+        'categoria': azar.choice(['perro', 'gato', 'otros']),
+        'provincia': azar.choice(contexto['provincias']),
+    }}
+
+
+def _resultados_busqueda(contexto, azar):
+    return {'ruta': reverse('resultados_busqueda'), 'datos': {
+        'q': azar.choice(['labrador', 'gato madrid', 'mestizo', 'cariñoso', 'persa valencia']),
+    }}
+
+
+def _vista_animal(contexto, azar):
+    return {'ruta': reverse('vista_animal', args=[azar.choice(contexto['animales'])])}
+
+
+def _sitemap_xml(contexto, azar):
+    return {'ruta': reverse('sitemap_xml')}
+
+
+def _sitemap_parte(contexto, azar):
+    return {'ruta': reverse('sitemap_parte_xml', args=[1])}
+
+
+def _crear_animal(contexto, azar):
+    return {
+        'metodo': 'post',
+        'ruta': reverse('crear_animal'),
+        'datos': {
+            'nombre': f'Benchmark {azar.randint(1, 10 ** 6)}',
+            'tipo_de_animal': 'Perro',
+            'raza': 'Mestizo',
+            'tamano': 'Mediano',
+            'email': 'benchmark@sintetica.test',
+            'telefono': '600000000',
+            'poblacion': 'Madrid',
+            'provincia': 'Madrid',
+            'codigo_postal': '28001',
+            'descripcion': 'Animal creado por el benchmark',
+            'imagenes': [_imagen_prueba()],
+        },
+        'cabeceras': {'X-Requested-With': 'XMLHttpRequest'},
+        'sesion_asociacion': True,
+    }
+
+
+def _telegram_webhook(contexto, azar):
+    update_id = next(_update_ids)
+    return {
+        'metodo': 'post',
+        'ruta': reverse('telegram_webhook'),
+        'json': {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'chat': {'id': azar.randint(1, 1000), 'type': 'private'},
+                'text': '/ayuda',
+            },
+        },
+    }
+
+
+# nombre: (funcion, solo_en_proceso)
+ESCENARIOS = {
+    'inicio': (_inicio, False),
+    'buscador_avanzado': (_buscador_avanzado, False),
+    'api_buscador': (_api_buscador, False),
+    'resultados_busqueda': (_resultados_busqueda, False),
+    'vista_animal': (_vista_animal, False),
+    'sitemap_xml': (_sitemap_xml, False),
+    'sitemap_parte': (_sitemap_parte, False),
+    'crear_animal': (_crear_animal, True),
+    'telegram_webhook': (_telegram_webhook, True),
+}
+
+
+def preparar_contexto(muestra=1000, semilla=42):
+    """Datos que necesitan los escenarios, leidos del conjunto sembrado"""
+    azar = random.Random(semilla)
+    ids = list(CreacionAnimales.objects.filter(visible=True).order_by('-id').values_list('id', flat=True)[:muestra * 10])
+    provincias = list(CreacionAnimales.objects.order_by().values_list('provincia', flat=True).distinct()[:50])
+    return {
+        'animales': azar.sample(ids, min(muestra, len(ids))) or [0],
+        'provincias': provincias or ['Madrid'],
+        'asociacion': RegistroAsociacion.objects.filter(estado='activa').order_by('id').first(),
+        'total_animales': CreacionAnimales.objects.count(),
+    }
+
+
+# ==================== MEDICION ====================
+
+def percentil(valores, p):
+    """Percentil p (0-100) con interpolacion lineal"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicion = (len(ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicion - inferior)
+
+
+def _resumen(nombre, latencias, estados, bytes_respuestas, consultas=None, duracion=None):
+    resultado = {
+        'escenario': nombre,
+        'peticiones': len(latencias),
+        'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+        'p95_ms': round(percentil(latencias, 95) * 1000, 2),
+        'media_ms': round(statistics.fmean(latencias) * 1000, 2) if latencias else 0.0,
+        'bytes': round(statistics.fmean(bytes_respuestas)) if bytes_respuestas else 0,
+        'errores': sum(1 for estado in estados if estado >= 400),
+    }
+    if consultas is not None:
+        resultado['consultas'] = round(statistics.fmean(consultas), 1) if consultas else 0.0
+        resultado['consultas_max'] = max(consultas, default=0)
+    if duracion:
+        resultado['peticiones_por_segundo'] = round(len(latencias) / duracion, 1)
+    return resultado
+
+
+def _cliente(contexto, peticion):
+    cliente = Client()
+    asociacion = contexto['asociacion']
+    if peticion.get('sesion_asociacion') and asociacion:
+        sesion = cliente.session
+        sesion['esta_logueado'] = True
+        sesion.save()
+        cliente.cookies['asociacion_id'] = str(asociacion.id)
+    return cliente
+
+
+def _ejecutar(cliente, peticion):
+    """Lanza una peticion con el Client y devuelve la respuesta completa"""
+    metodo = getattr(cliente, peticion.get('metodo', 'get'))
+    cabeceras = peticion.get('cabeceras', {})
+    if 'json' in peticion:
+        respuesta = metodo(peticion['ruta'], json.dumps(peticion['json']), content_type='application/json', headers=cabeceras)
+    else:
+        respuesta = metodo(peticion['ruta'], peticion.get('datos', {}), headers=cabeceras)
+    if respuesta.streaming:
+        contenido = b''.join(respuesta.streaming_content)
+    else:
+        contenido = respuesta.content
+    return respuesta.status_code, len(contenido)
+
+
+def _storage_simulado():
+    """Sustituye el almacen de las subidas de crear_animal por URLs fijas"""
+    urls = {
+        'fotos': 'https://placehold.co/800x600.webp?text=benchmark',
+        'miniaturas': 'https://placehold.co/480x480.webp?text=benchmark',
+        'videos': 'https://placehold.co/video.mp4',
+    }
+    simulado = patch('myapp.subida_medios.obtener_storage')
+    storage = simulado.start().return_value
+    storage.subir.side_effect = lambda fichero, carpeta, *args, **kwargs: ArchivoSubido(urls[carpeta], '')
+    return simulado
+
+
+def medir_escenario(nombre, contexto, repeticiones=50, calentamiento=3, semilla=42):
+    """
+    Mide un escenario en proceso con el Client de Django.
+
+    Las primeras `calentamiento` peticiones no cuentan (llenan las caches).
+
+    Returns:
+        dict: peticiones, p50_ms, p95_ms, media_ms, bytes, errores, consultas, consultas_max
+    """
+    funcion, _ = ESCENARIOS[nombre]
+    azar = random.Random(semilla)
+    latencias, estados, tamanos, consultas = [], [], [], []
+
+    simulado = _storage_simulado()
+    try:
+        for i in range(calentamiento + repeticiones):
+            peticion = funcion(contexto, azar)
+            cliente = _cliente(contexto, peticion)
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                estado, tamano = _ejecutar(cliente, peticion)
+                duracion = time.perf_counter() - inicio
+            if i < calentamiento:
+                continue
+            latencias.append(duracion)
+            estados.append(estado)
+            tamanos.append(tamano)
+            consultas.append(len(capturadas))
+    finally:
+        # Las subidas de crear_animal siguen en segundo plano: que terminen
+        # antes de quitar el storage simulado
+        esperar_subidas()
+        simulado.stop()
+
+    return _resumen(nombre, latencias, estados, tamanos, consultas=consultas)
+
+
+def medir_servidor(nombre, contexto, url_base, peticiones=200, concurrencia=10, semilla=42, timeout=30):
+    """
+    Mide un escenario de solo lectura contra un servidor HTTP en marcha.
+
+    Returns:
+        dict: peticiones, p50_ms, p95_ms, media_ms, bytes, errores, peticiones_por_segundo
+    """
+    funcion, solo_en_proceso = ESCENARIOS[nombre]
+    if solo_en_proceso:
+        raise ValueError(f"El escenario {nombre} solo se puede medir en proceso")
+    azar = random.Random(semilla)
+    lote = [funcion(contexto, azar) for _ in range(peticiones)]
+    url_base = url_base.rstrip('/')
+
+    sesiones = {}
+
+    def lanzar(peticion):
+        # Una sesion (conexiones keep-alive) por hilo, como cada conexion de wrk
+        sesion = sesiones.setdefault(threading.get_ident(), requests.Session())
+        inicio = time.perf_counter()
+        try:
+            respuesta = sesion.get(url_base + peticion['ruta'], params=peticion.get('datos'), timeout=timeout)
+            tamano = len(respuesta.content)
+            estado = respuesta.status_code
+        except requests.RequestException:
+            tamano, estado = 0, 599
+        return time.perf_counter() - inicio, estado, tamano
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concurrencia, thread_name_prefix='benchmark') as executor:
+        resultados = list(executor.map(lanzar, lote))
+    duracion = time.perf_counter() - inicio
+    for sesion in sesiones.values():
+        sesion.close()
+
+    latencias, estados, tamanos = zip(*resultados) if resultados else ((), (), ())
+    return _resumen(nombre, list(latencias), list(estados), list(tamanos), duracion=duracion)
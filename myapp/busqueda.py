@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# myapp/busqueda.py
+"""
+Motor de busqueda facetada en servidor para el buscador avanzado
+
+En lugar de enviar todo el catalogo al navegador, se precalcula (una vez por
+generacion de cache) un indice invertido en memoria:
+
+    faceta -> valor -> mascara de bits con las posiciones de los animales
+
+Las posiciones siguen el orden de publicacion (mas recientes primero), asi
+que filtrar es hacer AND de enteros, contar es int.bit_count() y paginar es
+recorrer los bits activos del resultado. Solo se consulta la BD para
+construir el indice y para serializar los animales de la pagina pedida.
+
+El buscador solo muestra animales en adopcion; el feed de inicio tambien
+lista los adoptados, asi que sus facetas salen de un segundo indice que los
+incluye (incluir_adoptados=True, con su propia clave de cache).
+"""
+
+from .cache_animales import obtener_o_calcular
+from .models import CreacionAnimales
+
+# Facetas que se indexan (nombre del filtro -> campo del modelo)
+FACETAS = {
+    'categoria': None,  # Derivada de tipo_de_animal (perro/gato/otros)
+    'provincia': 'provincia',
+    'raza': 'raza',
+    'color': 'color',
+    'tamano': 'tamano',
+    'tipo_animal': 'tipo_de_animal',
+}
+
+POR_PAGINA_BUSQUEDA = 12
+POR_PAGINA_BUSQUEDA_MAXIMO = 60
+
+INDICE_CACHE_KEY = 'busqueda_indice_v1'
+INDICE_FEED_CACHE_KEY = 'busqueda_indice_feed_v1'
+INDICE_CACHE_TIMEOUT = 600
+
+
+def categoria_de_tipo(tipo_de_animal):
+    """Clasifica el tipo de animal en perro, gato u otros"""
+    tipo_lower = (tipo_de_animal or '').lower()
+    if 'perro' in tipo_lower:
+        return 'perro'
+    if 'gato' in tipo_lower:
+        return 'gato'
+    return 'otros'
+
+
+def _mascara_desde_posiciones(posiciones, total):
+    """Construye un entero cuyos bits activos son las posiciones dadas"""
+    bits = bytearray((total + 7) // 8)
+    for posicion in posiciones:
+        bits[posicion >> 3] |= 1 << (posicion & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def construir_indice(incluir_adoptados=False):
+    """Lee los animales visibles (y sin adoptar, salvo incluir_adoptados) y construye el indice de facetas"""
+    filas = CreacionAnimales.objects.filter(visible=True)
+    if not incluir_adoptados:
+        filas = filas.filter(adoptado=False)
+    filas = filas.order_by('-fecha_creacion', '-id').values_list(
+        'id', 'tipo_de_animal', 'raza', 'color', 'provincia', 'tamano'
+    )
+
+    ids = []
+    posiciones = {faceta: {} for faceta in FACETAS}
+    for posicion, (animal_id, tipo, raza, color, provincia, tamano) in enumerate(filas.iterator()):
+        ids.append(animal_id)
+        valores = {
+            'categoria': categoria_de_tipo(tipo),
+            'provincia': provincia,
+            'raza': raza,
+            'color': color,
+            'tamano': tamano,
+            'tipo_animal': tipo,
+        }
+        for faceta, valor in valores.items():
+            valor = (valor or '').strip()
+            if valor:
+                posiciones[faceta].setdefault(valor, []).append(posicion)
+
+    total = len(ids)
+    return {
+        'ids': ids,
+        'total': total,
+        'mascaras': {
+            faceta: {
+                valor: _mascara_desde_posiciones(lista, total)
+                for valor, lista in valores.items()
+            }
+            for faceta, valores in posiciones.items()
+        },
+    }
+
+
+def obtener_indice(incluir_adoptados=False):
+    """Devuelve el indice de la generacion actual (se reconstruye al invalidar)"""
+    return obtener_o_calcular(
+        INDICE_FEED_CACHE_KEY if incluir_adoptados else INDICE_CACHE_KEY,
+        lambda: construir_indice(incluir_adoptados),
+        timeout=INDICE_CACHE_TIMEOUT,
+        metrica='buscador',
+    )
+
+
+def limpiar_filtros_busqueda(datos):
+    """Extrae de un QueryDict/dict solo las facetas soportadas y no vacias"""
+    filtros = {}
+    for faceta in FACETAS:
+        valor = (datos.get(faceta) or '').strip()
+        if valor and not (faceta == 'categoria' and valor == 'todos'):
+            filtros[faceta] = valor
+    return filtros
+
+
+def _mascara_filtros(indice, filtros, excluir=None):
+    """AND de las mascaras de todos los filtros salvo `excluir`"""
+    mascara = (1 << indice['total']) - 1
+    for faceta, valor in filtros.items():
+        if faceta != excluir:
+            mascara &= indice['mascaras'][faceta].get(valor, 0)
+    return mascara
+
+
+def _posiciones_activas(mascara, desde, cantidad):
+    """Devuelve `cantidad` posiciones con bit activo saltando las `desde` primeras"""
+    if cantidad <= 0 or not mascara:
+        return []
+    datos = mascara.to_bytes((mascara.bit_length() + 7) // 8, 'little')
+    posiciones = []
+    vistos = 0
+    for indice_byte, byte in enumerate(datos):
+        if not byte:
+            continue
+        activos = byte.bit_count()
+        if vistos + activos <= desde:
+            vistos += activos
+            continue
+        for bit in range(8):
+            if byte >> bit & 1:
+                if vistos >= desde:
+                    posiciones.append(indice_byte * 8 + bit)
+                    if len(posiciones) == cantidad:
+                        return posiciones
+                vistos += 1
+    return posiciones
+
+
+def serializar_animal_busqueda(animal):
+    """Convierte un animal en el diccionario que devuelve la API de busqueda"""
+    descripcion = animal.descripcion or ''
+    return {
+        'id': animal.id,
+        'nombre': animal.nombre,
+        'tipo_de_animal': animal.tipo_de_animal,
+        'raza': animal.raza or 'Sin especificar',
+        'color': animal.color or 'Sin especificar',
+        'tamano': animal.tamano or '',
+        'provincia': animal.provincia or 'Sin especificar',
+        'poblacion': animal.poblacion or 'Sin especificar',
+        'categoria': categoria_de_tipo(animal.tipo_de_animal),
+        'descripcion': descripcion[:100] + '...' if len(descripcion) > 100 else descripcion,
+        'imagen_url': animal.get_primera_imagen(),
+        'asociacion_nombre': animal.asociacion.nombre,
+    }
+
+
+def buscar(filtros=None, pagina=1, por_pagina=POR_PAGINA_BUSQUEDA, incluir_adoptados=False):
+    """
+    Ejecuta una busqueda facetada.
+
+    Con incluir_adoptados=True busca sobre la misma poblacion que el feed
+    de inicio (visibles, adoptados o no).
+
+    Returns:
+        dict: {
+            'total': numero de resultados,
+            'pagina', 'por_pagina', 'paginas',
+            'animales': resultados de la pagina pedida,
+            'facetas': {faceta: {valor: contador}} (cada faceta ignora su
+                       propio filtro, para poder cambiar de valor)
+        }
+    """
+    filtros = filtros or {}
+    pagina = max(1, int(pagina))
+    por_pagina = max(0, min(int(por_pagina), POR_PAGINA_BUSQUEDA_MAXIMO))
+
+    indice = obtener_indice(incluir_adoptados)
+    resultado = _mascara_filtros(indice, filtros)
+    total = resultado.bit_count()
+
+    facetas = {}
+    for faceta, mascaras in indice['mascaras'].items():
+        base = _mascara_filtros(indice, filtros, excluir=faceta)
+        conteos = {}
+        for valor, mascara in mascaras.items():
+            cantidad = (base & mascara).bit_count()
+            if cantidad:
+                conteos[valor] = cantidad
+        facetas[faceta] = dict(sorted(conteos.items()))
+
+    posiciones = _posiciones_activas(resultado, (pagina - 1) * por_pagina, por_pagina)
+    ids_pagina = [indice['ids'][posicion] for posicion in posiciones]
+    animales_por_id = CreacionAnimales.objects.select_related('asociacion').prefetch_related(
+        'imagenes'
+    ).in_bulk(ids_pagina)
+
+    return {
+        'total': total,
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'paginas': -(-total // por_pagina) if por_pagina else 0,
+        'animales': [
+            serializar_animal_busqueda(animales_por_id[animal_id])
+            for animal_id in ids_pagina
+            if animal_id in animales_por_id
+        ],
+        'facetas': facetas,
+    }
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+# myapp/cache_animales.py
+"""
+Espacio de nombres versionado para el cache de animales
+
+Todas las entradas de cache que dependen de los animales (inicio, buscador,
+paginas del feed...) se guardan con la "generacion" actual como version de
+Django cache. Invalidar consiste en incrementar un unico contador: las
+entradas de la generacion anterior dejan de leerse y caducan solas.
+
+Ademas, las invalidaciones se agrupan: dentro de una peticion (ver
+InvalidacionCacheMiddleware) o de una transaccion solo se incrementa la
+generacion una vez, al terminar, aunque se guarden decenas de objetos.
+
+obtener_o_calcular() protege las listas caras (inicio, buscador) frente a
+estampidas: cuando un valor caduca o se invalida solo un worker lo recalcula
+(lease en cache) mientras el resto sigue sirviendo el valor anterior.
+"""
+
+import contextvars
+import logging
+import math
+import random
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Clave del contador de generacion (no caduca)
+GENERACION_KEY = 'animales_generacion'
+
+# Tiempo extra que se conserva un valor caducado para servirlo mientras se recalcula
+MARGEN_OBSOLETO = 600
+
+# Duracion maxima del lease de recalculo (si el worker muere, otro lo retoma)
+DURACION_LEASE = 30
+
+# Factor del refresco anticipado probabilistico (1.0 = recomendado en XFetch)
+BETA_REFRESCO = 1.0
+
+# Espera cuando otro worker recalcula y no hay ningun valor anterior que servir
+ESPERA_PASO = 0.05
+ESPERA_INTENTOS = 40
+
+# Eventos del camino de recalculo que se contabilizan
+EVENTOS_METRICAS = ('recalculo', 'recalculo_anticipado', 'obsoleto_servido', 'espera', 'recalculo_sin_lease')
+
+# Ambito de agrupacion activo (None si no hay ninguno)
+_ambito_agrupado = contextvars.ContextVar('invalidacion_cache_ambito', default=None)
+
+
+def obtener_generacion():
+    """Devuelve la generacion actual del cache de animales"""
+    generacion = cache.get(GENERACION_KEY)
+    if generacion is None:
+        # Semilla basada en el reloj: si el contador se pierde (cull, reinicio)
+        # nunca se vuelve a una generacion antigua con datos obsoletos
+        cache.add(GENERACION_KEY, int(time.time() * 1000), timeout=None)
+        generacion = cache.get(GENERACION_KEY, int(time.time() * 1000))
+    return generacion
+
+
+def obtener_de_cache(clave, default=None):
+    """Lee una clave dentro de la generacion actual"""
+    return cache.get(clave, default, version=obtener_generacion())
+
+
+def guardar_en_cache(clave, valor, timeout=300):
+    """Guarda una clave dentro de la generacion actual"""
+    cache.set(clave, valor, timeout=timeout, version=obtener_generacion())
+
+
+def incrementar_generacion():
+    """Invalida de golpe todo el cache de animales (una sola escritura)"""
+    try:
+        generacion = cache.incr(GENERACION_KEY)
+    except ValueError:
+        # El contador no existe todavia: crearlo ya "incrementado"
+        generacion = int(time.time() * 1000)
+        cache.set(GENERACION_KEY, generacion, timeout=None)
+    logger.info(f"Cache de animales invalidado (generacion {generacion})")
+    return generacion
+
+
+def _invalidacion_ya_programada(conexion):
+    """
+    Comprueba si la transaccion actual ya tiene la invalidacion pendiente.
+
+    Solo cuenta si se programo en este savepoint o en uno exterior: si se
+    programo en un savepoint interior podria descartarse con su rollback.
+    """
+    savepoints_actuales = set(conexion.savepoint_ids)
+    return any(
+        funcion is incrementar_generacion and savepoints <= savepoints_actuales
+        for savepoints, funcion, *_ in conexion.run_on_commit
+    )
+
+
+def programar_invalidacion():
+    """
+    Pide invalidar el cache de animales.
+
+    - Dentro de invalidacion_agrupada(): se marca y se ejecuta al salir.
+    - Dentro de una transaccion: se ejecuta una sola vez tras el commit
+      (y nunca si hay rollback).
+    - En autocommit: se ejecuta inmediatamente.
+    """
+    ambito = _ambito_agrupado.get()
+    if ambito is not None:
+        ambito['pendiente'] = True
+        return
+
+    conexion = transaction.get_connection()
+    if conexion.in_atomic_block and _invalidacion_ya_programada(conexion):
+        return
+    transaction.on_commit(incrementar_generacion)
+
+
+@contextmanager
+def invalidacion_agrupada(invalidar_al_salir=True):
+    """
+    Agrupa todas las invalidaciones del bloque en una sola.
+
+    Uso:
+        with invalidacion_agrupada():
+            for imagen in imagenes:
+                ImagenAnimal.objects.create(...)
+
+    Con invalidar_al_salir=False las invalidaciones del bloque se descartan:
+    el llamador se compromete a invalidar el mismo mas tarde (por ejemplo
+    subida_medios, una vez por tarea y no una por archivo).
+    """
+    if _ambito_agrupado.get() is not None:
+        # Ya hay un ambito exterior que se encargara de invalidar
+        yield
+        return
+
+    ambito = {'pendiente': False}
+    token = _ambito_agrupado.set(ambito)
+    try:
+        yield
+    finally:
+        _ambito_agrupado.reset(token)
+        if ambito['pendiente'] and invalidar_al_salir:
+            programar_invalidacion()
+
+
+# ==================== STALE-WHILE-REVALIDATE ====================
+
+def registrar_metrica(metrica, evento):
+    """Incrementa el contador compartido de un evento del camino de recalculo"""
+    clave = f'cache_metricas:{metrica}:{evento}'
+    try:
+        cache.incr(clave)
+    except ValueError:
+        if not cache.add(clave, 1, timeout=None):
+            cache.incr(clave)
+
+
+def obtener_metricas(metricas=('inicio_feed', 'buscador')):
+    """Devuelve {metrica: {evento: contador}} con los eventos registrados"""
+    return {
+        metrica: {
+            evento: cache.get(f'cache_metricas:{metrica}:{evento}', 0)
+            for evento in EVENTOS_METRICAS
+        }
+        for metrica in metricas
+    }
+
+
+def reiniciar_metricas(metricas=('inicio_feed', 'buscador')):
+    """Pone a cero los contadores de metricas"""
+    cache.delete_many([
+        f'cache_metricas:{metrica}:{evento}'
+        for metrica in metricas
+        for evento in EVENTOS_METRICAS
+    ])
+
+
+def _debe_refrescar(sobre, ahora):
+    """
+    Refresco anticipado probabilistico (XFetch): cuanto mas cerca de caducar
+    y mas caro de calcular es el valor, mas probable es recalcularlo antes.
+    """
+    azar = math.log(1.0 - random.random())  # <= 0
+    return ahora - sobre['duracion'] * BETA_REFRESCO * azar >= sobre['expira']
+
+
+def _recalcular(clave, calcular, timeout, generacion, metrica, evento):
+    """Calcula el valor, lo guarda (con su copia 'anterior') y libera el lease"""
+    registrar_metrica(metrica, evento)
+    inicio = time.time()
+    try:
+        valor = calcular()
+        fin = time.time()
+        sobre = {'valor': valor, 'expira': fin + timeout, 'duracion': fin - inicio}
+        cache.set(clave, sobre, timeout=timeout + MARGEN_OBSOLETO, version=generacion)
+        # Copia independiente de la generacion para servirla tras una invalidacion
+        cache.set(f'{clave}:anterior', sobre, timeout=timeout + MARGEN_OBSOLETO)
+    finally:
+        cache.delete(f'{clave}:lease', version=generacion)
+    logger.info(f"Cache '{clave}' recalculado en {fin - inicio:.3f}s ({evento})")
+    return valor
+
+
+def obtener_o_calcular(clave, calcular, timeout=300, metrica='general'):
+    """
+    Devuelve el valor cacheado de `clave` o lo calcula con `calcular()`.
+
+    - Si el valor sigue fresco se devuelve directamente.
+    - Si ha caducado, se ha invalidado o toca refrescarlo antes de tiempo, solo
+      el worker que consigue el lease lo recalcula; los demas devuelven el
+      valor anterior (stale-while-revalidate).
+    - Si no hay ningun valor anterior, los demas esperan brevemente al que
+      recalcula y, como ultimo recurso, lo calculan ellos mismos.
+
+    Cada paso por el camino de recalculo se contabiliza en `metrica`.
+    """
+    generacion = obtener_generacion()
+    sobre = cache.get(clave, version=generacion)
+    ahora = time.time()
+
+    if sobre is not None:
+        if not _debe_refrescar(sobre, ahora):
+            return sobre['valor']
+        evento = 'recalculo' if ahora >= sobre['expira'] else 'recalculo_anticipado'
+        if cache.add(f'{clave}:lease', 1, timeout=DURACION_LEASE, version=generacion):
+            return _recalcular(clave, calcular, timeout, generacion, metrica, evento)
+        registrar_metrica(metrica, 'obsoleto_servido')
+        return sobre['valor']
+
+    # No hay valor en esta generacion (primera vez o invalidado)
+    if cache.add(f'{clave}:lease', 1, timeout=DURACION_LEASE, version=generacion):
+        return _recalcular(clave, calcular, timeout, generacion, metrica, 'recalculo')
+
+    anterior = cache.get(f'{clave}:anterior')
+    if anterior is not None:
+        registrar_metrica(metrica, 'obsoleto_servido')
+        return anterior['valor']
+
+    # Otro worker esta calculando y no hay nada que servir: esperarle un poco
+    for _ in range(ESPERA_INTENTOS):
+        time.sleep(ESPERA_PASO)
+        sobre = cache.get(clave, version=generacion)
+        if sobre is not None:
+            registrar_metrica(metrica, 'espera')
+            return sobre['valor']
+
+    registrar_metrica(metrica, 'recalculo_sin_lease')
+    return calcular()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# myapp/cache_backends.py
+"""
+Backend de cache en dos niveles (L1 en memoria + L2 compartido)
+
+- L1: LRU en la memoria de cada proceso de gunicorn, con TTL corto. Un acierto
+  en L1 no hace I/O ni deserializa nada: devuelve el mismo objeto guardado.
+- L2: cualquier otro backend de CACHES (fichero, Redis...) compartido por
+  todos los workers. Es la fuente de verdad.
+
+La invalidacion entre workers se hace con la generacion de cache_animales.py:
+la clave del contador se excluye de L1 (siempre se lee de L2) y todas las
+demas claves llevan la generacion como version, asi que al incrementarla los
+workers dejan de pedir las entradas antiguas de su L1, que caducan solas.
+
+IMPORTANTE: los valores servidos desde L1 son compartidos entre peticiones;
+no deben modificarse despues de leerlos de la cache.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Almacenes L1 por proceso (Django crea un backend por hilo, como en LocMemCache)
+_almacenes_l1 = {}
+_locks_l1 = {}
+
+_NO_ENCONTRADO = object()
+
+
+class CacheDosNiveles(BaseCache):
+    """
+    Opciones (en OPTIONS):
+        L2: alias de CACHES que actua como cache compartida (obligatorio)
+        L1_MAX_ENTRIES: numero maximo de entradas en memoria por proceso
+        L1_TIMEOUT: segundos maximos que una entrada vive en L1
+        L1_EXCLUIR: claves que nunca se guardan en L1 (p.ej. contadores)
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        opciones = params.get('OPTIONS', {})
+        self._alias_l2 = opciones['L2']
+        self._l1_max_entries = int(opciones.get('L1_MAX_ENTRIES', 500))
+        self._l1_timeout = float(opciones.get('L1_TIMEOUT', 30))
+        self._l1_excluir = frozenset(opciones.get('L1_EXCLUIR', ()))
+
+        self._l1 = _almacenes_l1.setdefault(location, OrderedDict())
+        self._lock = _locks_l1.setdefault(location, threading.Lock())
+
+    @property
+    def l2(self):
+        return caches[self._alias_l2]
+
+    # ==================== NIVEL 1 (MEMORIA DEL PROCESO) ====================
+
+    def _l1_get(self, clave):
+        with self._lock:
+            entrada = self._l1.get(clave)
+            if entrada is None:
+                return _NO_ENCONTRADO
+            expira, valor = entrada
+            if expira <= time.monotonic():
+                del self._l1[clave]
+                return _NO_ENCONTRADO
+            self._l1.move_to_end(clave)
+            return valor
+
+    def _l1_set(self, key, clave, valor, timeout=DEFAULT_TIMEOUT):
+        if key in self._l1_excluir:
+            return
+        ttl = self._l1_timeout
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is not None:
+            if timeout <= 0:
+                self._l1_delete(clave)
+                return
+            ttl = min(ttl, timeout - time.time())
+        with self._lock:
+            self._l1[clave] = (time.monotonic() + ttl, valor)
+            self._l1.move_to_end(clave)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, clave):
+        with self._lock:
+            self._l1.pop(clave, None)
+
+    # ==================== API DE DJANGO CACHE ====================
+
+    def get(self, key, default=None, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        if key not in self._l1_excluir:
+            valor = self._l1_get(clave)
+            if valor is not _NO_ENCONTRADO:
+                return valor
+
+        valor = self.l2.get(key, _NO_ENCONTRADO, version=version)
+        if valor is _NO_ENCONTRADO:
+            return default
+        self._l1_set(key, clave, valor)
+        return valor
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        self.l2.set(key, value, timeout=timeout, version=version)
+        self._l1_set(key, clave, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        if not self.l2.add(key, value, timeout=timeout, version=version):
+            return False
+        self._l1_set(key, clave, value, timeout)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        # Se elimina de L1 para no alargar su vida mas alla de L1_TIMEOUT
+        self._l1_delete(clave)
+        return self.l2.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        self._l1_delete(clave)
+        return self.l2.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        if self._l1_get(clave) is not _NO_ENCONTRADO:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        self._l1_delete(clave)
+        return self.l2.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# myapp/checks.py
+"""
+Comprobaciones de configuracion que Django ejecuta al arrancar (manage.py check,
+runserver, migrate...)
+"""
+
+from django.conf import settings
+from django.core.checks import Error, register
+
+# La subida directa firma y verifica con la API de Cloudinary
+BACKEND_SUBIDA_DIRECTA = 'myapp.cloudinary_storage.CloudinaryStorage'
+
+
+@register()
+def comprobar_subida_directa(app_configs, **kwargs):
+    """MEDIA_SUBIDA_DIRECTA solo funciona con el almacen de Cloudinary"""
+    if settings.MEDIA_SUBIDA_DIRECTA and settings.MEDIA_STORAGE_BACKEND != BACKEND_SUBIDA_DIRECTA:
+        return [Error(
+            'MEDIA_SUBIDA_DIRECTA=True necesita MEDIA_STORAGE_BACKEND='
+            f'{BACKEND_SUBIDA_DIRECTA} (está configurado {settings.MEDIA_STORAGE_BACKEND})',
+            hint='Los archivos se subirían a Cloudinary, pero el borrado y la limpieza de '
+                 'huérfanos usarían el otro almacén. Desactiva MEDIA_SUBIDA_DIRECTA o cambia el almacén.',
+            id='myapp.E001',
+        )]
+    return []
@@ -1,11 +1,62 @@
 import cloudinary
+import cloudinary.api
 import cloudinary.uploader
+import cloudinary.utils
+from datetime import datetime
 from django.conf import settings
+import time
 import uuid
 import os
 
+from .media_storage import TAMANO_PAGINA, ArchivoAlmacen, ArchivoSubido, MediaStorage
 
-class CloudinaryStorage:
+# Trozo de las subidas de video por partes (Cloudinary exige al menos 5 MB
+# por trozo salvo el ultimo)
+TAMANO_TROZO_VIDEO = 6 * 1024 * 1024
+
+# Maximo de public_ids por llamada a delete_resources
+BORRAR_POR_LLAMADA = 100
+
+
+class _LecturaConProgreso:
+    """
+    Envuelve un fichero para saber cuantos bytes ha enviado upload_large.
+
+    upload_large lee el trozo siguiente (o el final del fichero) cuando el
+    anterior ya se ha subido: en cada lectura se avisa de lo leido hasta ese
+    momento.
+    """
+
+    def __init__(self, fichero, progreso):
+        self._fichero = fichero
+        self._progreso = progreso
+        self.leidos = 0
+        self.name = getattr(fichero, 'name', None)
+
+    def read(self, tamano=-1):
+        if self.leidos:
+            self._progreso(self.leidos)
+        datos = self._fichero.read(tamano)
+        self.leidos += len(datos)
+        return datos
+
+    def seek(self, *args):
+        return self._fichero.seek(*args)
+
+    def tell(self):
+        return self._fichero.tell()
+
+    def close(self):
+        self._fichero.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CloudinaryStorage(MediaStorage):
     """
     Clase para gestionar la subida de archivos a Cloudinary.
     """
@@ -19,25 +70,33 @@ class CloudinaryStorage:
             secure=True
         )
 
-    def upload_file(self, file_obj, folder='animales', resource_type='image'):
-        """
-        Sube un archivo a Cloudinary.
-
-        Args:
-            file_obj: Objeto de archivo de Django (UploadedFile)
-            folder: Carpeta en Cloudinary ('animales/fotos' o 'animales/videos')
-            resource_type: Tipo de recurso ('image' o 'video')
+    @property
+    def nombre(self):
+        return settings.CLOUDINARY_CLOUD_NAME
 
-        Returns:
-            str: URL pública del archivo subido o None si hay error
-        """
+    def _subir(self, file_obj, folder, resource_type, por_trozos=False, progreso=None):
+        """Sube un archivo y devuelve la respuesta de Cloudinary (o None si hay error)"""
         try:
             # Generar un public_id único
-            ext = os.path.splitext(file_obj.name)[1].lower()
             public_id = f"{folder}/{uuid.uuid4()}"
 
+            if por_trozos:
+                # Cada trozo de TAMANO_TROZO_VIDEO es una peticion independiente: no
+                # hace falta tener el archivo entero en memoria y un corte solo obliga
+                # a repetir el trozo en curso
+                if progreso:
+                    file_obj = _LecturaConProgreso(file_obj, progreso)
+                return cloudinary.uploader.upload_large(
+                    file_obj,
+                    public_id=public_id,
+                    resource_type=resource_type,
+                    chunk_size=TAMANO_TROZO_VIDEO,
+                    overwrite=True,
+                    invalidate=True
+                )
+
             # Subir el archivo a Cloudinary
-            result = cloudinary.uploader.upload(
+            return cloudinary.uploader.upload(
                 file_obj,
                 public_id=public_id,
                 resource_type=resource_type,
@@ -45,84 +104,168 @@ class CloudinaryStorage:
                 invalidate=True
             )
 
-            # Retornar la URL segura (HTTPS)
-            return result.get('secure_url')
-
         except Exception as e:
             print(f"Error al subir archivo a Cloudinary: {e}")
             return None
 
-    def delete_file(self, file_url):
+    # ==================== INTERFAZ MediaStorage ====================
+
+    def subir(self, fichero, carpeta, tipo='imagen', progreso=None):
         """
-        Elimina un archivo de Cloudinary.
+        Sube un archivo a animales/<carpeta>; los videos, por trozos.
 
-        Args:
-            file_url: URL completa del archivo a eliminar
+        Returns:
+            ArchivoSubido: (secure_url, public_id), o None si hay error
+        """
+        resource_type = 'video' if tipo == 'video' else 'image'
+        result = self._subir(
+            fichero, f"animales/{carpeta}", resource_type,
+            por_trozos=tipo == 'video', progreso=progreso,
+        )
+        if not result or not result.get('secure_url'):
+            return None
+        return ArchivoSubido(result['secure_url'], result['public_id'])
+
+    def borrar(self, claves, tipo='imagen'):
+        """
+        Elimina muchos archivos con delete_resources (hasta 100 por llamada).
 
         Returns:
-            bool: True si se eliminó correctamente, False en caso contrario
+            int: archivos eliminados
         """
-        try:
-            # Extraer el public_id de la URL
-            # Ejemplo URL: https://res.cloudinary.com/dfg7cdvlo/image/upload/v1234567890/animales/fotos/uuid.jpg
-            # Public ID: animales/fotos/uuid
+        resource_type = 'video' if tipo == 'video' else 'image'
+        claves = list(claves)
+        borrados = 0
+        for inicio in range(0, len(claves), BORRAR_POR_LLAMADA):
+            try:
+                result = cloudinary.api.delete_resources(
+                    claves[inicio:inicio + BORRAR_POR_LLAMADA], resource_type=resource_type,
+                )
+            except Exception as e:
+                print(f"Error al eliminar archivos de Cloudinary: {e}")
+                continue
+            borrados += sum(1 for estado in result.get('deleted', {}).values() if estado == 'deleted')
+        return borrados
 
-            if 'cloudinary.com' not in file_url:
-                return False
+    def clave_desde_url(self, url):
+        """
+        public_id de una URL de Cloudinary.
 
-            # Extraer la parte después de /upload/
-            parts = file_url.split('/upload/')
-            if len(parts) < 2:
-                return False
+        Ejemplo URL: https://res.cloudinary.com/dfg7cdvlo/image/upload/v1234567890/animales/fotos/uuid.jpg
+        Public ID: animales/fotos/uuid
+        """
+        if not url or 'cloudinary.com' not in url:
+            return None
 
-            # Obtener el path después de la versión (v1234567890/)
-            path_with_version = parts[1]
-            path_parts = path_with_version.split('/')
+        # Extraer la parte después de /upload/
+        parts = url.split('/upload/')
+        if len(parts) < 2:
+            return None
 
-            # Saltar la versión si existe (empieza con 'v' seguido de números)
-            if path_parts[0].startswith('v') and path_parts[0][1:].isdigit():
-                path_parts = path_parts[1:]
+        # Saltar las transformaciones (c_fill,w_480...) y la versión (v1234567890)
+        path_parts = parts[1].split('/')
+        while len(path_parts) > 1 and (',' in path_parts[0] or '_' in path_parts[0][:3] or (
+                path_parts[0].startswith('v') and path_parts[0][1:].isdigit())):
+            path_parts = path_parts[1:]
 
-            # Reconstruir el public_id sin la extensión
-            public_id = '/'.join(path_parts)
-            # Quitar la extensión del archivo
-            public_id = os.path.splitext(public_id)[0]
+        # Reconstruir el public_id sin la extensión
+        return os.path.splitext('/'.join(path_parts))[0]
 
-            # Determinar el tipo de recurso
-            resource_type = 'video' if 'videos' in public_id else 'image'
+    def listar(self, carpeta, tipo='imagen'):
+        """Recorre animales/<carpeta> con la Admin API (next_cursor)"""
+        resource_type = 'video' if tipo == 'video' else 'image'
+        cursor = None
+        while True:
+            opciones = {'next_cursor': cursor} if cursor else {}
+            result = cloudinary.api.resources(
+                type='upload', resource_type=resource_type, prefix=f"animales/{carpeta}/",
+                max_results=TAMANO_PAGINA, **opciones,
+            )
+            yield [
+                ArchivoAlmacen(
+                    recurso['public_id'],
+                    datetime.fromisoformat(recurso['created_at'].replace('Z', '+00:00')),
+                    recurso.get('bytes', 0),
+                )
+                for recurso in result.get('resources', [])
+            ]
+            cursor = result.get('next_cursor')
+            if not cursor:
+                return
 
-            # Eliminar el archivo
-            result = cloudinary.uploader.destroy(public_id, resource_type=resource_type)
+    def firmar_subida(self, folder, resource_type='image', allowed_formats=(), transformation=None):
+        """
+        Parámetros firmados para que el navegador suba un archivo directamente a Cloudinary.
 
-            return result.get('result') == 'ok'
+        El public_id lo fija el servidor y forma parte de la firma, igual que
+        los formatos permitidos y la transformación de entrada: el navegador
+        no puede cambiarlos. Cloudinary rechaza la firma pasada una hora.
 
-        except Exception as e:
-            print(f"Error al eliminar archivo de Cloudinary: {e}")
-            return False
+        Args:
+            folder: Carpeta en Cloudinary
+            resource_type: Tipo de recurso ('image' o 'video')
+            allowed_formats: extensiones que Cloudinary debe aceptar
+            transformation: transformación aplicada al subir (p. ej. 'c_limit,w_1600,h_1600')
 
-    def upload_image(self, image_file):
+        Returns:
+            dict: {'public_id', 'url': endpoint de subida, 'campos': campos del POST}
         """
-        Sube una imagen a la carpeta animales/fotos.
+        config = cloudinary.config()
+        campos = {
+            'public_id': f"{folder}/{uuid.uuid4()}",
+            'timestamp': int(time.time()),
+        }
+        if allowed_formats:
+            campos['allowed_formats'] = ','.join(allowed_formats)
+        if transformation:
+            campos['transformation'] = transformation
+        campos['signature'] = cloudinary.utils.api_sign_request(campos, config.api_secret)
+        campos['api_key'] = config.api_key
 
-        Args:
-            image_file: Archivo de imagen
+        return {
+            'public_id': campos['public_id'],
+            'url': f"https://api.cloudinary.com/v1_1/{config.cloud_name}/{resource_type}/upload",
+            'campos': campos,
+        }
+
+    def verificar_subida(self, public_id, version, signature):
+        """
+        Comprueba la firma que devuelve Cloudinary al navegador tras una subida.
 
         Returns:
-            str: URL pública de la imagen subida
+            bool: True si la respuesta (public_id + version) la firmó Cloudinary
         """
-        return self.upload_file(image_file, folder='animales/fotos', resource_type='image')
+        try:
+            return cloudinary.utils.verify_api_response_signature(public_id, version, signature)
+        except Exception as e:
+            print(f"Error al verificar la subida en Cloudinary: {e}")
+            return False
 
-    def upload_video(self, video_file):
+    def obtener_recurso(self, public_id, resource_type='image'):
         """
-        Sube un video a la carpeta animales/videos.
+        Datos de un archivo ya subido (Admin API): secure_url, bytes, format...
 
-        Args:
-            video_file: Archivo de video
+        Returns:
+            dict: respuesta de Cloudinary o None si no existe o hay error
+        """
+        try:
+            return cloudinary.api.resource(public_id, resource_type=resource_type)
+        except Exception as e:
+            print(f"Error al consultar archivo en Cloudinary: {e}")
+            return None
+
+    def url_miniatura(self, public_id, version, lado):
+        """
+        URL de una miniatura cuadrada WebP generada por Cloudinary al vuelo.
 
         Returns:
-            str: URL pública del video subido
+            str: URL pública de la miniatura
         """
-        return self.upload_file(video_file, folder='animales/videos', resource_type='video')
+        url, _ = cloudinary.utils.cloudinary_url(
+            public_id, resource_type='image', version=version, secure=True,
+            width=lado, height=lado, crop='fill', fetch_format='webp', quality=settings.IMAGEN_CALIDAD_WEBP,
+        )
+        return url
 
 
 # Instancia global para uso en views
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# myapp/estadisticas.py
+"""
+Estadisticas diarias precalculadas (tabla EstadisticaDiaria)
+
+El resumen diario contaba con fecha_registro__date=ayer y similares: un
+__date sobre un DateTimeField no puede usar indices y recorria las tablas
+enteras cada vez. Ahora cada dia se agrega una sola vez, con rangos
+[00:00, 00:00 del dia siguiente) que si usan los indices, y se guarda por
+provincia y tipo de animal. Los informes solo leen esas filas: su coste
+depende del numero de dias, no del de asociaciones o animales.
+
+actualizar_estadisticas() es incremental: calcula los dias que faltan desde
+el ultimo guardado y recalcula los ultimos DIAS_RECALCULO (por si un animal
+se desmarca como adoptado o llega algun cambio tardio). Cada dia calculado
+tiene al menos una fila, aunque no haya habido actividad, para saber hasta
+donde esta al dia la tabla.
+
+    python manage.py actualizar_estadisticas [--desde AAAA-MM-DD] [--enviar-resumen]
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import CreacionAnimales, EstadisticaDiaria, RegistroAsociacion
+
+METRICAS = ('nuevas_asociaciones', 'asociaciones_aprobadas', 'nuevos_animales', 'adopciones')
+
+# Dias que se vuelven a calcular aunque ya esten en la tabla
+DIAS_RECALCULO = 2
+
+
+def _limites_dia(fecha):
+    """Inicio y fin (exclusivo) de un dia en la zona horaria local"""
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    return inicio, inicio + timedelta(days=1)
+
+
+def calcular_dia(fecha):
+    """Recalcula y guarda las filas de un dia. Devuelve cuantas filas escribe"""
+    inicio, fin = _limites_dia(fecha)
+    filas = defaultdict(lambda: dict.fromkeys(METRICAS, 0))
+
+    consultas = [
+        ('nuevas_asociaciones', RegistroAsociacion.objects.filter(fecha_registro__gte=inicio, fecha_registro__lt=fin), False),
+        ('asociaciones_aprobadas', RegistroAsociacion.objects.filter(fecha_aprobacion__gte=inicio, fecha_aprobacion__lt=fin), False),
+        ('nuevos_animales', CreacionAnimales.objects.filter(fecha_creacion__gte=inicio, fecha_creacion__lt=fin), True),
+        ('adopciones', CreacionAnimales.objects.filter(fecha_adopcion__gte=inicio, fecha_adopcion__lt=fin), True),
+    ]
+    for metrica, queryset, por_tipo in consultas:
+        campos = ('provincia', 'tipo_de_animal') if por_tipo else ('provincia',)
+        for fila in queryset.order_by().values(*campos).annotate(total=Count('id')):
+            filas[(fila['provincia'], fila.get('tipo_de_animal', ''))][metrica] = fila['total']
+
+    if not filas:
+        # Dia sin actividad: una fila vacia marca que ya esta calculado
+        filas[('', '')]
+
+    with transaction.atomic():
+        EstadisticaDiaria.objects.filter(fecha=fecha).delete()
+        EstadisticaDiaria.objects.bulk_create([
+            EstadisticaDiaria(fecha=fecha, provincia=provincia, tipo_de_animal=tipo, **metricas)
+            for (provincia, tipo), metricas in filas.items()
+        ])
+    return len(filas)
+
+
+def actualizar_estadisticas(desde=None, hasta=None):
+    """
+    Calcula los dias pendientes hasta `hasta` (por defecto, ayer).
+
+    Args:
+        desde: recalcular desde esta fecha (por defecto, desde el ultimo dia
+               guardado menos DIAS_RECALCULO, o desde la primera asociacion)
+
+    Returns:
+        int: numero de dias calculados
+    """
+    hasta = hasta or timezone.localdate() - timedelta(days=1)
+
+    if desde is None:
+        ultima = ultima_fecha_calculada()
+        if ultima is not None:
+            desde = min(ultima + timedelta(days=1), hasta - timedelta(days=DIAS_RECALCULO - 1))
+        else:
+            primera = RegistroAsociacion.objects.order_by('fecha_registro').values_list('fecha_registro', flat=True).first()
+            desde = timezone.localdate(primera) if primera else hasta
+
+    dias = 0
+    fecha = desde
+    while fecha <= hasta:
+        calcular_dia(fecha)
+        fecha += timedelta(days=1)
+        dias += 1
+    return dias
+
+
+# ==================== CONSULTAS ====================
+
+def _sumas():
+    return {metrica: Sum(metrica) for metrica in METRICAS}
+
+
+def resumen(desde, hasta):
+    """Totales de cada metrica entre dos fechas (incluidas)"""
+    totales = EstadisticaDiaria.objects.filter(fecha__range=(desde, hasta)).aggregate(**_sumas())
+    return {metrica: totales[metrica] or 0 for metrica in METRICAS}
+
+
+def serie_diaria(desde, hasta):
+    """Totales por dia, del mas antiguo al mas reciente"""
+    return list(
+        EstadisticaDiaria.objects
+        .filter(fecha__range=(desde, hasta))
+        .values('fecha')
+        .annotate(**_sumas())
+        .order_by('fecha')
+    )
+
+
+def ranking(campo, desde, hasta, limite=10):
+    """
+    Provincias o tipos de animal con mas actividad entre dos fechas.
+
+    Args:
+        campo: 'provincia' o 'tipo_de_animal'
+    """
+    filas = EstadisticaDiaria.objects.filter(fecha__range=(desde, hasta)).exclude(**{campo: ''})
+    return list(
+        filas
+        .values(campo)
+        .annotate(**_sumas())
+        .order_by('-nuevos_animales', '-adopciones', campo)[:limite]
+    )
+
+
+def ultima_fecha_calculada():
+    return EstadisticaDiaria.objects.aggregate(ultima=Max('fecha'))['ultima']
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# myapp/estados_conversacion.py
+"""
+Almacen de estados de las conversaciones del bot de Telegram
+
+Antes los estados vivian en un dict del modulo (ESTADOS_CONVERSACION): con
+varios workers de gunicorn, un /registrar se rompia en cuanto Telegram
+entregaba el siguiente mensaje a otro worker, y las entradas no caducaban.
+
+Hay dos almacenes con la misma interfaz; TELEGRAM_ESTADOS_BACKEND elige cual
+(ruta con puntos, como los BACKEND de CACHES):
+
+- AlmacenEstadosBD (por defecto): tabla EstadoConversacion.
+- AlmacenEstadosCache: la cache compartida (Redis o ficheros, sin L1).
+
+Cada estado caduca TELEGRAM_ESTADOS_TTL segundos despues de su ultima
+actualizacion. guardar() con `version` es un compare-and-set: solo escribe si
+nadie ha cambiado el estado desde que se leyo, asi que un mensaje procesado
+dos veces no avanza la conversacion dos pasos.
+
+Los estados caducados se borran con: python manage.py limpiar_estados_conversacion
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import EstadoConversacion
+
+logger = logging.getLogger(__name__)
+
+
+class AlmacenEstadosBD:
+    """Estados en la tabla EstadoConversacion"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def _expira(self):
+        return timezone.now() + timedelta(seconds=self.ttl)
+
+    def obtener(self, chat_id):
+        """{'estado', 'datos', 'version'} o None si no hay estado (o ha caducado)"""
+        return (
+            EstadoConversacion.objects
+            .filter(chat_id=chat_id, expira__gt=timezone.now())
+            .values('estado', 'datos', 'version')
+            .first()
+        )
+
+    def guardar(self, chat_id, estado, datos, version=None):
+        """
+        Guarda el estado. Con `version`, solo si el guardado sigue en esa version.
+
+        Returns:
+            bool: False si otro proceso lo cambio antes (o caduco)
+        """
+        cambios = {'estado': estado, 'datos': datos, 'version': F('version') + 1, 'expira': self._expira()}
+        existentes = EstadoConversacion.objects.filter(chat_id=chat_id)
+
+        if version is not None:
+            return bool(existentes.filter(version=version, expira__gt=timezone.now()).update(**cambios))
+
+        if existentes.update(**cambios):
+            return True
+        try:
+            with transaction.atomic():
+                EstadoConversacion.objects.create(
+                    chat_id=chat_id, estado=estado, datos=datos, expira=cambios['expira']
+                )
+        except IntegrityError:
+            # Otro proceso lo creo entre medias: sobrescribirlo como haria el update
+            return bool(existentes.update(**cambios))
+        return True
+
+    def limpiar(self, chat_id):
+        EstadoConversacion.objects.filter(chat_id=chat_id).delete()
+
+    def purgar_caducados(self):
+        """Borra los estados caducados y devuelve cuantos habia"""
+        borrados, _ = EstadoConversacion.objects.filter(expira__lte=timezone.now()).delete()
+        return borrados
+
+
+class AlmacenEstadosCache:
+    """Estados en la cache compartida (caducan solos con el timeout)"""
+
+    # Tiempo maximo que un proceso retiene el cerrojo del compare-and-set
+    DURACION_CERROJO = 5
+
+    def __init__(self, ttl, alias='compartida'):
+        self.ttl = ttl
+        self.cache = caches[alias]
+
+    def _clave(self, chat_id):
+        return f'telegram:conversacion:{chat_id}'
+
+    def obtener(self, chat_id):
+        return self.cache.get(self._clave(chat_id))
+
+    def guardar(self, chat_id, estado, datos, version=None):
+        clave = self._clave(chat_id)
+        cerrojo = f'{clave}:cerrojo'
+        if not self.cache.add(cerrojo, 1, timeout=self.DURACION_CERROJO):
+            # Otro proceso lo esta actualizando ahora mismo
+            return False
+        try:
+            actual = self.cache.get(clave)
+            if version is not None and (actual is None or actual['version'] != version):
+                return False
+            self.cache.set(clave, {
+                'estado': estado,
+                'datos': datos,
+                'version': (actual['version'] if actual else 0) + 1,
+            }, timeout=self.ttl)
+            return True
+        finally:
+            self.cache.delete(cerrojo)
+
+    def limpiar(self, chat_id):
+        self.cache.delete(self._clave(chat_id))
+
+    def purgar_caducados(self):
+        # La cache descarta las entradas caducadas por si sola
+        return 0
+
+
+def obtener_almacen():
+    """Almacen configurado en TELEGRAM_ESTADOS_BACKEND"""
+    return import_string(settings.TELEGRAM_ESTADOS_BACKEND)(ttl=settings.TELEGRAM_ESTADOS_TTL)
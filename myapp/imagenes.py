@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# myapp/imagenes.py
+"""
+Derivados de las fotos de animales antes de subirlas
+
+Las fotos del movil (hasta 5 MB y 10 por animal) se subian tal cual a
+Cloudinary: la subida y el peso de las tarjetas del inicio dependian del
+original. Ahora, en el hilo de subida_medios que sube cada foto:
+
+1. Se comprueba el tamano en pixeles antes de decodificar (proteccion frente
+   a "decompression bombs": un PNG de pocos KB que ocupa gigas al abrirlo).
+2. Se decodifica una sola vez; en JPEG con draft(), que ya reduce al
+   decodificar.
+3. Se aplica la orientacion EXIF y se descartan los metadatos (GPS, modelo
+   del movil...).
+4. Se generan dos WebP: la imagen (lado mayor IMAGEN_LADO_MAXIMO) y la
+   miniatura cuadrada de las tarjetas (IMAGEN_LADO_MINIATURA).
+
+Los GIF animados se suben sin tocar (el WebP perderia la animacion); solo
+se genera su miniatura con el primer fotograma.
+"""
+
+import warnings
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+class ImagenNoValida(Exception):
+    """La foto no se puede decodificar o supera el limite de pixeles"""
+
+
+def _guardar_webp(imagen, calidad, nombre):
+    salida = BytesIO()
+    # MediaStorage.subir lee el nombre del fichero (la extension)
+    salida.name = nombre
+    imagen.save(salida, 'WEBP', quality=calidad, method=4)
+    salida.seek(0)
+    return salida
+
+
+def _abrir(fichero):
+    """Abre la imagen comprobando el tamano antes de decodificar los pixeles"""
+    with warnings.catch_warnings():
+        # Pillow solo avisa entre MAX_IMAGE_PIXELS y el doble: tratarlo como error
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            imagen = Image.open(fichero)
+        except (UnidentifiedImageError, Image.DecompressionBombWarning, Image.DecompressionBombError, OSError) as e:
+            raise ImagenNoValida(str(e)) from e
+
+    ancho, alto = imagen.size
+    if ancho * alto > settings.IMAGEN_MAX_PIXELES:
+        raise ImagenNoValida(f"Imagen demasiado grande: {ancho}x{alto} pixeles")
+    return imagen
+
+
+def generar_derivados(fichero):
+    """
+    Genera la imagen y la miniatura WebP de una foto.
+
+    Args:
+        fichero: ruta o fichero binario con la foto original
+
+    Returns:
+        dict: {'imagen': fichero a subir (WebP, o el original si es animado),
+               'miniatura': WebP cuadrado, 'ancho', 'alto'}
+
+    Raises:
+        ImagenNoValida: si no es una imagen o supera IMAGEN_MAX_PIXELES
+    """
+    lado_maximo = settings.IMAGEN_LADO_MAXIMO
+    lado_miniatura = settings.IMAGEN_LADO_MINIATURA
+    calidad = settings.IMAGEN_CALIDAD_WEBP
+
+    imagen = _abrir(fichero)
+    animada = getattr(imagen, 'is_animated', False)
+    try:
+        if imagen.format == 'JPEG':
+            # Decodifica directamente a 1/2, 1/4 u 1/8 si basta para lado_maximo
+            imagen.draft('RGB', (lado_maximo, lado_maximo))
+        imagen.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ImagenNoValida(str(e)) from e
+
+    transparente = imagen.mode in ('RGBA', 'LA') or (imagen.mode == 'P' and 'transparency' in imagen.info)
+    # Orientacion de la camara; la copia resultante ya no lleva EXIF
+    imagen = ImageOps.exif_transpose(imagen).convert('RGBA' if transparente else 'RGB')
+
+    miniatura = ImageOps.fit(imagen, (lado_miniatura, lado_miniatura), Image.Resampling.LANCZOS)
+
+    if animada:
+        if hasattr(fichero, 'seek'):
+            fichero.seek(0)
+        principal = fichero
+    else:
+        imagen.thumbnail((lado_maximo, lado_maximo), Image.Resampling.LANCZOS)
+        principal = _guardar_webp(imagen, calidad, 'imagen.webp')
+
+    return {
+        'imagen': principal,
+        'miniatura': _guardar_webp(miniatura, calidad, 'miniatura.webp'),
+        'ancho': imagen.width,
+        'alto': imagen.height,
+    }
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# myapp/indice_busqueda.py
+"""
+Indice de texto para resultados_busqueda (sin tildes ni mayusculas)
+
+Cada animal se descompone en tokens normalizados ("Pájaro" -> "pajaro") que
+se guardan en TokenBusquedaAnimal junto al campo del que salen y su peso.
+Buscar es una unica consulta agrupada sobre esa tabla:
+
+    - cada termino buscado debe coincidir (AND) por prefijo con algun token
+    - la relevancia es la suma de los pesos de los tokens que coinciden
+
+La busqueda por prefijo usa el indice de (token, campo) en ambos motores:
+en PostgreSQL con LIKE 'x%' (indice con varchar_pattern_ops) y en SQLite con
+un rango token >= 'x' AND token < 'x{' (los tokens solo contienen [a-z0-9]).
+
+El indice se mantiene con la signal post_save de CreacionAnimales; para
+rellenarlo desde cero: python manage.py reindexar_busqueda
+"""
+
+import re
+import unicodedata
+from functools import reduce
+from operator import or_
+
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Max, Q, Sum, When
+
+from .models import CreacionAnimales, TokenBusquedaAnimal
+
+# Campo del indice -> (campos del modelo, peso de cada token)
+CAMPOS_INDICE = {
+    'nombre': (('nombre',), 8),
+    'tipo': (('tipo_de_animal',), 4),
+    'raza': (('raza',), 4),
+    'color': (('color',), 2),
+    'ubicacion': (('provincia', 'poblacion'), 2),
+    'descripcion': (('descripcion',), 1),
+}
+
+CAMPOS_MODELO_INDEXADOS = frozenset(
+    campo for campos, _ in CAMPOS_INDICE.values() for campo in campos
+)
+
+LONGITUD_MINIMA_TOKEN = 2
+LONGITUD_MAXIMA_TOKEN = 40
+
+# Animales por pagina en resultados_busqueda
+POR_PAGINA_RESULTADOS = 24
+
+# Maximo de terminos por busqueda (cada uno añade una condicion a la consulta)
+MAXIMO_TERMINOS = 8
+
+PALABRAS_VACIAS = frozenset({
+    'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los',
+    'muy', 'para', 'por', 'que', 'se', 'su', 'sus', 'un', 'una', 'uno', 'y',
+})
+
+_PATRON_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def normalizar(texto):
+    """Pasa a minusculas y quita tildes/diacriticos ("Pájaro Ñandú" -> "pajaro nandu")"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto):
+    """Devuelve los tokens normalizados de un texto, sin palabras vacias"""
+    return [
+        token[:LONGITUD_MAXIMA_TOKEN]
+        for token in _PATRON_TOKEN.findall(normalizar(texto))
+        if len(token) >= LONGITUD_MINIMA_TOKEN and token not in PALABRAS_VACIAS
+    ]
+
+
+def tokens_de_animal(animal):
+    """Genera los TokenBusquedaAnimal (sin guardar) de un animal"""
+    vistos = set()
+    tokens = []
+    for campo, (campos_modelo, peso) in CAMPOS_INDICE.items():
+        for campo_modelo in campos_modelo:
+            for token in tokenizar(getattr(animal, campo_modelo)):
+                if (campo, token) not in vistos:
+                    vistos.add((campo, token))
+                    tokens.append(TokenBusquedaAnimal(
+                        animal_id=animal.id, campo=campo, token=token, peso=peso
+                    ))
+    return tokens
+
+
+def indexar_animal(animal):
+    """Reemplaza los tokens de un animal"""
+    with transaction.atomic():
+        TokenBusquedaAnimal.objects.filter(animal_id=animal.id).delete()
+        TokenBusquedaAnimal.objects.bulk_create(tokens_de_animal(animal))
+
+
+def reindexar_todo(tamano_lote=500):
+    """Reconstruye el indice completo. Devuelve el numero de animales indexados"""
+    total = 0
+    with transaction.atomic():
+        TokenBusquedaAnimal.objects.all().delete()
+        animales = CreacionAnimales.objects.only('id', *CAMPOS_MODELO_INDEXADOS).order_by('id')
+        lote = []
+        for animal in animales.iterator(chunk_size=tamano_lote):
+            lote.extend(tokens_de_animal(animal))
+            total += 1
+            if len(lote) >= tamano_lote:
+                TokenBusquedaAnimal.objects.bulk_create(lote)
+                lote = []
+        TokenBusquedaAnimal.objects.bulk_create(lote)
+    return total
+
+
+# ==================== CONSULTA ====================
+
+def _condicion_prefijo(termino):
+    """Condicion indexable de 'el token empieza por termino'"""
+    if connection.vendor == 'postgresql':
+        return Q(token__startswith=termino)
+    # LIKE en SQLite no distingue mayusculas y no puede usar el indice binario
+    return Q(token__gte=termino, token__lt=termino + '{')
+
+
+def construir_terminos(texto='', campos=None):
+    """
+    Convierte la busqueda en una lista de terminos (campo, token).
+
+    `texto` se busca en todos los campos; `campos` es {campo_indice: texto}
+    para restringir cada texto a un campo concreto (raza, color...).
+    """
+    terminos = [(None, token) for token in tokenizar(texto)]
+    for campo, valor in (campos or {}).items():
+        terminos.extend((campo, token) for token in tokenizar(valor))
+    # Sin duplicados y respetando el orden
+    return list(dict.fromkeys(terminos))[:MAXIMO_TERMINOS]
+
+
+def buscar_coincidencias(terminos, animales=None):
+    """
+    Queryset de {'animal_id', 'relevancia'} con los animales que cumplen
+    todos los terminos (y estan en `animales`, si se indica), ordenados por
+    relevancia y despues de mas reciente a mas antiguo.
+    """
+    if not terminos:
+        raise ValueError("Se necesita al menos un termino de busqueda")
+
+    condiciones = []
+    for campo, termino in terminos:
+        condicion = _condicion_prefijo(termino)
+        if campo:
+            condicion &= Q(campo=campo)
+        condiciones.append(condicion)
+
+    # Un flag por termino: el animal debe tener al menos un token que lo cumpla
+    flags = {
+        f'termino_{i}': Max(Case(When(condicion, then=1), default=0, output_field=IntegerField()))
+        for i, condicion in enumerate(condiciones)
+    }
+    tokens = TokenBusquedaAnimal.objects.filter(reduce(or_, condiciones))
+    if animales is not None:
+        tokens = tokens.filter(animal__in=animales.values('id'))
+    return (
+        tokens
+        .values('animal_id')
+        .annotate(relevancia=Sum('peso'), **flags)
+        .filter(**{flag: 1 for flag in flags})
+        .order_by('-relevancia', '-animal_id')
+        .values('animal_id', 'relevancia')
+    )
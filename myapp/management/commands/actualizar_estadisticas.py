@@ -0,0 +1,42 @@
+# myapp/management/commands/actualizar_estadisticas.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from myapp.estadisticas import actualizar_estadisticas, ultima_fecha_calculada
+
+class Command(BaseCommand):
+    help = 'Calcula las estadísticas diarias pendientes (pensado para ejecutarse una vez al día)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=str,
+            help='Recalcular desde esta fecha (AAAA-MM-DD) aunque ya esté calculada',
+        )
+        parser.add_argument(
+            '--enviar-resumen',
+            action='store_true',
+            help='Encolar después el resumen de ayer para el chat de Telegram',
+        )
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError(f"Fecha no válida: {options['desde']} (formato AAAA-MM-DD)")
+
+        dias = actualizar_estadisticas(desde=desde)
+        self.stdout.write(self.style.SUCCESS(
+            f"📊 {dias} días calculados (tabla al día hasta {ultima_fecha_calculada()})"
+        ))
+
+        if options['enviar_resumen']:
+            from myapp.telegram_utils import enviar_estadisticas_diarias
+
+            if enviar_estadisticas_diarias():
+                self.stdout.write("📨 Resumen diario encolado para Telegram")
+            else:
+                self.stderr.write("❌ No se pudo encolar el resumen diario")
@@ -0,0 +1,164 @@
+# myapp/management/commands/benchmark.py
+"""
+Benchmark reproducible de las páginas públicas y los flujos de administración
+
+Por defecto crea una base de datos temporal (como el runner de tests), la
+siembra con poblar_animales --offline hasta cada tamaño de --animales y mide
+cada escenario en proceso: p50/p95 de latencia, consultas por petición y
+bytes por respuesta. La base de datos temporal se borra al terminar, y las
+caches configuradas (Redis o ficheros) no se tocan: se usan caches en
+memoria (myapp.benchmark.caches_aisladas).
+
+    python manage.py benchmark --animales 1000 10000 100000
+    python manage.py benchmark --escenarios inicio vista_animal --repeticiones 200
+
+Con --servidor mide un servidor ya arrancado (runserver, gunicorn) con
+peticiones HTTP concurrentes, sobre los datos que tenga:
+
+    python manage.py benchmark --servidor http://localhost:8000 --concurrencia 20
+"""
+
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from myapp.benchmark import ESCENARIOS, caches_aisladas, medir_escenario, medir_servidor, preparar_contexto
+from myapp.models import CreacionAnimales
+
+COLUMNAS = (
+    ('escenario', 'Escenario', 22),
+    ('p50_ms', 'p50 ms', 10),
+    ('p95_ms', 'p95 ms', 10),
+    ('consultas', 'Consultas', 10),
+    ('bytes', 'Bytes', 10),
+    ('peticiones_por_segundo', 'Pet/s', 8),
+    ('errores', 'Errores', 8),
+)
+
+class Command(BaseCommand):
+    help = 'Mide latencia (p50/p95), consultas y bytes de las vistas principales sobre datos sintéticos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--animales',
+            type=int,
+            nargs='+',
+            default=[1000],
+            help='Tamaños del conjunto de datos a medir (por defecto 1000)',
+        )
+        parser.add_argument(
+            '--escenarios',
+            nargs='+',
+            choices=list(ESCENARIOS),
+            default=list(ESCENARIOS),
+            help='Escenarios a medir (por defecto todos)',
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=50,
+            help='Peticiones medidas por escenario en proceso (por defecto 50)',
+        )
+        parser.add_argument(
+            '--semilla',
+            type=int,
+            default=42,
+            help='Semilla de los datos y de las peticiones (por defecto 42)',
+        )
+        parser.add_argument(
+            '--servidor',
+            help='URL de un servidor en marcha para medirlo por HTTP en vez de en proceso',
+        )
+        parser.add_argument(
+            '--peticiones',
+            type=int,
+            default=200,
+            help='Peticiones por escenario con --servidor (por defecto 200)',
+        )
+        parser.add_argument(
+            '--concurrencia',
+            type=int,
+            default=10,
+            help='Peticiones simultáneas con --servidor (por defecto 10)',
+        )
+        parser.add_argument(
+            '--salida',
+            help='Guardar también los resultados en este fichero JSON',
+        )
+
+    def handle(self, *args, **options):
+        if options['servidor']:
+            resultados = [self.medir_servidor(options)]
+        else:
+            resultados = self.medir_en_proceso(options)
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as fichero:
+                json.dump(resultados, fichero, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"💾 Resultados guardados en {options['salida']}"))
+
+    def medir_en_proceso(self, options):
+        """Siembra una BD temporal hasta cada tamaño y mide los escenarios"""
+        resultados = []
+        setup_test_environment()
+        nombre_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with caches_aisladas():
+                resultados = self.medir_tamanos(options)
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+        return resultados
+
+    def medir_tamanos(self, options):
+        """Siembra la BD temporal hasta cada tamaño de --animales y mide los escenarios"""
+        resultados = []
+        for animales in sorted(options['animales']):
+            faltan = animales - CreacionAnimales.objects.count()
+            if faltan > 0:
+                self.stdout.write(f"🌱 Sembrando hasta {animales} animales...")
+                call_command(
+                    'poblar_animales', offline=True, count=faltan,
+                    semilla=options['semilla'] + animales, stdout=StringIO(),
+                )
+
+            contexto = preparar_contexto(semilla=options['semilla'])
+            filas = [
+                medir_escenario(nombre, contexto, repeticiones=options['repeticiones'], semilla=options['semilla'])
+                for nombre in options['escenarios']
+            ]
+            self.mostrar_tabla(f"{contexto['total_animales']} animales (en proceso)", filas)
+            resultados.append({'animales': contexto['total_animales'], 'modo': 'proceso', 'escenarios': filas})
+        return resultados
+
+    def medir_servidor(self, options):
+        """Mide por HTTP los escenarios de solo lectura contra --servidor"""
+        escenarios = [nombre for nombre in options['escenarios'] if not ESCENARIOS[nombre][1]]
+        if not escenarios:
+            raise CommandError("Ninguno de los escenarios elegidos se puede medir contra un servidor")
+
+        # Los ids de animales y provincias se leen de la BD configurada
+        contexto = preparar_contexto(semilla=options['semilla'])
+        filas = [
+            medir_servidor(
+                nombre, contexto, options['servidor'],
+                peticiones=options['peticiones'], concurrencia=options['concurrencia'], semilla=options['semilla'],
+            )
+            for nombre in escenarios
+        ]
+        self.mostrar_tabla(f"{options['servidor']} (concurrencia {options['concurrencia']})", filas)
+        return {'servidor': options['servidor'], 'modo': 'servidor', 'escenarios': filas}
+
+    def mostrar_tabla(self, titulo, filas):
+        ancho = sum(columna[2] for columna in COLUMNAS)
+        self.stdout.write("=" * ancho)
+        self.stdout.write(self.style.SUCCESS(f"⏱️  {titulo}"))
+        self.stdout.write("=" * ancho)
+        self.stdout.write(''.join(f"{cabecera:<{tamano}}" for _, cabecera, tamano in COLUMNAS))
+        for fila in filas:
+            self.stdout.write(''.join(f"{str(fila.get(clave, '-')):<{tamano}}" for clave, _, tamano in COLUMNAS))
+        self.stdout.write("=" * ancho)
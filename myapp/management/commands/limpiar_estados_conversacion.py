@@ -0,0 +1,15 @@
+# myapp/management/commands/limpiar_estados_conversacion.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from myapp.estados_conversacion import obtener_almacen
+
+class Command(BaseCommand):
+    help = 'Borra los estados caducados de las conversaciones del bot de Telegram'
+
+    def handle(self, *args, **options):
+        borrados = obtener_almacen().purgar_caducados()
+        self.stdout.write(self.style.SUCCESS(
+            f"🧹 {borrados} conversaciones caducadas borradas "
+            f"(almacén: {settings.TELEGRAM_ESTADOS_BACKEND.rsplit('.', 1)[-1]})"
+        ))
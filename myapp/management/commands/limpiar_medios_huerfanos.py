@@ -0,0 +1,70 @@
+# myapp/management/commands/limpiar_medios_huerfanos.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from myapp.media_storage import CARPETAS, obtener_storage
+from myapp.medios_huerfanos import limpiar_huerfanos
+
+class Command(BaseCommand):
+    help = 'Busca en el almacén de medios los archivos que no usa ningún animal y, con --borrar, los elimina'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--borrar',
+            action='store_true',
+            help='Eliminar los archivos huérfanos (sin esta opción solo se informa)',
+        )
+        parser.add_argument(
+            '--confirmar',
+            metavar='CUENTA',
+            help='Obligatorio con --borrar: nombre de la cuenta de Cloudinary o del bucket de B2 que se va a limpiar',
+        )
+        parser.add_argument(
+            '--horas',
+            type=int,
+            default=24,
+            help='Solo se consideran huérfanos los archivos con más de estas horas (por defecto 24)',
+        )
+        parser.add_argument(
+            '--carpeta',
+            choices=CARPETAS,
+            action='append',
+            help='Carpeta a revisar (se puede repetir; por defecto todas)',
+        )
+
+    def handle(self, *args, **options):
+        almacen = settings.MEDIA_STORAGE_BACKEND.rsplit('.', 1)[-1]
+        # Las credenciales por defecto de settings son las de produccion: con la
+        # BD de desarrollo o staging todos sus archivos parecerian huerfanos
+        nombre = obtener_storage().nombre
+        if options['borrar'] and options['confirmar'] != nombre:
+            raise CommandError(
+                f"--borrar elimina archivos de '{nombre}' ({almacen}). Comprueba que la base de datos "
+                f"es la de esa cuenta y repite con --confirmar {nombre}"
+            )
+
+        modo = "borrando" if options['borrar'] else "simulación, no se borra nada"
+        self.stdout.write(f"🔍 Buscando archivos huérfanos en {almacen} '{nombre}' ({modo})...")
+
+        informe = limpiar_huerfanos(
+            borrar=options['borrar'],
+            antiguedad=timedelta(hours=options['horas']),
+            carpetas=options['carpeta'] or CARPETAS,
+        )
+
+        for carpeta, resumen in informe.items():
+            self.stdout.write(
+                f"  {carpeta}: {resumen['listados']} archivos, {resumen['huerfanos']} huérfanos "
+                f"({resumen['bytes'] / (1024 * 1024):.1f} MB), {resumen['recientes']} recientes sin fila"
+            )
+
+        huerfanos = sum(resumen['huerfanos'] for resumen in informe.values())
+        if options['borrar']:
+            borrados = sum(resumen['borrados'] for resumen in informe.values())
+            self.stdout.write(self.style.SUCCESS(f"🧹 {borrados} de {huerfanos} archivos huérfanos borrados"))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ {huerfanos} archivos huérfanos. Ejecuta con --borrar para eliminarlos"
+            ))
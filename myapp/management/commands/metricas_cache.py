@@ -0,0 +1,31 @@
+# myapp/management/commands/metricas_cache.py
+
+from django.core.management.base import BaseCommand
+from myapp.cache_animales import EVENTOS_METRICAS, obtener_generacion, obtener_metricas, reiniciar_metricas
+
+class Command(BaseCommand):
+    help = 'Muestra cuántas veces se ha recorrido el camino de recálculo de las cachés de inicio y buscador'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reiniciar',
+            action='store_true',
+            help='Poner los contadores a cero después de mostrarlos',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("="*60)
+        self.stdout.write(self.style.SUCCESS("📊 MÉTRICAS DE CACHÉ DE ANIMALES"))
+        self.stdout.write("="*60)
+        self.stdout.write(f"Generación actual: {obtener_generacion()}")
+
+        for metrica, eventos in obtener_metricas().items():
+            self.stdout.write(f"\n🗂️  {metrica}")
+            for evento in EVENTOS_METRICAS:
+                self.stdout.write(f"   {evento:<22} {eventos[evento]}")
+
+        if options['reiniciar']:
+            reiniciar_metricas()
+            self.stdout.write(self.style.WARNING("\n♻️  Contadores reiniciados"))
+
+        self.stdout.write("="*60)
@@ -1,5 +1,24 @@
 # management/commands/poblar_animales.py
 # Crear esta estructura: myapp/management/commands/poblar_animales.py
+"""
+Puebla la base de datos con animales de prueba
+
+Por defecto crea --count animales (500) de las asociaciones existentes, uno
+a uno, descargando cada foto y subiéndola a Cloudinary (necesita red).
+
+Con --offline genera un conjunto sintético para pruebas de carga sin red:
+asociaciones, animales e imágenes (URLs de placeholder) deterministas para
+una misma --semilla, insertados con bulk_create en lotes de --lote filas.
+Nombres, fechas (contadas hacia atrás desde FECHA_BASE_SINTETICA) y tokens
+salen solo de la semilla, así que se obtienen los mismos datos en cualquier
+BD; por eso una semilla ya cargada no se puede volver a cargar.
+Como bulk_create no pasa por save() ni por las signals, aquí se rellena lo
+que harían ellos: tokens de las asociaciones, visible, fecha_adopcion y el
+índice de búsqueda. Con --sin-indice se omite el índice (más rápido; luego
+python manage.py reindexar_busqueda).
+
+    python manage.py poblar_animales --offline --count 1000000
+"""
 
 import random
 import hashlib
@@ -8,13 +27,164 @@ import io
 import time
 import cloudinary
 import cloudinary.uploader
-from django.core.management.base import BaseCommand
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.utils import timezone
 from django.conf import settings
-from myapp.models import RegistroAsociacion, CreacionAnimales
+from myapp.cache_animales import programar_invalidacion
+from myapp.indice_busqueda import tokens_de_animal
+from myapp.models import ESTADOS_VISIBLES, RegistroAsociacion, CreacionAnimales, ImagenAnimal, TokenBusquedaAnimal
+from myapp.panel_admin import invalidar_contadores
+
+# Datos para generar animales realistas
+NOMBRES_PERRO = [
+    'Max', 'Bella', 'Charlie', 'Lucy', 'Cooper', 'Luna', 'Buddy', 'Daisy', 'Rocky', 'Molly',
+    'Duke', 'Sophie', 'Bear', 'Sadie', 'Tucker', 'Chloe', 'Jake', 'Zoe', 'Rex', 'Maya',
+    'Leo', 'Mia', 'Zeus', 'Nala', 'Oscar', 'Emma', 'Toby', 'Lola', 'Rusty', 'Ruby',
+    'Bruno', 'Coco', 'Simba', 'Kira', 'Thor', 'Nina', 'Ace', 'Dora', 'Storm', 'Vera',
+    'Chico', 'Canela', 'Paco', 'Estrella', 'Rambo', 'Princesa', 'Firulais', 'Negra'
+]
+
+NOMBRES_GATO = [
+    'Oliver', 'Luna', 'Milo', 'Bella', 'Charlie', 'Chloe', 'Simba', 'Nala', 'Leo', 'Lily',
+    'Max', 'Sophie', 'Felix', 'Mia', 'Tiger', 'Zoe', 'Oscar', 'Emma', 'Shadow', 'Ruby',
+    'Smokey', 'Princess', 'Oreo', 'Midnight', 'Whiskers', 'Angel', 'Boots', 'Patches',
+    'Garfield', 'Misty', 'Tigger', 'Ginger', 'Salem', 'Snowball', 'Mittens', 'Pepper',
+    'Michi', 'Pelusa', 'Gatito', 'Blanquita', 'Negro', 'Copito', 'Manchas', 'Rayado'
+]
+
+NOMBRES_OTROS = [
+    'Bunny', 'Coco', 'Snowball', 'Oreo', 'Pepper', 'Cotton', 'Hazel', 'Honey', 'Ginger', 'Peanut',
+    'Tweety', 'Sunny', 'Sky', 'Cloud', 'Storm', 'Rainbow', 'Flash', 'Bolt', 'Spark', 'Star',
+    'Nibbles', 'Whiskers', 'Fluffy', 'Marshmallow', 'Caramel', 'Chocolate', 'Vanilla', 'Sugar'
+]
+
+RAZAS_PERRO = [
+    'Labrador', 'Golden Retriever', 'Pastor Alemán', 'Bulldog Francés', 'Bulldog Inglés',
+    'Beagle', 'Poodle', 'Rottweiler', 'Yorkshire Terrier', 'Chihuahua', 'Boxer', 'Husky',
+    'Border Collie', 'Cocker Spaniel', 'Schnauzer', 'Mastín', 'Galgo', 'Podenco',
+    'Mestizo', 'Cruce', 'Sin raza definida', 'Mix', 'Callejero'
+]
+
+RAZAS_GATO = [
+    'Persa', 'Siamés', 'Maine Coon', 'Británico de Pelo Corto', 'Ragdoll', 'Bengal',
+    'Abisinio', 'Ruso Azul', 'Sphynx', 'Scottish Fold', 'Norwegian Forest',
+    'Común Europeo', 'Mestizo', 'Callejero', 'Sin raza definida', 'Cruce', 'Doméstico'
+]
+
+RAZAS_OTROS = [
+    'Holandés', 'Enano', 'Gigante', 'Angora', 'Rex', 'Cabeza de León',  # Conejos
+    'Canario', 'Periquito', 'Cotorra', 'Ninfa', 'Agapornis', 'Jilguero',  # Pájaros
+    'Hámster Dorado', 'Hámster Ruso', 'Cobaya', 'Chinchilla', 'Hurón', 'Reptil'  # Otros
+]
+
+COLORES = [
+    'Negro', 'Blanco', 'Marrón', 'Gris', 'Dorado', 'Rubio', 'Rojizo', 'Chocolate',
+    'Crema', 'Canela', 'Tricolor', 'Bicolor', 'Atigrado', 'Manchado', 'Moteado',
+    'Negro y blanco', 'Marrón y blanco', 'Gris y blanco', 'Dorado y blanco'
+]
+
+PROVINCIAS_ES = [
+    'Madrid', 'Barcelona', 'Valencia', 'Sevilla', 'Málaga', 'Bilbao', 'Zaragoza',
+    'Murcia', 'Palma', 'Las Palmas', 'Córdoba', 'Valladolid', 'Vigo', 'Gijón',
+    'Alicante', 'Granada', 'Santander', 'Pamplona', 'Toledo', 'Burgos', 'Salamanca',
+    'Albacete', 'Cáceres', 'Badajoz', 'Jaén', 'Huelva', 'Ourense', 'León',
+    'Tarragona', 'Castellón', 'Almería', 'Cádiz', 'Lugo', 'Ávila', 'Cuenca'
+]
+
+POBLACIONES = {
+    'Madrid': ['Madrid', 'Móstoles', 'Alcalá de Henares', 'Fuenlabrada', 'Leganés'],
+    'Barcelona': ['Barcelona', 'Hospitalet', 'Terrassa', 'Badalona', 'Sabadell'],
+    'Valencia': ['Valencia', 'Alicante', 'Elche', 'Castellón', 'Torrent'],
+    'Sevilla': ['Sevilla', 'Jerez', 'Dos Hermanas', 'Alcalá de Guadaíra', 'Utrera'],
+    'Málaga': ['Málaga', 'Marbella', 'Fuengirola', 'Torremolinos', 'Benalmádena']
+}
+
+DESCRIPCIONES_TEMPLATES = [
+    "{nombre} es un {tipo} muy {adjetivo1} y {adjetivo2}. Le encanta {actividad} y busca una familia que le dé mucho amor.",
+    "Conoce a {nombre}, un adorable {tipo} de {edad}. Es {personalidad} y se lleva bien con {compatible}.",
+    "{nombre} es un {tipo} {adjetivo1} que necesita un hogar. Es perfecto para familias con {familia_tipo}.",
+    "Este precioso {tipo} llamado {nombre} está buscando su hogar definitivo. Es {personalidad} y muy {adjetivo2}.",
+    "{nombre} es un {tipo} rescatado que busca una segunda oportunidad. Le gusta {actividad} y es muy {adjetivo1}."
+]
+
+ADJETIVOS1 = ['cariñoso', 'juguetón', 'tranquilo', 'activo', 'dulce', 'noble', 'inteligente', 'fiel']
+ADJETIVOS2 = ['sociable', 'obediente', 'mimoso', 'alegre', 'paciente', 'protector', 'curioso', 'amoroso']
+PERSONALIDADES = ['muy sociable', 'algo tímido pero cariñoso', 'extremadamente juguetón', 'muy tranquilo', 'super activo']
+ACTIVIDADES = ['jugar en el parque', 'dar paseos', 'jugar con pelotas', 'recibir caricias', 'correr al aire libre']
+COMPATIBLES = ['niños', 'otros animales', 'personas mayores', 'toda la familia', 'gatos', 'perros']
+FAMILIA_TIPOS = ['niños', 'experiencia', 'mucho tiempo', 'jardín', 'paciencia']
+EDADES = ['pocos meses', '1 año', '2 años', '3 años', '4 años', '5 años', 'edad adulta']
+
+# Reparto de los datos sintéticos (--offline)
+TIPOS_SINTETICOS = [('Perro', 0.40), ('Gato', 0.35), ('Conejo', 0.10), ('Pájaro', 0.08), ('Otros', 0.07)]
+ESTADOS_SINTETICOS = [('activa', 0.85), ('suspendida', 0.05), ('pendiente', 0.05), ('rechazada', 0.05)]
+PORCENTAJE_ADOPTADOS = 0.15
+MAXIMO_IMAGENES_SINTETICAS = 3
+# Las fechas sintéticas se reparten en los --dias anteriores a esta fecha fija
+FECHA_BASE_SINTETICA = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+# Filas por INSERT de imágenes y tokens (hay varias por animal)
+FILAS_POR_INSERT = 2000
+
+
+@contextmanager
+def fechas_manuales(modelo, campo):
+    """Desactiva auto_now_add de un campo para poder repartir las fechas en bulk_create"""
+    field = modelo._meta.get_field(campo)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
 
 class Command(BaseCommand):
-    help = 'Poblar la base de datos con 500 animales variados con fotos en Cloudinary'
+    help = 'Poblar la base de datos con animales variados (fotos en Cloudinary, o sintéticos con --offline)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=500,
+            help='Número de animales a crear (por defecto 500)',
+        )
+        parser.add_argument(
+            '--offline',
+            action='store_true',
+            help='Generar datos sintéticos con bulk_create, sin descargar ni subir imágenes',
+        )
+        parser.add_argument(
+            '--asociaciones',
+            type=int,
+            default=None,
+            help='Asociaciones sintéticas a crear con --offline (por defecto una por cada 200 animales)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=5000,
+            help='Animales por bulk_create con --offline (por defecto 5000)',
+        )
+        parser.add_argument(
+            '--semilla',
+            type=int,
+            default=42,
+            help='Semilla de los datos sintéticos: la misma semilla genera los mismos datos (por defecto 42)',
+        )
+        parser.add_argument(
+            '--dias',
+            type=int,
+            default=365,
+            help='Los animales sintéticos se reparten en los N días anteriores a FECHA_BASE_SINTETICA (por defecto 365)',
+        )
+        parser.add_argument(
+            '--sin-indice',
+            action='store_true',
+            help='No generar el índice de búsqueda con --offline (usar luego reindexar_busqueda)',
+        )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -92,94 +262,18 @@ class Command(BaseCommand):
             return None
 
     def handle(self, *args, **options):
+        if options['offline']:
+            self.poblar_offline(options)
+            return
+
         # Verificar que hay asociaciones
         asociaciones = list(RegistroAsociacion.objects.filter(estado__in=['activa', 'pendiente']))
         if not asociaciones:
             self.stdout.write(self.style.ERROR('No hay asociaciones disponibles. Crea al menos una asociación primero.'))
             return
 
-        # Datos para generar animales realistas
-        nombres_perro = [
-            'Max', 'Bella', 'Charlie', 'Lucy', 'Cooper', 'Luna', 'Buddy', 'Daisy', 'Rocky', 'Molly',
-            'Duke', 'Sophie', 'Bear', 'Sadie', 'Tucker', 'Chloe', 'Jake', 'Zoe', 'Rex', 'Maya',
-            'Leo', 'Mia', 'Zeus', 'Nala', 'Oscar', 'Emma', 'Toby', 'Lola', 'Rusty', 'Ruby',
-            'Bruno', 'Coco', 'Simba', 'Kira', 'Thor', 'Nina', 'Ace', 'Dora', 'Storm', 'Vera',
-            'Chico', 'Canela', 'Paco', 'Estrella', 'Rambo', 'Princesa', 'Firulais', 'Negra'
-        ]
-
-        nombres_gato = [
-            'Oliver', 'Luna', 'Milo', 'Bella', 'Charlie', 'Chloe', 'Simba', 'Nala', 'Leo', 'Lily',
-            'Max', 'Sophie', 'Felix', 'Mia', 'Tiger', 'Zoe', 'Oscar', 'Emma', 'Shadow', 'Ruby',
-            'Smokey', 'Princess', 'Oreo', 'Midnight', 'Whiskers', 'Angel', 'Boots', 'Patches',
-            'Garfield', 'Misty', 'Tigger', 'Ginger', 'Salem', 'Snowball', 'Mittens', 'Pepper',
-            'Michi', 'Pelusa', 'Gatito', 'Blanquita', 'Negro', 'Copito', 'Manchas', 'Rayado'
-        ]
-
-        nombres_otros = [
-            'Bunny', 'Coco', 'Snowball', 'Oreo', 'Pepper', 'Cotton', 'Hazel', 'Honey', 'Ginger', 'Peanut',
-            'Tweety', 'Sunny', 'Sky', 'Cloud', 'Storm', 'Rainbow', 'Flash', 'Bolt', 'Spark', 'Star',
-            'Nibbles', 'Whiskers', 'Fluffy', 'Marshmallow', 'Caramel', 'Chocolate', 'Vanilla', 'Sugar'
-        ]
-
-        razas_perro = [
-            'Labrador', 'Golden Retriever', 'Pastor Alemán', 'Bulldog Francés', 'Bulldog Inglés',
-            'Beagle', 'Poodle', 'Rottweiler', 'Yorkshire Terrier', 'Chihuahua', 'Boxer', 'Husky',
-            'Border Collie', 'Cocker Spaniel', 'Schnauzer', 'Mastín', 'Galgo', 'Podenco',
-            'Mestizo', 'Cruce', 'Sin raza definida', 'Mix', 'Callejero'
-        ]
-
-        razas_gato = [
-            'Persa', 'Siamés', 'Maine Coon', 'Británico de Pelo Corto', 'Ragdoll', 'Bengal',
-            'Abisinio', 'Ruso Azul', 'Sphynx', 'Scottish Fold', 'Norwegian Forest',
-            'Común Europeo', 'Mestizo', 'Callejero', 'Sin raza definida', 'Cruce', 'Doméstico'
-        ]
-
-        razas_otros = [
-            'Holandés', 'Enano', 'Gigante', 'Angora', 'Rex', 'Cabeza de León',  # Conejos
-            'Canario', 'Periquito', 'Cotorra', 'Ninfa', 'Agapornis', 'Jilguero',  # Pájaros
-            'Hámster Dorado', 'Hámster Ruso', 'Cobaya', 'Chinchilla', 'Hurón', 'Reptil'  # Otros
-        ]
-
-        colores = [
-            'Negro', 'Blanco', 'Marrón', 'Gris', 'Dorado', 'Rubio', 'Rojizo', 'Chocolate',
-            'Crema', 'Canela', 'Tricolor', 'Bicolor', 'Atigrado', 'Manchado', 'Moteado',
-            'Negro y blanco', 'Marrón y blanco', 'Gris y blanco', 'Dorado y blanco'
-        ]
-
-        provincias_es = [
-            'Madrid', 'Barcelona', 'Valencia', 'Sevilla', 'Málaga', 'Bilbao', 'Zaragoza',
-            'Murcia', 'Palma', 'Las Palmas', 'Córdoba', 'Valladolid', 'Vigo', 'Gijón',
-            'Alicante', 'Granada', 'Santander', 'Pamplona', 'Toledo', 'Burgos', 'Salamanca',
-            'Albacete', 'Cáceres', 'Badajoz', 'Jaén', 'Huelva', 'Ourense', 'León',
-            'Tarragona', 'Castellón', 'Almería', 'Cádiz', 'Lugo', 'Ávila', 'Cuenca'
-        ]
-
-        poblaciones = {
-            'Madrid': ['Madrid', 'Móstoles', 'Alcalá de Henares', 'Fuenlabrada', 'Leganés'],
-            'Barcelona': ['Barcelona', 'Hospitalet', 'Terrassa', 'Badalona', 'Sabadell'],
-            'Valencia': ['Valencia', 'Alicante', 'Elche', 'Castellón', 'Torrent'],
-            'Sevilla': ['Sevilla', 'Jerez', 'Dos Hermanas', 'Alcalá de Guadaíra', 'Utrera'],
-            'Málaga': ['Málaga', 'Marbella', 'Fuengirola', 'Torremolinos', 'Benalmádena']
-        }
-
-        descripciones_templates = [
-            "{nombre} es un {tipo} muy {adjetivo1} y {adjetivo2}. Le encanta {actividad} y busca una familia que le dé mucho amor.",
-            "Conoce a {nombre}, un adorable {tipo} de {edad}. Es {personalidad} y se lleva bien con {compatible}.",
-            "{nombre} es un {tipo} {adjetivo1} que necesita un hogar. Es perfecto para familias con {familia_tipo}.",
-            "Este precioso {tipo} llamado {nombre} está buscando su hogar definitivo. Es {personalidad} y muy {adjetivo2}.",
-            "{nombre} es un {tipo} rescatado que busca una segunda oportunidad. Le gusta {actividad} y es muy {adjetivo1}."
-        ]
-
-        adjetivos1 = ['cariñoso', 'juguetón', 'tranquilo', 'activo', 'dulce', 'noble', 'inteligente', 'fiel']
-        adjetivos2 = ['sociable', 'obediente', 'mimoso', 'alegre', 'paciente', 'protector', 'curioso', 'amoroso']
-        personalidades = ['muy sociable', 'algo tímido pero cariñoso', 'extremadamente juguetón', 'muy tranquilo', 'super activo']
-        actividades = ['jugar en el parque', 'dar paseos', 'jugar con pelotas', 'recibir caricias', 'correr al aire libre']
-        compatibles = ['niños', 'otros animales', 'personas mayores', 'toda la familia', 'gatos', 'perros']
-        familia_tipos = ['niños', 'experiencia', 'mucho tiempo', 'jardín', 'paciencia']
-        edades = ['pocos meses', '1 año', '2 años', '3 años', '4 años', '5 años', 'edad adulta']
-
         # Contadores para distribución
-        total_animales = 500
+        total_animales = options['count']
         perros_cantidad = int(total_animales * 0.40)  # 40% = 200
         gatos_cantidad = int(total_animales * 0.35)   # 35% = 175
         otros_cantidad = total_animales - perros_cantidad - gatos_cantidad  # 25% = 125
@@ -190,21 +284,21 @@ class Command(BaseCommand):
 
         # Crear perros
         for i in range(perros_cantidad):
-            nombre = random.choice(nombres_perro)
+            nombre = random.choice(NOMBRES_PERRO)
             asociacion = random.choice(asociaciones)
-            provincia = random.choice(provincias_es)
-            poblacion = poblaciones.get(provincia, [provincia])[0] if provincia in poblaciones else provincia
+            provincia = random.choice(PROVINCIAS_ES)
+            poblacion = POBLACIONES.get(provincia, [provincia])[0] if provincia in POBLACIONES else provincia
             
-            descripcion = random.choice(descripciones_templates).format(
+            descripcion = random.choice(DESCRIPCIONES_TEMPLATES).format(
                 nombre=nombre,
                 tipo='perro',
-                adjetivo1=random.choice(adjetivos1),
-                adjetivo2=random.choice(adjetivos2),
-                actividad=random.choice(actividades),
-                personalidad=random.choice(personalidades),
-                edad=random.choice(edades),
-                compatible=random.choice(compatibles),
-                familia_tipo=random.choice(familia_tipos)
+                adjetivo1=random.choice(ADJETIVOS1),
+                adjetivo2=random.choice(ADJETIVOS2),
+                actividad=random.choice(ACTIVIDADES),
+                personalidad=random.choice(PERSONALIDADES),
+                edad=random.choice(EDADES),
+                compatible=random.choice(COMPATIBLES),
+                familia_tipo=random.choice(FAMILIA_TIPOS)
             )
 
             # Descargar y subir imagen a Cloudinary
@@ -214,8 +308,8 @@ class Command(BaseCommand):
                 asociacion=asociacion,
                 nombre=f"{nombre} {random.randint(1, 999)}" if random.random() < 0.3 else nombre,
                 tipo_de_animal='Perro',
-                raza=random.choice(razas_perro),
-                color=random.choice(colores),
+                raza=random.choice(RAZAS_PERRO),
+                color=random.choice(COLORES),
                 email=asociacion.email,
                 telefono=asociacion.telefono,
                 poblacion=poblacion,
@@ -232,21 +326,21 @@ class Command(BaseCommand):
 
         # Crear gatos
         for i in range(gatos_cantidad):
-            nombre = random.choice(nombres_gato)
+            nombre = random.choice(NOMBRES_GATO)
             asociacion = random.choice(asociaciones)
-            provincia = random.choice(provincias_es)
-            poblacion = poblaciones.get(provincia, [provincia])[0] if provincia in poblaciones else provincia
+            provincia = random.choice(PROVINCIAS_ES)
+            poblacion = POBLACIONES.get(provincia, [provincia])[0] if provincia in POBLACIONES else provincia
             
-            descripcion = random.choice(descripciones_templates).format(
+            descripcion = random.choice(DESCRIPCIONES_TEMPLATES).format(
                 nombre=nombre,
                 tipo='gato',
-                adjetivo1=random.choice(adjetivos1),
-                adjetivo2=random.choice(adjetivos2),
+                adjetivo1=random.choice(ADJETIVOS1),
+                adjetivo2=random.choice(ADJETIVOS2),
                 actividad=random.choice(['dormir al sol', 'jugar con ratones de juguete', 'explorar', 'ronronear']),
-                personalidad=random.choice(personalidades),
-                edad=random.choice(edades),
-                compatible=random.choice(compatibles),
-                familia_tipo=random.choice(familia_tipos)
+                personalidad=random.choice(PERSONALIDADES),
+                edad=random.choice(EDADES),
+                compatible=random.choice(COMPATIBLES),
+                familia_tipo=random.choice(FAMILIA_TIPOS)
             )
 
             # Descargar y subir imagen a Cloudinary
@@ -256,8 +350,8 @@ class Command(BaseCommand):
                 asociacion=asociacion,
                 nombre=f"{nombre} {random.randint(1, 999)}" if random.random() < 0.3 else nombre,
                 tipo_de_animal='Gato',
-                raza=random.choice(razas_gato),
-                color=random.choice(colores),
+                raza=random.choice(RAZAS_GATO),
+                color=random.choice(COLORES),
                 email=asociacion.email,
                 telefono=asociacion.telefono,
                 poblacion=poblacion,
@@ -277,27 +371,27 @@ class Command(BaseCommand):
         for i in range(otros_cantidad):
             tipo = random.choice(tipos_otros)
             if tipo == 'Conejo':
-                nombres_pool = ['Copito', 'Pelusa', 'Blanquito', 'Orejitas', 'Saltarín'] + nombres_otros[:15]
+                nombres_pool = ['Copito', 'Pelusa', 'Blanquito', 'Orejitas', 'Saltarín'] + NOMBRES_OTROS[:15]
             elif tipo == 'Pájaro':
-                nombres_pool = ['Pío', 'Cantor', 'Plumitas', 'Colorín', 'Melodía'] + nombres_otros[10:20]
+                nombres_pool = ['Pío', 'Cantor', 'Plumitas', 'Colorín', 'Melodía'] + NOMBRES_OTROS[10:20]
             else:
-                nombres_pool = nombres_otros
+                nombres_pool = NOMBRES_OTROS
 
             nombre = random.choice(nombres_pool)
             asociacion = random.choice(asociaciones)
-            provincia = random.choice(provincias_es)
-            poblacion = poblaciones.get(provincia, [provincia])[0] if provincia in poblaciones else provincia
+            provincia = random.choice(PROVINCIAS_ES)
+            poblacion = POBLACIONES.get(provincia, [provincia])[0] if provincia in POBLACIONES else provincia
             
-            descripcion = random.choice(descripciones_templates).format(
+            descripcion = random.choice(DESCRIPCIONES_TEMPLATES).format(
                 nombre=nombre,
                 tipo=tipo.lower(),
-                adjetivo1=random.choice(adjetivos1),
-                adjetivo2=random.choice(adjetivos2),
+                adjetivo1=random.choice(ADJETIVOS1),
+                adjetivo2=random.choice(ADJETIVOS2),
                 actividad=random.choice(['explorar', 'jugar', 'socializar', 'ejercitarse']),
-                personalidad=random.choice(personalidades),
-                edad=random.choice(edades),
-                compatible=random.choice(compatibles),
-                familia_tipo=random.choice(familia_tipos)
+                personalidad=random.choice(PERSONALIDADES),
+                edad=random.choice(EDADES),
+                compatible=random.choice(COMPATIBLES),
+                familia_tipo=random.choice(FAMILIA_TIPOS)
             )
 
             # Descargar y subir imagen a Cloudinary
@@ -307,8 +401,8 @@ class Command(BaseCommand):
                 asociacion=asociacion,
                 nombre=f"{nombre} {random.randint(1, 999)}" if random.random() < 0.3 else nombre,
                 tipo_de_animal=tipo,
-                raza=random.choice(razas_otros),
-                color=random.choice(colores),
+                raza=random.choice(RAZAS_OTROS),
+                color=random.choice(COLORES),
                 email=asociacion.email,
                 telefono=asociacion.telefono,
                 poblacion=poblacion,
@@ -345,4 +439,146 @@ class Command(BaseCommand):
                 f'- Disponibles: {disponibles}\n'
                 f'- Adoptados: {adoptados}'
             )
-        )
\ No newline at end of file
+        )
+
+    # ==================== MODO OFFLINE ====================
+
+    def poblar_offline(self, options):
+        """Genera asociaciones, animales e imágenes sintéticos con bulk_create"""
+        azar = random.Random(options['semilla'])
+        total = options['count']
+        lote = options['lote']
+        num_asociaciones = options['asociaciones'] or max(1, total // 200)
+        inicio = time.time()
+
+        asociaciones = self.crear_asociaciones_sinteticas(azar, options['semilla'], num_asociaciones, options['dias'])
+        self.stdout.write(f'🏠 {len(asociaciones)} asociaciones sintéticas creadas')
+
+        tipos, pesos_tipos = zip(*TIPOS_SINTETICOS)
+        creados = 0
+        imagenes_creadas = 0
+
+        with fechas_manuales(CreacionAnimales, 'fecha_creacion'):
+            while creados < total:
+                animales = []
+                for n in range(creados, min(creados + lote, total)):
+                    animales.append(self.animal_sintetico(
+                        azar, n, azar.choice(asociaciones), azar.choices(tipos, pesos_tipos)[0],
+                        FECHA_BASE_SINTETICA - timedelta(seconds=azar.randint(0, options['dias'] * 86400)),
+                    ))
+
+                with transaction.atomic():
+                    # En PostgreSQL y SQLite bulk_create devuelve los ids
+                    CreacionAnimales.objects.bulk_create(animales, batch_size=lote)
+                    imagenes = []
+                    for animal in animales:
+                        for orden in range(azar.randint(1, MAXIMO_IMAGENES_SINTETICAS)):
+                            imagenes.append(ImagenAnimal(
+                                animal_id=animal.id,
+                                imagen=f'https://placehold.co/800x600.webp?text={animal.tipo_de_animal}+{animal.id}-{orden}',
+                                orden=orden,
+                                es_principal=orden == 0,
+                            ))
+                    ImagenAnimal.objects.bulk_create(imagenes, batch_size=FILAS_POR_INSERT)
+                    if not options['sin_indice']:
+                        tokens = [token for animal in animales for token in tokens_de_animal(animal)]
+                        TokenBusquedaAnimal.objects.bulk_create(tokens, batch_size=FILAS_POR_INSERT)
+
+                creados += len(animales)
+                imagenes_creadas += len(imagenes)
+                transcurrido = time.time() - inicio
+                self.stdout.write(f'  {creados}/{total} animales ({creados / transcurrido:.0f}/s)')
+
+        # bulk_create no lanza signals: invalidar a mano
+        programar_invalidacion()
+        invalidar_contadores()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {creados} animales y {imagenes_creadas} imágenes sintéticos creados '
+            f'en {time.time() - inicio:.1f}s'
+        ))
+        if options['sin_indice']:
+            self.stdout.write(self.style.WARNING('⚠️  Índice de búsqueda sin generar: python manage.py reindexar_busqueda'))
+        self.stdout.write('📊 Para las estadísticas: python manage.py actualizar_estadisticas')
+
+    def crear_asociaciones_sinteticas(self, azar, semilla, cantidad, dias):
+        """Crea las asociaciones sintéticas y las devuelve (con id)"""
+        estados, pesos = zip(*ESTADOS_SINTETICOS)
+        # Los nombres (únicos) dependen solo de la semilla, no de lo que ya haya en la BD
+        prefijo = f'Protectora Sintética {semilla}-'
+        if RegistroAsociacion.objects.filter(nombre__startswith=prefijo).exists():
+            raise CommandError(
+                f'Los datos de la semilla {semilla} ya están cargados: usa otra --semilla o vacía la base de datos'
+            )
+        # Sin contraseña utilizable: no se puede iniciar sesión con ellas
+        password = make_password(None)
+
+        asociaciones = []
+        for n in range(1, cantidad + 1):
+            provincia = azar.choice(PROVINCIAS_ES)
+            estado = azar.choices(estados, pesos)[0]
+            fecha_registro = FECHA_BASE_SINTETICA - timedelta(seconds=azar.randint(0, dias * 86400))
+            asociaciones.append(RegistroAsociacion(
+                nombre=f'{prefijo}{n}',
+                password=password,
+                email=f'protectora{semilla}-{n}@sintetica.test',
+                telefono=f'6{azar.randint(0, 99999999):08d}',
+                direccion=f'Calle Sintética {n}',
+                poblacion=POBLACIONES.get(provincia, [provincia])[0],
+                provincia=provincia,
+                codigo_postal=f'{azar.randint(10000, 52999)}',
+                estado=estado,
+                fecha_aprobacion=fecha_registro if estado in ESTADOS_VISIBLES else None,
+                fecha_rechazo=fecha_registro if estado == 'rechazada' else None,
+                # Solo son datos de prueba: tokens reproducibles en vez de secrets
+                token_gestion=f'{azar.getrandbits(256):064x}',
+                token_aprobacion=f'{azar.getrandbits(256):064x}',
+            ))
+
+        with fechas_manuales(RegistroAsociacion, 'fecha_registro'):
+            for asociacion in asociaciones:
+                asociacion.fecha_registro = asociacion.fecha_aprobacion or asociacion.fecha_rechazo or FECHA_BASE_SINTETICA
+            RegistroAsociacion.objects.bulk_create(asociaciones, batch_size=1000)
+        return asociaciones
+
+    def animal_sintetico(self, azar, n, asociacion, tipo, fecha_creacion):
+        """Un CreacionAnimales sin guardar, con los campos que rellenaría save()"""
+        if tipo == 'Perro':
+            nombres, razas = NOMBRES_PERRO, RAZAS_PERRO
+        elif tipo == 'Gato':
+            nombres, razas = NOMBRES_GATO, RAZAS_GATO
+        else:
+            nombres, razas = NOMBRES_OTROS, RAZAS_OTROS
+        nombre = azar.choice(nombres)
+        provincia = azar.choice(PROVINCIAS_ES)
+        adoptado = azar.random() < PORCENTAJE_ADOPTADOS
+
+        return CreacionAnimales(
+            asociacion_id=asociacion.id,
+            nombre=f'{nombre} {n}',
+            tipo_de_animal=tipo,
+            raza=azar.choice(razas),
+            color=azar.choice(COLORES),
+            tamano=azar.choice(CreacionAnimales.TAMANOS)[0],
+            email=asociacion.email,
+            telefono=asociacion.telefono,
+            poblacion=POBLACIONES.get(provincia, [provincia])[0],
+            provincia=provincia,
+            codigo_postal=f'{azar.randint(10000, 52999)}',
+            descripcion=azar.choice(DESCRIPCIONES_TEMPLATES).format(
+                nombre=nombre,
+                tipo=tipo.lower(),
+                adjetivo1=azar.choice(ADJETIVOS1),
+                adjetivo2=azar.choice(ADJETIVOS2),
+                actividad=azar.choice(ACTIVIDADES),
+                personalidad=azar.choice(PERSONALIDADES),
+                edad=azar.choice(EDADES),
+                compatible=azar.choice(COMPATIBLES),
+                familia_tipo=azar.choice(FAMILIA_TIPOS),
+            ),
+            imagen=f'https://placehold.co/800x600.webp?text={tipo}+{n}',
+            fecha_creacion=fecha_creacion,
+            adoptado=adoptado,
+            fecha_adopcion=min(fecha_creacion + timedelta(days=azar.randint(1, 60)), FECHA_BASE_SINTETICA) if adoptado else None,
+            visible=asociacion.estado in ESTADOS_VISIBLES,
+        )
@@ -0,0 +1,76 @@
+# myapp/management/commands/procesar_notificaciones.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from myapp.models import NotificacionSaliente
+from myapp.notificaciones import LOTE_POR_DEFECTO, procesar_pendientes, reintentar_fallidas
+
+class Command(BaseCommand):
+    help = 'Envía los emails y mensajes de Telegram pendientes de la cola de notificaciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='No terminar: seguir consultando la cola (modo worker)',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5,
+            help='Segundos de espera cuando la cola está vacía (por defecto 5)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=LOTE_POR_DEFECTO,
+            help=f'Notificaciones reclamadas por vuelta (por defecto {LOTE_POR_DEFECTO})',
+        )
+        parser.add_argument(
+            '--reintentar-fallidas',
+            action='store_true',
+            help='Devolver a la cola las notificaciones que agotaron sus reintentos',
+        )
+
+    def handle(self, *args, **options):
+        if options['reintentar_fallidas']:
+            cantidad = reintentar_fallidas()
+            self.stdout.write(self.style.WARNING(f"♻️  {cantidad} notificaciones fallidas devueltas a la cola"))
+
+        if not options['continuo']:
+            total = {'enviadas': 0, 'errores': 0}
+            while True:
+                resultado = procesar_pendientes(options['lote'])
+                total['enviadas'] += resultado['enviadas']
+                total['errores'] += resultado['errores']
+                if not resultado['enviadas'] and not resultado['errores']:
+                    break
+            self.mostrar_resumen(total)
+            return
+
+        self.stdout.write(self.style.SUCCESS("📬 Worker de notificaciones iniciado (Ctrl+C para salir)"))
+        try:
+            while True:
+                close_old_connections()
+                resultado = procesar_pendientes(options['lote'])
+                if resultado['enviadas'] or resultado['errores']:
+                    self.stdout.write(
+                        f"✉️  {resultado['enviadas']} enviadas, {resultado['errores']} con error"
+                    )
+                else:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("\n⏹️  Worker detenido"))
+
+    def mostrar_resumen(self, total):
+        self.stdout.write("="*60)
+        self.stdout.write(self.style.SUCCESS("📬 COLA DE NOTIFICACIONES"))
+        self.stdout.write("="*60)
+        self.stdout.write(f"Enviadas en esta ejecución: {total['enviadas']}")
+        self.stdout.write(f"Con error (se reintentarán): {total['errores']}")
+        for estado, nombre in NotificacionSaliente.ESTADOS:
+            cantidad = NotificacionSaliente.objects.filter(estado=estado).count()
+            self.stdout.write(f"   {nombre:<12} {cantidad}")
+        self.stdout.write("="*60)
@@ -0,0 +1,87 @@
+# myapp/management/commands/procesar_updates_telegram.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from myapp.models import UpdateTelegram
+from myapp.updates_telegram import LOTE_POR_DEFECTO, procesar_pendientes, purgar_procesados
+
+# Cada cuántas vueltas del worker se borran los updates antiguos
+VUELTAS_ENTRE_PURGAS = 1000
+
+class Command(BaseCommand):
+    help = 'Procesa los updates del bot de Telegram guardados por el webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='No terminar: seguir consultando la cola (modo worker)',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=0.5,
+            help='Segundos de espera cuando no hay updates (por defecto 0.5)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=LOTE_POR_DEFECTO,
+            help=f'Updates reclamados por vuelta, como mucho uno por chat (por defecto {LOTE_POR_DEFECTO})',
+        )
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=1,
+            help='Chats atendidos en paralelo en modo continuo (por defecto 1)',
+        )
+
+    def handle(self, *args, **options):
+        if not options['continuo']:
+            total = {'procesados': 0, 'errores': 0}
+            while True:
+                resultado = procesar_pendientes(options['lote'])
+                total['procesados'] += resultado['procesados']
+                total['errores'] += resultado['errores']
+                if not resultado['procesados'] and not resultado['errores']:
+                    break
+            purgar_procesados()
+            self.mostrar_resumen(total)
+            return
+
+        self.stdout.write(self.style.SUCCESS("🤖 Worker de updates de Telegram iniciado (Ctrl+C para salir)"))
+        executor = ThreadPoolExecutor(options['hilos'], thread_name_prefix='updates-telegram') if options['hilos'] > 1 else None
+        vueltas = 0
+        try:
+            while True:
+                close_old_connections()
+                resultado = procesar_pendientes(options['lote'], executor)
+                if resultado['procesados'] or resultado['errores']:
+                    self.stdout.write(
+                        f"📨 {resultado['procesados']} procesados, {resultado['errores']} con error"
+                    )
+                else:
+                    time.sleep(options['intervalo'])
+
+                vueltas += 1
+                if vueltas % VUELTAS_ENTRE_PURGAS == 0:
+                    purgar_procesados()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("\n⏹️  Worker detenido"))
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+
+    def mostrar_resumen(self, total):
+        self.stdout.write("="*60)
+        self.stdout.write(self.style.SUCCESS("🤖 UPDATES DE TELEGRAM"))
+        self.stdout.write("="*60)
+        self.stdout.write(f"Procesados en esta ejecución: {total['procesados']}")
+        self.stdout.write(f"Con error: {total['errores']}")
+        for estado, nombre in UpdateTelegram.ESTADOS:
+            cantidad = UpdateTelegram.objects.filter(estado=estado).count()
+            self.stdout.write(f"   {nombre:<12} {cantidad}")
+        self.stdout.write("="*60)
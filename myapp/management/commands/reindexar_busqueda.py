@@ -0,0 +1,22 @@
+# myapp/management/commands/reindexar_busqueda.py
+
+from django.core.management.base import BaseCommand
+from myapp.indice_busqueda import reindexar_todo
+from myapp.models import TokenBusquedaAnimal
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de texto (sin tildes) que usa la página de resultados de búsqueda'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=500,
+            help='Número de tokens que se insertan por consulta (por defecto 500)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("🔎 Reindexando animales...")
+        total = reindexar_todo(tamano_lote=options['lote'])
+        tokens = TokenBusquedaAnimal.objects.count()
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} animales indexados ({tokens} tokens)"))
@@ -0,0 +1,118 @@
+# myapp/management/commands/telegram_poll.py
+"""
+Recibe los updates del bot con long polling (getUpdates) en vez de webhook
+
+Para entornos sin URL pública (local, staging): no hace falta ngrok.
+Los updates se guardan en la misma cola que usa el webhook y se procesan
+con el mismo despacho (procesar_update), en orden dentro de cada chat y
+con varios chats en paralelo (--hilos).
+
+Telegram no entrega updates por getUpdates mientras haya un webhook
+configurado: usar --eliminar-webhook la primera vez.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from myapp.telegram_client import ErrorTelegram, TelegramClient
+from myapp.telegram_utils import TELEGRAM_BOT_TOKEN
+from myapp.updates_telegram import LOTE_POR_DEFECTO, guardar_update, procesar_pendientes, ultimo_update_id
+
+# Tipos de update que maneja procesar_update
+TIPOS_UPDATE = ['message', 'callback_query']
+
+# Espera tras un error de la API antes de volver a consultar
+ESPERA_TRAS_ERROR = 5
+
+class Command(BaseCommand):
+    help = 'Recibe y procesa los updates del bot de Telegram con long polling (alternativa al webhook)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=30,
+            help='Segundos que Telegram mantiene abierta cada consulta si no hay updates (por defecto 30)',
+        )
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=4,
+            help='Chats atendidos en paralelo (por defecto 4)',
+        )
+        parser.add_argument(
+            '--eliminar-webhook',
+            action='store_true',
+            help='Eliminar el webhook configurado antes de empezar',
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Hacer una sola consulta, procesar lo recibido y terminar',
+        )
+
+    def handle(self, *args, **options):
+        cliente = TelegramClient(TELEGRAM_BOT_TOKEN, max_reintentos=0)
+        executor = ThreadPoolExecutor(options['hilos'], thread_name_prefix='telegram-poll') if options['hilos'] > 1 else None
+
+        if options['eliminar_webhook']:
+            cliente.llamar('deleteWebhook')
+            self.stdout.write(self.style.WARNING("🗑️  Webhook eliminado"))
+
+        # Continuar después del último update guardado (por webhook o por polling)
+        ultimo = ultimo_update_id()
+        offset = ultimo + 1 if ultimo is not None else None
+
+        if not options['una_vez']:
+            self.stdout.write(self.style.SUCCESS("📡 Long polling de Telegram iniciado (Ctrl+C para salir)"))
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    parametros = {
+                        'timeout': 0 if options['una_vez'] else options['timeout'],
+                        'allowed_updates': TIPOS_UPDATE,
+                    }
+                    if offset is not None:
+                        parametros['offset'] = offset
+                    updates = cliente.llamar('getUpdates', parametros, timeout=options['timeout'] + 10)
+                except ErrorTelegram as e:
+                    if e.codigo == 409:
+                        raise CommandError(
+                            "Hay un webhook configurado y Telegram no permite getUpdates: "
+                            "vuelve a ejecutar con --eliminar-webhook"
+                        )
+                    self.stderr.write(f"❌ Error consultando updates: {e}")
+                    if options['una_vez']:
+                        return
+                    time.sleep(ESPERA_TRAS_ERROR)
+                    continue
+
+                nuevos = 0
+                for update in updates or []:
+                    # El siguiente getUpdates con este offset confirma los recibidos
+                    offset = max(offset or 0, update['update_id'] + 1)
+                    nuevos += guardar_update(update)
+
+                self.procesar_cola(executor)
+                if nuevos:
+                    self.stdout.write(f"📨 {nuevos} updates recibidos")
+                if options['una_vez']:
+                    break
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("\n⏹️  Long polling detenido"))
+        finally:
+            if executor:
+                executor.shutdown(wait=True)
+            cliente.close()
+
+    def procesar_cola(self, executor):
+        """Procesa la cola hasta vaciarla (un update por chat en cada vuelta)"""
+        while True:
+            resultado = procesar_pendientes(LOTE_POR_DEFECTO, executor)
+            if not resultado['procesados'] and not resultado['errores']:
+                return
+            if resultado['errores']:
+                self.stderr.write(f"⚠️  {resultado['errores']} updates con error")
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# myapp/media_storage.py
+"""
+Almacenamiento de las imagenes y videos de los animales
+
+cloudinary_storage y backblaze_storage tenian APIs distintas, y para borrar
+se volvia a deducir el public_id (y el tipo) de cada URL y se hacia una
+llamada por archivo. Ahora hay una interfaz comun, MediaStorage, y
+MEDIA_STORAGE_BACKEND elige la implementacion (ruta con puntos, como los
+BACKEND de CACHES):
+
+- myapp.cloudinary_storage.CloudinaryStorage (por defecto)
+- myapp.backblaze_storage.BackblazeStorage
+- myapp.media_storage.LocalMediaStorage: ficheros en MEDIA_ROOT (tests y
+  desarrollo sin red)
+
+subir() devuelve la URL y la clave del proveedor (public_id o key), que se
+guarda en ImagenAnimal.clave / VideoAnimal.clave. borrar() recibe muchas
+claves y las borra por lotes (delete_resources de Cloudinary, delete_objects
+de S3): borrar un animal con 10 fotos y 5 videos son dos llamadas.
+listar() recorre una carpeta por paginas; lo usa el comando
+limpiar_medios_huerfanos para encontrar archivos que ya no usa ninguna fila.
+"""
+
+import logging
+import os
+import uuid
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Carpetas logicas; cada proveedor las traduce a las suyas
+CARPETAS = ('fotos', 'miniaturas', 'videos')
+
+ArchivoSubido = namedtuple('ArchivoSubido', ['url', 'clave'])
+
+# Archivo listado del almacen (fecha: datetime con zona horaria, tamano: bytes)
+ArchivoAlmacen = namedtuple('ArchivoAlmacen', ['clave', 'fecha', 'tamano'])
+
+# Archivos por pagina de listar()
+TAMANO_PAGINA = 500
+
+
+class MediaStorage:
+    """Interfaz comun de los almacenes de imagenes y videos"""
+
+    @property
+    def nombre(self):
+        """Cuenta o bucket del almacen (lo que pide limpiar_medios_huerfanos --confirmar)"""
+        raise NotImplementedError
+
+    def subir(self, fichero, carpeta, tipo='imagen', progreso=None):
+        """
+        Sube un archivo.
+
+        Args:
+            fichero: archivo abierto en modo binario (con .name)
+            carpeta: una de CARPETAS
+            tipo: 'imagen' o 'video'
+            progreso: funcion opcional que recibe los bytes ya subidos
+
+        Returns:
+            ArchivoSubido: (url, clave), o None si hay error
+        """
+        raise NotImplementedError
+
+    def borrar(self, claves, tipo='imagen'):
+        """
+        Borra muchos archivos del mismo tipo con el minimo de llamadas.
+
+        Returns:
+            int: archivos borrados
+        """
+        raise NotImplementedError
+
+    def clave_desde_url(self, url):
+        """Clave de un archivo a partir de su URL (filas anteriores a la columna clave)"""
+        raise NotImplementedError
+
+    def listar(self, carpeta, tipo='imagen'):
+        """
+        Recorre los archivos de una carpeta por paginas.
+
+        Yields:
+            list: ArchivoAlmacen de cada pagina (como mucho TAMANO_PAGINA)
+        """
+        raise NotImplementedError
+
+
+class LocalMediaStorage(MediaStorage):
+    """Archivos en MEDIA_ROOT/animales, servidos desde MEDIA_URL"""
+
+    nombre = 'local'
+
+    @property
+    def storage(self):
+        # Se lee MEDIA_ROOT en cada uso (la instancia se reutiliza y los tests lo cambian)
+        return FileSystemStorage(
+            location=os.path.join(settings.MEDIA_ROOT, 'animales'),
+            base_url=f"{settings.MEDIA_URL}animales/",
+        )
+
+    def subir(self, fichero, carpeta, tipo='imagen', progreso=None):
+        storage = self.storage
+        ext = os.path.splitext(getattr(fichero, 'name', '') or '')[1].lower()
+        clave = storage.save(f"{carpeta}/{uuid.uuid4()}{ext}", File(fichero))
+        if progreso:
+            progreso(storage.size(clave))
+        return ArchivoSubido(storage.url(clave), clave)
+
+    def borrar(self, claves, tipo='imagen'):
+        storage = self.storage
+        borrados = 0
+        for clave in claves:
+            if storage.exists(clave):
+                storage.delete(clave)
+                borrados += 1
+        return borrados
+
+    def clave_desde_url(self, url):
+        prefijo = self.storage.base_url
+        return url[len(prefijo):] if url and url.startswith(prefijo) else None
+
+    def listar(self, carpeta, tipo='imagen'):
+        storage = self.storage
+        if not storage.exists(carpeta):
+            return
+        _, ficheros = storage.listdir(carpeta)
+        for inicio in range(0, len(ficheros), TAMANO_PAGINA):
+            pagina = []
+            for fichero in ficheros[inicio:inicio + TAMANO_PAGINA]:
+                clave = f"{carpeta}/{fichero}"
+                pagina.append(ArchivoAlmacen(clave, storage.get_modified_time(clave), storage.size(clave)))
+            yield pagina
+
+
+@lru_cache(maxsize=None)
+def _instancia(ruta):
+    return import_string(ruta)()
+
+
+def obtener_storage():
+    """Almacen configurado en MEDIA_STORAGE_BACKEND (una instancia por proceso)"""
+    return _instancia(settings.MEDIA_STORAGE_BACKEND)
+
+
+def _claves(filas, campo_clave, campo_url=None):
+    storage = obtener_storage()
+    claves = set()
+    for fila in filas:
+        clave = getattr(fila, campo_clave)
+        if not clave and campo_url:
+            clave = storage.clave_desde_url(getattr(fila, campo_url))
+        if clave:
+            claves.add(clave)
+    return claves
+
+
+def programar_borrado(imagenes=(), videos=(), urls_imagenes=(), urls_videos=()):
+    """
+    Borra del almacen los archivos de estas filas cuando se confirme la transaccion.
+
+    Args:
+        imagenes, videos: ImagenAnimal / VideoAnimal (ya leidas de la BD)
+        urls_imagenes, urls_videos: URLs sueltas (campos legacy del animal)
+    """
+    storage = obtener_storage()
+    # Las miniaturas de las subidas directas son transformaciones (sin clave)
+    claves_imagenes = _claves(imagenes, 'clave', 'imagen') | _claves(imagenes, 'clave_miniatura')
+    claves_imagenes |= {storage.clave_desde_url(url) for url in urls_imagenes if url} - {None}
+    claves_videos = _claves(videos, 'clave', 'video')
+    claves_videos |= {storage.clave_desde_url(url) for url in urls_videos if url} - {None}
+
+    def borrar():
+        for tipo, claves in (('imagen', claves_imagenes), ('video', claves_videos)):
+            if claves:
+                borrados = storage.borrar(sorted(claves), tipo)
+                logger.info(f"Borrados {borrados} de {len(claves)} archivos ({tipo})")
+
+    # Si la transaccion se deshace las filas siguen apuntando a los archivos
+    transaction.on_commit(borrar)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# myapp/medios_huerfanos.py
+"""
+Limpieza de archivos huerfanos del almacen de medios
+
+Quedan archivos en Cloudinary/B2 que ninguna fila usa: subidas directas que
+nunca se registraron, subidas en segundo plano cuya fila no llego a crearse,
+y los borrados anteriores a programar_borrado (que solo quitaban las URLs
+legacy del animal). Ocupan espacio y hacen mas lentos los listados.
+
+limpiar_huerfanos():
+
+1. Reune en un set las claves que usan ImagenAnimal, VideoAnimal y los
+   campos legacy de CreacionAnimales (values_list por lotes, sin instanciar
+   modelos; una clave ocupa unas decenas de bytes, asi que un set cabe en
+   memoria de sobra para el tamano de este catalogo).
+2. Recorre cada carpeta del almacen con listar(), pagina a pagina.
+3. Cada archivo que no esta en el set y es mas antiguo que `antiguedad` es
+   huerfano. El margen evita borrar subidas en curso o firmadas pendientes
+   de registrar (FIRMA_TIMEOUT).
+4. Si `borrar`, borra los huerfanos de cada pagina con una llamada por
+   lotes; si no, solo los cuenta (simulacion).
+
+Se ejecuta con: python manage.py limpiar_medios_huerfanos [--borrar --confirmar <cuenta>]
+"""
+
+import logging
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .media_storage import CARPETAS, obtener_storage
+from .models import CreacionAnimales, ImagenAnimal, VideoAnimal
+
+logger = logging.getLogger(__name__)
+
+# Tipo de archivo de cada carpeta
+TIPO_CARPETA = {'fotos': 'imagen', 'miniaturas': 'imagen', 'videos': 'video'}
+
+# Margen por defecto antes de considerar huerfano un archivo sin fila
+ANTIGUEDAD_MINIMA = timedelta(hours=24)
+
+
+def claves_en_uso(storage):
+    """Set con las claves de todos los archivos que referencia la BD"""
+    claves = set()
+
+    def anadir(clave, url):
+        clave = clave or storage.clave_desde_url(url)
+        if clave:
+            claves.add(clave)
+
+    filas = ImagenAnimal.objects.values_list('clave', 'imagen', 'clave_miniatura', 'miniatura')
+    for clave, imagen, clave_miniatura, miniatura in filas.iterator(chunk_size=2000):
+        anadir(clave, imagen)
+        anadir(clave_miniatura, miniatura)
+    for clave, video in VideoAnimal.objects.values_list('clave', 'video').iterator(chunk_size=2000):
+        anadir(clave, video)
+    for imagen, video in CreacionAnimales.objects.values_list('imagen', 'video').iterator(chunk_size=2000):
+        anadir(None, imagen)
+        anadir(None, video)
+    return claves
+
+
+def limpiar_huerfanos(borrar=False, antiguedad=ANTIGUEDAD_MINIMA, carpetas=CARPETAS):
+    """
+    Busca (y opcionalmente borra) los archivos del almacen que no usa ninguna fila.
+
+    Args:
+        borrar: si es False solo se cuentan (simulacion)
+        antiguedad: timedelta; los archivos mas recientes no se tocan
+        carpetas: carpetas de CARPETAS que se revisan
+
+    Returns:
+        dict: por carpeta, {'listados', 'recientes', 'huerfanos', 'bytes', 'borrados'}
+    """
+    storage = obtener_storage()
+    # Antes de listar: una fila creada despues apunta a un archivo reciente
+    en_uso = claves_en_uso(storage)
+    limite = timezone.now() - antiguedad
+
+    informe = {}
+    for carpeta in carpetas:
+        tipo = TIPO_CARPETA[carpeta]
+        resumen = informe[carpeta] = {'listados': 0, 'recientes': 0, 'huerfanos': 0, 'bytes': 0, 'borrados': 0}
+        for pagina in storage.listar(carpeta, tipo):
+            resumen['listados'] += len(pagina)
+            huerfanos = []
+            for archivo in pagina:
+                if archivo.clave in en_uso:
+                    continue
+                if archivo.fecha > limite:
+                    resumen['recientes'] += 1
+                    continue
+                huerfanos.append(archivo.clave)
+                resumen['bytes'] += archivo.tamano
+            resumen['huerfanos'] += len(huerfanos)
+            if borrar and huerfanos:
+                resumen['borrados'] += storage.borrar(huerfanos, tipo)
+
+        logger.info(
+            f"Huerfanos en {carpeta}: {resumen['huerfanos']} de {resumen['listados']} "
+            f"({resumen['bytes']} bytes, {resumen['borrados']} borrados)"
+        )
+    return informe
@@ -4,6 +4,8 @@ Middleware para manejar ngrok y otros proxies, especialmente para webhooks de Te
 import logging
 from django.utils.deprecation import MiddlewareMixin
 
+from .cache_animales import invalidacion_agrupada
+
 logger = logging.getLogger(__name__)
 
 class NgrokMiddleware(MiddlewareMixin):
@@ -57,4 +59,20 @@ class NgrokMiddleware(MiddlewareMixin):
 
             logger.info(f"Webhook response: {response.status_code}")
 
-        return response
\ No newline at end of file
+        return response
+
+
+class InvalidacionCacheMiddleware:
+    """
+    Agrupa las invalidaciones de cache de animales de toda la peticion.
+
+    Crear un animal con 10 imagenes dispara una senal por cada objeto guardado;
+    con este middleware todas ellas se traducen en un unico incremento de la
+    generacion del cache al terminar la peticion.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with invalidacion_agrupada():
+            return self.get_response(request)
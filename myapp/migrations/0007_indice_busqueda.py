@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def rellenar_indice(apps, schema_editor):
+    """Indexa los animales que ya existen"""
+    from myapp.indice_busqueda import CAMPOS_INDICE, tokenizar
+
+    CreacionAnimales = apps.get_model('myapp', 'CreacionAnimales')
+    TokenBusquedaAnimal = apps.get_model('myapp', 'TokenBusquedaAnimal')
+
+    lote = []
+    for animal in CreacionAnimales.objects.order_by('id').iterator(chunk_size=500):
+        vistos = set()
+        for campo, (campos_modelo, peso) in CAMPOS_INDICE.items():
+            for campo_modelo in campos_modelo:
+                for token in tokenizar(getattr(animal, campo_modelo)):
+                    if (campo, token) not in vistos:
+                        vistos.add((campo, token))
+                        lote.append(TokenBusquedaAnimal(
+                            animal_id=animal.id, campo=campo, token=token, peso=peso
+                        ))
+        if len(lote) >= 500:
+            TokenBusquedaAnimal.objects.bulk_create(lote)
+            lote = []
+    TokenBusquedaAnimal.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_add_password_reset_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenBusquedaAnimal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('campo', models.CharField(help_text='Campo del indice del que sale el token (nombre, raza, ubicacion...)', max_length=20)),
+                ('token', models.CharField(max_length=40)),
+                ('peso', models.PositiveSmallIntegerField(default=1, help_text='Peso del token en la relevancia del resultado')),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_busqueda', to='myapp.creacionanimales')),
+            ],
+            options={
+                'db_table': 'tokens_busqueda_animales',
+                'indexes': [models.Index(fields=['token', 'campo'], name='tokens_busq_token_campo_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops'])],
+            },
+        ),
+        migrations.RunPython(rellenar_indice, migrations.RunPython.noop),
+    ]
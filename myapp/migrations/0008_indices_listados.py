@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_indice_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='creacionanimales',
+            index=models.Index(fields=['asociacion', 'adoptado', '-fecha_creacion'], name='animales_asoc_adopt_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creacionanimales',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='animales_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creacionanimales',
+            index=models.Index(condition=models.Q(('adoptado', False)), fields=['-fecha_creacion', '-id'], name='animales_no_adoptados_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imagenanimal',
+            index=models.Index(fields=['animal', 'es_principal', 'orden'], name='imagenes_animal_princ_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroasociacion',
+            index=models.Index(fields=['estado', '-fecha_registro'], name='asociaciones_estado_idx'),
+        ),
+    ]
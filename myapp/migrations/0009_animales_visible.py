@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 14:56
+
+from django.db import migrations, models
+
+
+def calcular_visibilidad(apps, schema_editor):
+    """Oculta los animales de asociaciones que no estan activas ni suspendidas"""
+    CreacionAnimales = apps.get_model('myapp', 'CreacionAnimales')
+    CreacionAnimales.objects.exclude(
+        asociacion__estado__in=['activa', 'suspendida']
+    ).update(visible=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_indices_listados'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='creacionanimales',
+            name='animales_fecha_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='creacionanimales',
+            name='animales_no_adoptados_idx',
+        ),
+        migrations.AddField(
+            model_name='creacionanimales',
+            name='visible',
+            field=models.BooleanField(default=True, help_text='Se muestra al público (su asociación está activa o suspendida)'),
+        ),
+        migrations.RunPython(calcular_visibilidad, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='creacionanimales',
+            index=models.Index(condition=models.Q(('visible', True)), fields=['-fecha_creacion', '-id'], name='animales_visibles_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creacionanimales',
+            index=models.Index(condition=models.Q(('adoptado', False), ('visible', True)), fields=['-fecha_creacion', '-id'], name='animales_no_adoptados_idx'),
+        ),
+    ]
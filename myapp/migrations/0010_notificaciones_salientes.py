@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_animales_visible'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacionSaliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('email', 'Email'), ('telegram', 'Telegram')], max_length=20)),
+                ('clave_idempotencia', models.CharField(help_text='Identifica la notificación: encolarla dos veces no la duplica', max_length=200, unique=True)),
+                ('datos', models.JSONField(help_text='Contenido ya renderizado del mensaje')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('enviada', 'Enviada'), ('fallida', 'Fallida')], default='pendiente', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('max_intentos', models.PositiveIntegerField(default=8)),
+                ('ejecutar_despues', models.DateTimeField(default=django.utils.timezone.now, help_text='No se envía antes de esta fecha (backoff entre reintentos)')),
+                ('bloqueada_hasta', models.DateTimeField(blank=True, help_text='Si el worker que la procesa muere, otro la retoma pasada esta fecha', null=True)),
+                ('ultimo_error', models.TextField(blank=True, default='')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'notificaciones_salientes',
+                'ordering': ['ejecutar_despues', 'id'],
+                'indexes': [models.Index(fields=['estado', 'ejecutar_despues'], name='notificaciones_cola_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_notificaciones_salientes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UpdateTelegram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('update_id', models.BigIntegerField(unique=True)),
+                ('chat_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('datos', models.JSONField(help_text='Update tal como lo envía Telegram')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('procesado', 'Procesado'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('bloqueado_hasta', models.DateTimeField(blank=True, help_text='Si el worker que lo procesa muere, otro lo retoma pasada esta fecha', null=True)),
+                ('ultimo_error', models.TextField(blank=True, default='')),
+                ('fecha_recepcion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_proceso', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'telegram_updates',
+                'ordering': ['update_id'],
+                'indexes': [models.Index(fields=['estado', 'update_id'], name='telegram_updates_cola_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_telegram_updates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoConversacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat_id', models.BigIntegerField(unique=True)),
+                ('estado', models.CharField(max_length=50)),
+                ('datos', models.JSONField(blank=True, default=dict)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('expira', models.DateTimeField(db_index=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'telegram_estados_conversacion',
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_estados_conversacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('provincia', models.CharField(max_length=50)),
+                ('tipo_de_animal', models.CharField(blank=True, default='', max_length=200)),
+                ('nuevas_asociaciones', models.PositiveIntegerField(default=0)),
+                ('asociaciones_aprobadas', models.PositiveIntegerField(default=0)),
+                ('nuevos_animales', models.PositiveIntegerField(default=0)),
+                ('adopciones', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'estadisticas_diarias',
+                'ordering': ['-fecha', 'provincia', 'tipo_de_animal'],
+            },
+        ),
+        migrations.AddField(
+            model_name='creacionanimales',
+            name='fecha_adopcion',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Cuándo se marcó como adoptado (para las estadísticas diarias)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='creacionanimales',
+            index=models.Index(fields=['fecha_creacion'], name='animales_fecha_creacion_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='estadisticadiaria',
+            constraint=models.UniqueConstraint(fields=('fecha', 'provincia', 'tipo_de_animal'), name='estadisticas_diarias_unica'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0013_estadisticas_diarias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagenanimal',
+            name='miniatura',
+            field=models.URLField(blank=True, default='', help_text='URL de la miniatura cuadrada (WebP) para las tarjetas', max_length=500),
+        ),
+    ]
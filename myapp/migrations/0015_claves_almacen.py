@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:30
+
+import os
+
+from django.db import migrations, models
+
+
+def _public_id(url):
+    """public_id de una URL de Cloudinary (las filas existentes son todas de Cloudinary)"""
+    partes = (url or '').split('/upload/')
+    if 'cloudinary.com' not in (url or '') or len(partes) < 2:
+        return ''
+    ruta = partes[1].split('/')
+    # Saltar transformaciones y version
+    while len(ruta) > 1 and (',' in ruta[0] or (ruta[0].startswith('v') and ruta[0][1:].isdigit())):
+        ruta = ruta[1:]
+    return os.path.splitext('/'.join(ruta))[0]
+
+
+def rellenar_claves(apps, schema_editor):
+    """Guarda el public_id de las imagenes, miniaturas y videos ya subidos"""
+    ImagenAnimal = apps.get_model('myapp', 'ImagenAnimal')
+    VideoAnimal = apps.get_model('myapp', 'VideoAnimal')
+
+    imagenes = list(ImagenAnimal.objects.only('id', 'imagen', 'miniatura'))
+    for imagen in imagenes:
+        imagen.clave = _public_id(imagen.imagen)
+        # Solo las miniaturas subidas como archivo (no las transformaciones)
+        if '/animales/miniaturas/' in imagen.miniatura:
+            imagen.clave_miniatura = _public_id(imagen.miniatura)
+    ImagenAnimal.objects.bulk_update(imagenes, ['clave', 'clave_miniatura'], batch_size=1000)
+
+    videos = list(VideoAnimal.objects.only('id', 'video'))
+    for video in videos:
+        video.clave = _public_id(video.video)
+    VideoAnimal.objects.bulk_update(videos, ['clave'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_imagen_miniatura'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagenanimal',
+            name='clave',
+            field=models.CharField(blank=True, default='', help_text='Clave de la imagen en el almacén (public_id de Cloudinary o key de B2)', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='imagenanimal',
+            name='clave_miniatura',
+            field=models.CharField(blank=True, default='', help_text='Clave de la miniatura en el almacén (vacía si es una transformación)', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='videoanimal',
+            name='clave',
+            field=models.CharField(blank=True, default='', help_text='Clave del video en el almacén (public_id de Cloudinary o key de B2)', max_length=255),
+        ),
+        migrations.RunPython(rellenar_claves, migrations.RunPython.noop),
+    ]
@@ -6,6 +6,10 @@ import secrets
 import hashlib
 from django.utils import timezone
 from .validators import validate_image_file, validate_video_file, validate_logo_file
+from .cache_animales import programar_invalidacion
+
+# Estados de la asociación con los que sus animales se muestran al público
+ESTADOS_VISIBLES = ('activa', 'suspendida')
 
 class RegistroAsociacion(models.Model):
     nombre = models.CharField(max_length=50, unique=True)
@@ -131,6 +135,31 @@ class RegistroAsociacion(models.Model):
             self.fecha_modificacion_estado = timezone.now()
             
         super().save(*args, **kwargs)
+
+        # Si cambia el estado, propagar la visibilidad a sus animales
+        if self.estado != getattr(self, '_estado_guardado', None):
+            self.sincronizar_visibilidad_animales()
+            self._estado_guardado = self.estado
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Estado leído de la BD, para detectar cambios en save()
+        instancia._estado_guardado = instancia.__dict__.get('estado')
+        return instancia
+
+    def sincronizar_visibilidad_animales(self):
+        """
+        Actualiza en bloque CreacionAnimales.visible según el estado actual.
+
+        Solo toca las filas que cambian y, si cambia alguna, invalida el
+        cache de animales. Devuelve el número de animales actualizados.
+        """
+        visible = self.estado in ESTADOS_VISIBLES
+        actualizados = self.animales.exclude(visible=visible).update(visible=visible)
+        if actualizados:
+            programar_invalidacion()
+        return actualizados
     
     def generar_token_seguro(self, tipo='gestion'):
         """Genera un token seguro único para gestión administrativa"""
@@ -240,6 +269,10 @@ class RegistroAsociacion(models.Model):
     class Meta:
         db_table = 'asociaciones'
         ordering = ['-fecha_registro']
+        indexes = [
+            # Listados por estado (panel de administracion, filtro de visibilidad)
+            models.Index(fields=['estado', '-fecha_registro'], name='asociaciones_estado_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nombre} ({self.get_estado_display()})"
@@ -270,6 +303,12 @@ class CreacionAnimales(models.Model):
     descripcion = models.CharField(max_length=500)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     adoptado = models.BooleanField(default=False)
+    fecha_adopcion = models.DateTimeField(
+        blank=True,
+        null=True,
+        db_index=True,
+        help_text="Cuándo se marcó como adoptado (para las estadísticas diarias)"
+    )
     color = models.CharField(
         max_length=100,
         help_text="Color del animal (ej: marrón, negro, blanco, manchado, etc.)",
@@ -296,26 +335,81 @@ class CreacionAnimales(models.Model):
         default="Mediano"
     )
 
+    # Copia desnormalizada de "asociacion.estado in ESTADOS_VISIBLES" para que
+    # los listados públicos no tengan que hacer JOIN con asociaciones.
+    # La mantiene RegistroAsociacion.save() al cambiar de estado.
+    visible = models.BooleanField(
+        default=True,
+        help_text="Se muestra al público (su asociación está activa o suspendida)"
+    )
+
     class Meta:
         db_table = 'Animales'
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Animales de una asociacion (mis_animales)
+            models.Index(fields=['asociacion', 'adoptado', '-fecha_creacion'], name='animales_asoc_adopt_fecha_idx'),
+            # Rango de un día para las estadísticas diarias (incluye los no visibles)
+            models.Index(fields=['fecha_creacion'], name='animales_fecha_creacion_idx'),
+            # Orden del feed paginado por cursor (fecha_creacion, id) de los animales publicos
+            models.Index(
+                fields=['-fecha_creacion', '-id'],
+                name='animales_visibles_idx',
+                condition=models.Q(visible=True),
+            ),
+            # Listados publicos que solo muestran animales sin adoptar (buscador, sitemap)
+            models.Index(
+                fields=['-fecha_creacion', '-id'],
+                name='animales_no_adoptados_idx',
+                condition=models.Q(visible=True, adoptado=False),
+            ),
+        ]
 
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        # Al crear, la visibilidad se toma del estado actual de la asociación
+        if self._state.adding:
+            self.visible = self.asociacion.estado in ESTADOS_VISIBLES
+
+        if self.adoptado and not self.fecha_adopcion:
+            self.fecha_adopcion = timezone.now()
+        elif not self.adoptado:
+            self.fecha_adopcion = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'adoptado' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'fecha_adopcion'}
+
+        super().save(*args, **kwargs)
+
+    def _imagen_principal(self):
+        """ImagenAnimal principal, o la primera por orden, o None"""
+        # Se resuelve en Python sobre imagenes.all(): con prefetch_related('imagenes')
+        # no hace ninguna query, y sin él hace una sola (máximo 10 imágenes)
+        imagenes = list(self.imagenes.all())
+        # Primero buscar la imagen marcada como principal
+        for imagen in imagenes:
+            if imagen.es_principal:
+                return imagen
+        # Si no hay principal, la primera por orden (ordering del modelo)
+        return imagenes[0] if imagenes else None
+
     def get_primera_imagen(self):
         """Retorna la URL de la primera imagen (nueva o legacy)"""
-        # Primero buscar la imagen marcada como principal
-        primera_imagen = self.imagenes.filter(es_principal=True).first()
-        if primera_imagen:
-            return primera_imagen.imagen
-        # Si no hay principal, buscar la primera imagen por orden
-        primera_cualquiera = self.imagenes.first()
-        if primera_cualquiera:
-            return primera_cualquiera.imagen
+        imagen = self._imagen_principal()
+        if imagen:
+            return imagen.imagen
         # Fallback al campo legacy
         return self.imagen if self.imagen else None
 
+    def get_miniatura(self):
+        """URL de la miniatura de la primera imagen (o de la imagen si no tiene)"""
+        imagen = self._imagen_principal()
+        if imagen and imagen.miniatura:
+            return imagen.miniatura
+        return self.get_primera_imagen()
+
 class AnimalFavorito(models.Model):
     usuario_ip = models.GenericIPAddressField()
     asociacion = models.ForeignKey(RegistroAsociacion, on_delete=models.CASCADE, null=True, blank=True)
@@ -332,6 +426,24 @@ class ImagenAnimal(models.Model):
         max_length=500,
         help_text="URL de la imagen del animal en Cloudinary"
     )
+    miniatura = models.URLField(
+        max_length=500,
+        blank=True,
+        default='',
+        help_text="URL de la miniatura cuadrada (WebP) para las tarjetas"
+    )
+    clave = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        help_text="Clave de la imagen en el almacén (public_id de Cloudinary o key de B2)"
+    )
+    clave_miniatura = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        help_text="Clave de la miniatura en el almacén (vacía si es una transformación)"
+    )
     orden = models.PositiveIntegerField(
         default=0,
         help_text="Orden de visualización de la imagen"
@@ -345,6 +457,10 @@ class ImagenAnimal(models.Model):
     class Meta:
         db_table = 'imagenes_animales'
         ordering = ['orden', '-es_principal', '-fecha_subida']
+        indexes = [
+            # Imagen principal / primeras imagenes de cada animal
+            models.Index(fields=['animal', 'es_principal', 'orden'], name='imagenes_animal_princ_idx'),
+        ]
         verbose_name = 'Imagen de Animal'
         verbose_name_plural = 'Imágenes de Animales'
 
@@ -364,6 +480,12 @@ class VideoAnimal(models.Model):
         max_length=500,
         help_text="URL del video del animal en Cloudinary"
     )
+    clave = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        help_text="Clave del video en el almacén (public_id de Cloudinary o key de B2)"
+    )
     orden = models.PositiveIntegerField(
         default=0,
         help_text="Orden de visualización del video"
@@ -383,4 +505,179 @@ class VideoAnimal(models.Model):
         verbose_name_plural = 'Videos de Animales'
 
     def __str__(self):
-        return f"Video de {self.animal.nombre} - Orden {self.orden}"
\ No newline at end of file
+        return f"Video de {self.animal.nombre} - Orden {self.orden}"
+
+class TokenBusquedaAnimal(models.Model):
+    """Token normalizado (minusculas, sin tildes) del indice de busqueda de texto"""
+    animal = models.ForeignKey(CreacionAnimales, on_delete=models.CASCADE, related_name='tokens_busqueda')
+    campo = models.CharField(
+        max_length=20,
+        help_text="Campo del indice del que sale el token (nombre, raza, ubicacion...)"
+    )
+    token = models.CharField(max_length=40)
+    peso = models.PositiveSmallIntegerField(
+        default=1,
+        help_text="Peso del token en la relevancia del resultado"
+    )
+
+    class Meta:
+        db_table = 'tokens_busqueda_animales'
+        indexes = [
+            # varchar_pattern_ops solo se aplica en PostgreSQL (LIKE 'x%' indexado)
+            models.Index(
+                fields=['token', 'campo'],
+                name='tokens_busq_token_campo_idx',
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops'],
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.campo}:{self.token} (animal {self.animal_id})"
+
+
+class NotificacionSaliente(models.Model):
+    """
+    Outbox de notificaciones (emails y mensajes de Telegram).
+
+    Las vistas solo insertan la fila (dentro de su transacción) y el comando
+    procesar_notificaciones la envía, con reintentos y backoff. Ver
+    myapp/notificaciones.py.
+    """
+    TIPOS = [
+        ('email', 'Email'),
+        ('telegram', 'Telegram'),
+    ]
+
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('enviada', 'Enviada'),
+        ('fallida', 'Fallida'),  # Agotó los reintentos (dead-letter)
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    clave_idempotencia = models.CharField(
+        max_length=200,
+        unique=True,
+        help_text="Identifica la notificación: encolarla dos veces no la duplica"
+    )
+    datos = models.JSONField(help_text="Contenido ya renderizado del mensaje")
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=8)
+    ejecutar_despues = models.DateTimeField(
+        default=timezone.now,
+        help_text="No se envía antes de esta fecha (backoff entre reintentos)"
+    )
+    bloqueada_hasta = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text="Si el worker que la procesa muere, otro la retoma pasada esta fecha"
+    )
+    ultimo_error = models.TextField(blank=True, default='')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'notificaciones_salientes'
+        ordering = ['ejecutar_despues', 'id']
+        indexes = [
+            models.Index(fields=['estado', 'ejecutar_despues'], name='notificaciones_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.clave_idempotencia} ({self.get_estado_display()})"
+
+
+class UpdateTelegram(models.Model):
+    """
+    Update recibido del bot de Telegram pendiente de procesar.
+
+    El webhook solo lo guarda y responde 200 al momento; el comando
+    procesar_updates_telegram lo procesa después, en orden dentro de cada
+    chat. update_id es único: si Telegram reenvía un update no se duplica.
+    Ver myapp/updates_telegram.py.
+    """
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('procesado', 'Procesado'),
+        ('error', 'Error'),
+    ]
+
+    update_id = models.BigIntegerField(unique=True)
+    chat_id = models.BigIntegerField(blank=True, null=True, db_index=True)
+    datos = models.JSONField(help_text="Update tal como lo envía Telegram")
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    bloqueado_hasta = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text="Si el worker que lo procesa muere, otro lo retoma pasada esta fecha"
+    )
+    ultimo_error = models.TextField(blank=True, default='')
+    fecha_recepcion = models.DateTimeField(auto_now_add=True)
+    fecha_proceso = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'telegram_updates'
+        ordering = ['update_id']
+        indexes = [
+            models.Index(fields=['estado', 'update_id'], name='telegram_updates_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"Update {self.update_id} ({self.get_estado_display()})"
+
+
+class EstadoConversacion(models.Model):
+    """
+    Paso en que está una conversación del bot (por ejemplo /registrar).
+
+    Se guarda en la BD para que cualquier worker de gunicorn pueda continuar
+    la conversación. Caduca en `expira` y `version` permite actualizarla con
+    compare-and-set. Ver myapp/estados_conversacion.py.
+    """
+    chat_id = models.BigIntegerField(unique=True)
+    estado = models.CharField(max_length=50)
+    datos = models.JSONField(default=dict, blank=True)
+    version = models.PositiveIntegerField(default=1)
+    expira = models.DateTimeField(db_index=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'telegram_estados_conversacion'
+
+    def __str__(self):
+        return f"Chat {self.chat_id}: {self.estado}"
+
+
+class EstadisticaDiaria(models.Model):
+    """
+    Actividad de un día agregada por provincia y tipo de animal.
+
+    La rellena el comando actualizar_estadisticas (ver myapp/estadisticas.py)
+    para que el resumen diario de Telegram y el panel de administración lean
+    unas pocas filas por día en vez de recorrer las tablas completas.
+    Las métricas de asociaciones van en las filas con tipo_de_animal vacío.
+    """
+    fecha = models.DateField()
+    provincia = models.CharField(max_length=50)
+    tipo_de_animal = models.CharField(max_length=200, blank=True, default='')
+    nuevas_asociaciones = models.PositiveIntegerField(default=0)
+    asociaciones_aprobadas = models.PositiveIntegerField(default=0)
+    nuevos_animales = models.PositiveIntegerField(default=0)
+    adopciones = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'estadisticas_diarias'
+        ordering = ['-fecha', 'provincia', 'tipo_de_animal']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'provincia', 'tipo_de_animal'],
+                name='estadisticas_diarias_unica',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.provincia} {self.tipo_de_animal or '(asociaciones)'}"
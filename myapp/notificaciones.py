@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# myapp/notificaciones.py
+"""
+Cola persistente (outbox) de emails y mensajes de Telegram
+
+Las vistas ya no hablan con SMTP ni con la API de Telegram: encolar_email()
+y encolar_telegram() solo insertan una fila en NotificacionSaliente, dentro
+de la misma transaccion que el cambio que la provoca. El comando
+
+    python manage.py procesar_notificaciones --continuo
+
+la envia despues:
+
+- Cada notificacion tiene una clave de idempotencia unica: encolar dos veces
+  el mismo evento (doble clic, reintento del webhook...) no la duplica.
+- Si el envio falla se reintenta con backoff exponencial; al agotar
+  max_intentos queda como 'fallida' (dead-letter) para revisarla a mano.
+- Varios workers pueden procesar la cola a la vez: cada fila se reclama con
+  un UPDATE condicional y, si el worker muere, se libera pasado el bloqueo.
+"""
+
+import logging
+import random
+import uuid
+from datetime import timedelta
+
+from django.core.mail import EmailMultiAlternatives
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import NotificacionSaliente
+
+logger = logging.getLogger(__name__)
+
+# Espera antes del primer reintento; se duplica en cada fallo
+BACKOFF_BASE = 30
+BACKOFF_MAXIMO = 6 * 3600
+
+# Tiempo que una notificacion queda reservada para el worker que la envia
+DURACION_BLOQUEO = 300
+
+LOTE_POR_DEFECTO = 20
+
+
+class ErrorEnvio(Exception):
+    """El proveedor (SMTP, Telegram) no acepto el mensaje"""
+
+
+# ==================== ENCOLAR ====================
+
+def encolar(tipo, datos, clave=None, max_intentos=None):
+    """
+    Añade una notificacion a la cola (si no existe ya otra con la misma clave).
+
+    Args:
+        tipo: 'email' o 'telegram'
+        datos: contenido ya renderizado (serializable a JSON)
+        clave: clave de idempotencia; sin ella la notificacion nunca se deduplica
+
+    Returns:
+        NotificacionSaliente: la notificacion nueva o la ya existente
+    """
+    defaults = {'tipo': tipo, 'datos': datos}
+    if max_intentos is not None:
+        defaults['max_intentos'] = max_intentos
+
+    notificacion, creada = NotificacionSaliente.objects.get_or_create(
+        clave_idempotencia=clave or f'{tipo}:{uuid.uuid4().hex}',
+        defaults=defaults,
+    )
+    if creada:
+        logger.info(f"Notificación encolada: {notificacion.clave_idempotencia}")
+    else:
+        logger.info(f"Notificación duplicada ignorada: {notificacion.clave_idempotencia}")
+    return notificacion
+
+
+def encolar_email(asunto, texto, destinatarios, html=None, clave=None):
+    """Encola un email (texto plano + alternativa HTML opcional)"""
+    return encolar('email', {
+        'asunto': asunto,
+        'texto': texto,
+        'html': html,
+        'destinatarios': list(destinatarios),
+    }, clave=clave)
+
+
+def encolar_telegram(mensaje, botones=None, clave=None):
+    """Encola un mensaje para el chat de administracion de Telegram"""
+    return encolar('telegram', {'mensaje': mensaje, 'botones': botones}, clave=clave)
+
+
+# ==================== ENVIAR ====================
+
+def _enviar_email(datos):
+    email = EmailMultiAlternatives(
+        subject=datos['asunto'],
+        body=datos['texto'],
+        from_email=None,
+        to=datos['destinatarios'],
+    )
+    if datos.get('html'):
+        email.attach_alternative(datos['html'], "text/html")
+    email.send(fail_silently=False)
+
+
+def _enviar_telegram(datos):
+    from .telegram_utils import enviar_mensaje_telegram
+
+    if not enviar_mensaje_telegram(datos['mensaje'], datos.get('botones')):
+        raise ErrorEnvio("La API de Telegram no aceptó el mensaje")
+
+
+ENVIADORES = {
+    'email': _enviar_email,
+    'telegram': _enviar_telegram,
+}
+
+
+def calcular_backoff(intentos):
+    """Segundos hasta el siguiente reintento (exponencial con jitter del ±20%)"""
+    espera = min(BACKOFF_MAXIMO, BACKOFF_BASE * 2 ** max(0, intentos - 1))
+    return espera * random.uniform(0.8, 1.2)
+
+
+def _disponibles(ahora):
+    """Pendientes que ya toca enviar o reservadas por un worker que no termino"""
+    return Q(estado='pendiente', ejecutar_despues__lte=ahora) | Q(estado='en_proceso', bloqueada_hasta__lt=ahora)
+
+
+def reclamar(lote=LOTE_POR_DEFECTO):
+    """Reserva hasta `lote` notificaciones para este worker y las devuelve"""
+    ahora = timezone.now()
+    candidatas = list(
+        NotificacionSaliente.objects.filter(_disponibles(ahora))
+        .order_by('ejecutar_despues', 'id')
+        .values_list('id', flat=True)[:lote]
+    )
+
+    reclamadas = []
+    for notificacion_id in candidatas:
+        # Si otro worker la reclamo entre medias, el UPDATE no toca ninguna fila
+        if NotificacionSaliente.objects.filter(_disponibles(ahora), id=notificacion_id).update(
+            estado='en_proceso',
+            intentos=F('intentos') + 1,
+            bloqueada_hasta=ahora + timedelta(seconds=DURACION_BLOQUEO),
+        ):
+            reclamadas.append(notificacion_id)
+
+    return list(NotificacionSaliente.objects.filter(id__in=reclamadas).order_by('ejecutar_despues', 'id'))
+
+
+def enviar(notificacion):
+    """Envia una notificacion ya reclamada y registra el resultado"""
+    try:
+        ENVIADORES[notificacion.tipo](notificacion.datos)
+    except Exception as e:
+        notificacion.ultimo_error = f"{type(e).__name__}: {e}"[:2000]
+        notificacion.bloqueada_hasta = None
+        if notificacion.intentos >= notificacion.max_intentos:
+            notificacion.estado = 'fallida'
+            logger.error(
+                f"Notificación {notificacion.clave_idempotencia} fallida tras "
+                f"{notificacion.intentos} intentos: {notificacion.ultimo_error}"
+            )
+        else:
+            notificacion.estado = 'pendiente'
+            notificacion.ejecutar_despues = timezone.now() + timedelta(
+                seconds=calcular_backoff(notificacion.intentos)
+            )
+            logger.warning(
+                f"Error enviando {notificacion.clave_idempotencia} (intento {notificacion.intentos}), "
+                f"reintento a las {notificacion.ejecutar_despues:%H:%M:%S}: {notificacion.ultimo_error}"
+            )
+        notificacion.save(update_fields=['estado', 'ultimo_error', 'bloqueada_hasta', 'ejecutar_despues'])
+        return False
+
+    notificacion.estado = 'enviada'
+    notificacion.fecha_envio = timezone.now()
+    notificacion.bloqueada_hasta = None
+    notificacion.ultimo_error = ''
+    notificacion.save(update_fields=['estado', 'fecha_envio', 'bloqueada_hasta', 'ultimo_error'])
+    logger.info(f"Notificación enviada: {notificacion.clave_idempotencia}")
+    return True
+
+
+def procesar_pendientes(lote=LOTE_POR_DEFECTO):
+    """
+    Reclama y envia un lote de notificaciones.
+
+    Returns:
+        dict: {'enviadas': n, 'errores': n} del lote procesado
+    """
+    resultado = {'enviadas': 0, 'errores': 0}
+    for notificacion in reclamar(lote):
+        if enviar(notificacion):
+            resultado['enviadas'] += 1
+        else:
+            resultado['errores'] += 1
+    return resultado
+
+
+def reintentar_fallidas(ids=None):
+    """Devuelve a la cola las notificaciones fallidas (todas o las indicadas)"""
+    fallidas = NotificacionSaliente.objects.filter(estado='fallida')
+    if ids:
+        fallidas = fallidas.filter(id__in=ids)
+    return fallidas.update(estado='pendiente', intentos=0, ejecutar_despues=timezone.now())
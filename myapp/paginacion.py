@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# myapp/paginacion.py
+"""
+Paginacion por cursor (keyset) para el feed publico de animales
+
+En lugar de usar OFFSET (que obliga a la BD a recorrer todas las filas
+anteriores) se pagina con la clave (fecha_creacion, id): cada pagina
+devuelve un cursor opaco con la ultima clave servida y la siguiente
+pagina empieza justo despues. El coste de cada pagina es constante sin
+importar cuantos animales haya en el catalogo.
+"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+from .busqueda import buscar
+from .cache_animales import obtener_o_calcular
+from .models import CreacionAnimales
+
+# Numero de animales por pagina del feed (el cliente pinta lotes de 12)
+TAMANO_PAGINA_FEED = 24
+TAMANO_PAGINA_FEED_MAXIMO = 60
+
+# Tiempo de vida de cada pagina cacheada (en segundos)
+FEED_CACHE_TIMEOUT = 300
+
+# Filtros que acepta el feed (mismos nombres que usa el buscador de index.html)
+FILTROS_FEED = ('categoria', 'provincia', 'raza', 'color', 'tamano', 'tipo_animal')
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no se puede decodificar"""
+
+
+def codificar_cursor(animal):
+    """Genera el cursor opaco que apunta justo despues de este animal"""
+    clave = f"{animal.fecha_creacion.isoformat()}|{animal.id}"
+    return base64.urlsafe_b64encode(clave.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve la tupla (fecha_creacion, id) contenida en el cursor"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        clave = base64.urlsafe_b64decode(cursor + relleno).decode()
+        fecha_iso, animal_id = clave.rsplit('|', 1)
+        return datetime.fromisoformat(fecha_iso), int(animal_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise CursorInvalido(f"Cursor no valido: {cursor!r}") from e
+
+
+def limpiar_filtros(datos):
+    """Extrae de un QueryDict/dict solo los filtros soportados y no vacios"""
+    filtros = {}
+    for campo in FILTROS_FEED:
+        valor = (datos.get(campo) or '').strip()
+        if valor and not (campo == 'categoria' and valor == 'todos'):
+            filtros[campo] = valor
+    return filtros
+
+
+def aplicar_filtros(queryset, filtros):
+    """Aplica los filtros del buscador de inicio sobre el queryset"""
+    categoria = filtros.get('categoria')
+    if categoria == 'otros':
+        queryset = queryset.exclude(tipo_de_animal__icontains='perro').exclude(tipo_de_animal__icontains='gato')
+    elif categoria:
+        queryset = queryset.filter(tipo_de_animal__icontains=categoria)
+
+    if filtros.get('provincia'):
+        queryset = queryset.filter(provincia=filtros['provincia'])
+    if filtros.get('raza'):
+        queryset = queryset.filter(raza=filtros['raza'])
+    if filtros.get('color'):
+        queryset = queryset.filter(color=filtros['color'])
+    if filtros.get('tamano'):
+        queryset = queryset.filter(tamano=filtros['tamano'])
+    if filtros.get('tipo_animal'):
+        queryset = queryset.filter(tipo_de_animal=filtros['tipo_animal'])
+    return queryset
+
+
+def serializar_animal_feed(animal):
+    """Convierte un animal en el diccionario que consume index.html"""
+    return {
+        'id': animal.id,
+        'nombre': animal.nombre,
+        'tipo_de_animal': animal.tipo_de_animal,
+        'raza': animal.raza or '',
+        'color': animal.color or '',
+        'tamano': animal.tamano or '',
+        'email': animal.email,
+        'telefono': animal.telefono,
+        'poblacion': animal.poblacion or '',
+        'provincia': animal.provincia or '',
+        'descripcion': animal.descripcion or '',
+        # Pre-calcular get_primera_imagen() para evitar queries en el template
+        'primera_imagen': animal.get_primera_imagen(),
+        # Miniatura cuadrada para la tarjeta (la imagen completa si no tiene)
+        'miniatura': animal.get_miniatura(),
+        'asociacion_nombre': animal.asociacion.nombre if animal.asociacion else '',
+    }
+
+
+def _clave_cache_pagina(filtros, cursor, limite):
+    """Clave de cache de una pagina concreta del feed"""
+    firma = json.dumps([filtros, cursor, limite], sort_keys=True)
+    resumen = hashlib.md5(firma.encode()).hexdigest()
+    return f'inicio_feed_{resumen}'
+
+
+def obtener_pagina_feed(filtros=None, cursor=None, limite=TAMANO_PAGINA_FEED):
+    """
+    Devuelve una pagina del feed publico de animales.
+
+    Returns:
+        dict: {'animales': [...], 'siguiente_cursor': str|None, 'total': int|None,
+               'facetas': {filtro: [valores]}|None}
+        'total' y 'facetas' solo se calculan en la primera pagina (sin cursor).
+        Las facetas salen del indice de busqueda.buscar y cubren todo el
+        catalogo, no solo las paginas que ya ha descargado el navegador.
+
+    Raises:
+        CursorInvalido: si el cursor no se puede decodificar
+    """
+    filtros = filtros or {}
+    limite = max(1, min(int(limite), TAMANO_PAGINA_FEED_MAXIMO))
+
+    # Validar el cursor antes de tocar la cache
+    posicion = decodificar_cursor(cursor) if cursor else None
+
+    cache_key = _clave_cache_pagina(filtros, cursor, limite)
+    return obtener_o_calcular(
+        cache_key,
+        lambda: _calcular_pagina_feed(filtros, posicion, limite),
+        timeout=FEED_CACHE_TIMEOUT,
+        metrica='inicio_feed',
+    )
+
+
+def _calcular_pagina_feed(filtros, posicion, limite):
+    """Consulta la BD y serializa una pagina del feed"""
+    queryset = CreacionAnimales.objects.filter(visible=True)
+    queryset = aplicar_filtros(queryset, filtros)
+
+    total = queryset.count() if posicion is None else None
+    facetas = _facetas_feed(filtros) if posicion is None else None
+
+    if posicion is not None:
+        fecha, animal_id = posicion
+        queryset = queryset.filter(
+            Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=animal_id)
+        )
+
+    # Pedimos uno de mas para saber si existe una pagina siguiente
+    animales = list(
+        queryset.select_related('asociacion')
+        .prefetch_related('imagenes')
+        .order_by('-fecha_creacion', '-id')[:limite + 1]
+    )
+    hay_mas = len(animales) > limite
+    animales = animales[:limite]
+
+    return {
+        'animales': [serializar_animal_feed(animal) for animal in animales],
+        'siguiente_cursor': codificar_cursor(animales[-1]) if hay_mas else None,
+        'total': total,
+        'facetas': facetas,
+    }
+
+
+def _facetas_feed(filtros):
+    """Valores disponibles para cada selector del buscador (cada uno ignora su propio filtro)"""
+    # Misma poblacion que el feed: los adoptados tambien se listan
+    facetas = buscar(filtros, por_pagina=0, incluir_adoptados=True)['facetas']
+    return {campo: list(facetas[campo]) for campo in FILTROS_FEED if campo != 'categoria'}
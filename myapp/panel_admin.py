@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# myapp/panel_admin.py
+"""
+Consultas del panel de administracion
+
+- Los contadores por estado salen de un unico GROUP BY estado, cacheado en
+  la cache compartida (sin L1, para que todos los workers vean la
+  invalidacion). RegistroAsociacion.save() lo invalida al cambiar de estado
+  y la signal post_delete al borrar una asociacion.
+- Cada lista se pagina (POR_PAGINA_PANEL filas) y el resto de paginas se
+  piden por JSON a /admin/api/asociaciones/. Se pide una fila de mas para
+  saber si hay pagina siguiente sin hacer un COUNT.
+"""
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count
+
+from .models import RegistroAsociacion
+
+POR_PAGINA_PANEL = 25
+
+CLAVE_CONTADORES = 'panel_admin:asociaciones_por_estado'
+CONTADORES_TIMEOUT = 600
+
+# Orden de cada lista del panel (la fecha relevante para cada estado)
+ORDEN_POR_ESTADO = {
+    'pendiente': ('-fecha_registro', '-id'),
+    'activa': ('-fecha_aprobacion', '-id'),
+    'suspendida': ('-fecha_modificacion_estado', '-id'),
+    'rechazada': ('-fecha_rechazo', '-id'),
+}
+
+
+def _cache():
+    return caches['compartida']
+
+
+def contar_por_estado():
+    """{estado: numero de asociaciones} para todos los estados (con ceros)"""
+    contadores = _cache().get(CLAVE_CONTADORES)
+    if contadores is None:
+        contadores = dict.fromkeys(ORDEN_POR_ESTADO, 0)
+        filas = RegistroAsociacion.objects.order_by().values('estado').annotate(total=Count('id'))
+        contadores.update({fila['estado']: fila['total'] for fila in filas})
+        _cache().set(CLAVE_CONTADORES, contadores, timeout=CONTADORES_TIMEOUT)
+    return contadores
+
+
+def invalidar_contadores():
+    """Descarta los contadores cuando se confirme la transaccion en curso"""
+    transaction.on_commit(lambda: _cache().delete(CLAVE_CONTADORES))
+
+
+def listar_asociaciones(estado, pagina=1, por_pagina=POR_PAGINA_PANEL):
+    """
+    Una pagina de asociaciones de un estado, con su numero de animales.
+
+    Returns:
+        dict: {'asociaciones': [...], 'pagina', 'tiene_siguiente'}
+    """
+    if estado not in ORDEN_POR_ESTADO:
+        raise ValueError(f"Estado no valido: {estado}")
+    pagina = max(1, pagina)
+    inicio = (pagina - 1) * por_pagina
+
+    asociaciones = list(
+        RegistroAsociacion.objects
+        .filter(estado=estado)
+        .annotate(num_animales=Count('animales'))
+        .order_by(*ORDEN_POR_ESTADO[estado])[inicio:inicio + por_pagina + 1]
+    )
+    return {
+        'asociaciones': asociaciones[:por_pagina],
+        'pagina': pagina,
+        'tiene_siguiente': len(asociaciones) > por_pagina,
+    }
@@ -6,8 +6,21 @@ Sistema de Signals para Invalidacion Automatica de Cache
 Este modulo implementa signals de Django que invalidan automaticamente
 el cache cuando se crean, modifican o eliminan animales.
 
+En lugar de borrar clave por clave, todas las entradas de animales viven en
+un espacio de nombres versionado (ver cache_animales.py): invalidar es
+incrementar un unico contador de generacion, y las invalidaciones de una
+misma peticion o transaccion se agrupan en una sola.
+
 IMPORTANTE: Solo se invalida cache para operaciones con animales,
 NO para asociaciones (registro/edicion de asociaciones no afecta el cache).
+La excepcion son los cambios de estado de una asociacion, que ocultan o
+muestran sus animales: los gestiona RegistroAsociacion.save() al
+actualizar CreacionAnimales.visible. Esos cambios (y las altas y bajas de
+asociaciones) invalidan ademas los contadores del panel de administracion
+(ver panel_admin.py).
+
+Tambien mantiene al dia el indice de texto de resultados_busqueda
+(ver indice_busqueda.py) cada vez que se guarda un animal.
 """
 
 from django.db.models.signals import post_save, post_delete
@@ -15,7 +28,10 @@ from django.dispatch import receiver
 from django.core.cache import cache
 import logging
 
-from .models import CreacionAnimales, ImagenAnimal, VideoAnimal
+from .models import CreacionAnimales, ImagenAnimal, RegistroAsociacion, VideoAnimal
+from .cache_animales import incrementar_generacion, programar_invalidacion
+from .indice_busqueda import CAMPOS_MODELO_INDEXADOS, indexar_animal
+from .panel_admin import invalidar_contadores
 
 logger = logging.getLogger(__name__)
 
@@ -37,25 +53,8 @@ def invalidar_cache_al_guardar_animal(sender, instance, created, **kwargs):
     else:
         logger.info(f"Animal actualizado: {instance.nombre} (ID: {instance.id}) - Invalidando cache")
 
-    # Invalidar caches generales
-    cache.delete('inicio_animales')  # Vista de inicio (legacy)
-    cache.delete('inicio_animales_v2')  # Vista de inicio (diccionarios optimizados)
-    cache.delete('buscador_animales')  # Buscador avanzado (legacy)
-    cache.delete('buscador_animales_v2')  # Buscador avanzado (diccionarios optimizados)
-    cache.delete('animales_count')  # Contador de animales
-
-    # Invalidar cache especifico de este animal
-    cache.delete(f'animal_{instance.id}')
-
-    # Invalidar cache por provincia (para busquedas filtradas)
-    if instance.provincia:
-        cache.delete(f'animales_provincia_{instance.provincia}')
-
-    # Invalidar cache por tipo de animal
-    if instance.tipo_de_animal:
-        cache.delete(f'animales_tipo_{instance.tipo_de_animal}')
-
-    logger.debug(f"Cache invalidado correctamente para animal ID {instance.id}")
+    # Inicio, buscador, feed, contadores... todos cuelgan de la misma generacion
+    programar_invalidacion()
 
 
 @receiver(post_delete, sender=CreacionAnimales)
@@ -67,21 +66,23 @@ def invalidar_cache_al_eliminar_animal(sender, instance, **kwargs):
     """
     logger.info(f"Animal eliminado: {instance.nombre} (ID: {instance.id}) - Invalidando cache")
 
-    # Invalidar los mismos caches que al guardar
-    cache.delete('inicio_animales')  # Vista de inicio (legacy)
-    cache.delete('inicio_animales_v2')  # Vista de inicio (diccionarios optimizados)
-    cache.delete('buscador_animales')  # Buscador avanzado (legacy)
-    cache.delete('buscador_animales_v2')  # Buscador avanzado (diccionarios optimizados)
-    cache.delete('animales_count')
-    cache.delete(f'animal_{instance.id}')
+    programar_invalidacion()
 
-    if instance.provincia:
-        cache.delete(f'animales_provincia_{instance.provincia}')
 
-    if instance.tipo_de_animal:
-        cache.delete(f'animales_tipo_{instance.tipo_de_animal}')
+@receiver(post_save, sender=CreacionAnimales)
+def actualizar_indice_busqueda(sender, instance, update_fields=None, raw=False, **kwargs):
+    """
+    Reindexa el texto del animal para resultados_busqueda.
 
-    logger.debug(f"Cache invalidado correctamente tras eliminar animal ID {instance.id}")
+    Se omite cuando save(update_fields=...) no toca ningun campo indexado
+    (p.ej. al marcar como adoptado). Los tokens se borran en cascada al
+    eliminar el animal.
+    """
+    if raw:
+        return
+    if update_fields is not None and not CAMPOS_MODELO_INDEXADOS.intersection(update_fields):
+        return
+    indexar_animal(instance)
 
 
 # ==================== SIGNALS PARA IMAGENES DE ANIMALES ====================
@@ -91,20 +92,12 @@ def invalidar_cache_al_cambiar_imagen(sender, instance, **kwargs):
     """
     Invalida el cache cuando se añade/elimina una imagen de un animal.
 
-    Importante: Las imagenes afectan la vista del animal especifico.
+    Importante: Las imagenes afectan la vista del animal y las listas generales
+    (que muestran la imagen principal).
     """
-    logger.info(f"Imagen modificada para animal ID: {instance.animal.id} - Invalidando cache")
-
-    # Solo invalidar cache del animal especifico
-    cache.delete(f'animal_{instance.animal.id}')
-
-    # Tambien invalidar listas generales (porque pueden mostrar la imagen principal)
-    cache.delete('inicio_animales')  # Vista de inicio (legacy)
-    cache.delete('inicio_animales_v2')  # Vista de inicio (diccionarios optimizados)
-    cache.delete('buscador_animales')  # Buscador avanzado (legacy)
-    cache.delete('buscador_animales_v2')  # Buscador avanzado (diccionarios optimizados)
+    logger.info(f"Imagen modificada para animal ID: {instance.animal_id} - Invalidando cache")
 
-    logger.debug(f"Cache invalidado para imagenes del animal ID {instance.animal.id}")
+    programar_invalidacion()
 
 
 # ==================== SIGNALS PARA VIDEOS DE ANIMALES ====================
@@ -116,18 +109,9 @@ def invalidar_cache_al_cambiar_video(sender, instance, **kwargs):
 
     Importante: Los videos afectan la vista del animal especifico y listas generales.
     """
-    logger.info(f"Video modificado para animal ID: {instance.animal.id} - Invalidando cache")
+    logger.info(f"Video modificado para animal ID: {instance.animal_id} - Invalidando cache")
 
-    # Invalidar cache del animal especifico
-    cache.delete(f'animal_{instance.animal.id}')
-
-    # Tambien invalidar listas generales (consistencia con ImagenAnimal)
-    cache.delete('inicio_animales')  # Vista de inicio (legacy)
-    cache.delete('inicio_animales_v2')  # Vista de inicio (diccionarios optimizados)
-    cache.delete('buscador_animales')  # Buscador avanzado (legacy)
-    cache.delete('buscador_animales_v2')  # Buscador avanzado (diccionarios optimizados)
-
-    logger.debug(f"Cache invalidado para videos del animal ID {instance.animal.id}")
+    programar_invalidacion()
 
 
 # ==================== FUNCIONES AUXILIARES ====================
@@ -146,11 +130,32 @@ def limpiar_todo_el_cache():
 
 def invalidar_cache_animales():
     """
-    Invalida selectivamente solo el cache relacionado con animales.
+    Invalida inmediatamente todo el cache relacionado con animales.
 
     Util para mantenimiento o actualizaciones masivas.
     """
-    cache.delete('inicio_animales')
-    cache.delete('buscador_animales')
-    cache.delete('animales_count')
-    logger.info("Cache de animales invalidado selectivamente")
+    incrementar_generacion()
+    logger.info("Cache de animales invalidado manualmente")
+
+
+# ==================== SIGNALS PARA ASOCIACIONES ====================
+
+@receiver(post_save, sender=RegistroAsociacion)
+def invalidar_contadores_al_cambiar_estado(sender, instance, created, raw=False, **kwargs):
+    """
+    Invalida los contadores por estado del panel de administracion.
+
+    Solo al crear la asociacion o cambiar su estado: save() actualiza
+    _estado_guardado despues de super().save(), asi que aqui todavia tiene
+    el estado anterior.
+    """
+    if raw:
+        return
+    if created or instance.estado != getattr(instance, '_estado_guardado', None):
+        invalidar_contadores()
+
+
+@receiver(post_delete, sender=RegistroAsociacion)
+def invalidar_contadores_al_eliminar_asociacion(sender, instance, **kwargs):
+    """Invalida los contadores por estado del panel al eliminar una asociacion"""
+    invalidar_contadores()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# myapp/sitemap.py
+"""
+Sitemap de la web: indice (sitemap.xml) y partes de URLS_POR_SITEMAP URLs
+
+sitemap_xml renderizaba una plantilla con todos los animales en cada visita
+de un buscador, sin cache, sin limite de tamano (el protocolo admite 50.000
+URLs por fichero) y sin Last-Modified. Ahora:
+
+- /sitemap.xml es un indice que enlaza /sitemap-1.xml, /sitemap-2.xml...
+- Cada parte se genera en streaming, recorriendo los animales con
+  .iterator() sin cargarlos todos en memoria, y al terminar se guarda en la
+  cache de animales: las signals de CreacionAnimales (crear, editar, adoptar,
+  borrar) incrementan la generacion y la dejan obsoleta. Los cambios de una
+  asociacion entre activa y suspendida no tocan los animales; esos se
+  reflejan al caducar SITEMAP_TIMEOUT.
+- ETag (generacion + parte) y Last-Modified (momento en que se calculo la
+  generacion) permiten a los buscadores revalidar con un 304 sin descargar
+  el fichero.
+"""
+
+import hashlib
+import math
+from xml.sax.saxutils import escape
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .cache_animales import guardar_en_cache, obtener_de_cache, obtener_generacion
+from .models import CreacionAnimales, RegistroAsociacion
+
+# Maximo de URLs por fichero que admite el protocolo de sitemaps
+URLS_POR_SITEMAP = 50000
+
+SITEMAP_TIMEOUT = 3600
+
+# Paginas fijas al principio de la primera parte: (ruta, changefreq, priority)
+PAGINAS_ESTATICAS = (
+    ('/', 'daily', '1.0'),
+    ('/buscador-avanzado/', 'daily', '0.9'),
+    ('/acerca/', 'monthly', '0.5'),
+)
+
+CABECERA_URLSET = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+)
+
+
+def animales_sitemap():
+    """Animales publicados y sin adoptar de asociaciones activas"""
+    # (visible cubre activas y suspendidas; las suspendidas son pocas)
+    return (
+        CreacionAnimales.objects
+        .filter(visible=True, adoptado=False)
+        .exclude(asociacion_id__in=RegistroAsociacion.objects.filter(estado='suspendida').values('id'))
+        .order_by('-fecha_creacion', '-id')
+    )
+
+
+def obtener_resumen():
+    """
+    {'urls': total de URLs, 'fecha': momento del calculo} de la generacion actual.
+
+    La fecha es el Last-Modified del indice y de todas sus partes.
+    """
+    resumen = obtener_de_cache('sitemap:resumen')
+    if resumen is None:
+        resumen = {
+            'urls': len(PAGINAS_ESTATICAS) + animales_sitemap().count(),
+            'fecha': timezone.now().replace(microsecond=0),
+        }
+        guardar_en_cache('sitemap:resumen', resumen, timeout=SITEMAP_TIMEOUT)
+    return resumen
+
+
+def numero_de_partes(resumen):
+    return max(1, math.ceil(resumen['urls'] / URLS_POR_SITEMAP))
+
+
+def calcular_etag(base_url, parte=0):
+    """ETag de una parte (0 = indice): cambia con la generacion de animales"""
+    clave = f'{base_url}:{obtener_generacion()}:{parte}'
+    return hashlib.md5(clave.encode()).hexdigest()
+
+
+def _clave_parte(base_url, parte):
+    return f'sitemap:{hashlib.md5(base_url.encode()).hexdigest()}:{parte}'
+
+
+def generar_indice(base_url):
+    """XML del indice de sitemaps"""
+    resumen = obtener_resumen()
+    lastmod = resumen['fecha'].isoformat()
+    base = escape(base_url)
+    entradas = ''.join(
+        f'    <sitemap>\n'
+        f'        <loc>{base}/sitemap-{parte}.xml</loc>\n'
+        f'        <lastmod>{lastmod}</lastmod>\n'
+        f'    </sitemap>\n'
+        for parte in range(1, numero_de_partes(resumen) + 1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        f'{entradas}'
+        '</sitemapindex>\n'
+    )
+
+
+def obtener_parte_cacheada(base_url, parte):
+    """XML de una parte ya generado en esta generacion (o None)"""
+    return obtener_de_cache(_clave_parte(base_url, parte))
+
+
+def generar_parte(base_url, parte):
+    """
+    Genera el XML de una parte trozo a trozo (para StreamingHttpResponse).
+
+    Si se llega al final (el cliente no corta la descarga) se guarda en cache.
+    """
+    base = escape(base_url)
+    # Se guarda en la generacion en la que empezo: si los animales cambian
+    # mientras se descarga, el resultado ya nace obsoleto
+    generacion = obtener_generacion()
+    trozos = []
+
+    def emitir(trozo):
+        trozos.append(trozo)
+        return trozo
+
+    yield emitir(CABECERA_URLSET)
+
+    # La primera parte empieza con las paginas fijas; las URLs de animales
+    # se numeran a continuacion
+    inicio = (parte - 1) * URLS_POR_SITEMAP
+    fin = inicio + URLS_POR_SITEMAP
+    if parte == 1:
+        for ruta, changefreq, priority in PAGINAS_ESTATICAS:
+            yield emitir(
+                f'    <url>\n'
+                f'        <loc>{base}{ruta}</loc>\n'
+                f'        <changefreq>{changefreq}</changefreq>\n'
+                f'        <priority>{priority}</priority>\n'
+                f'    </url>\n'
+            )
+    inicio = max(0, inicio - len(PAGINAS_ESTATICAS))
+    fin -= len(PAGINAS_ESTATICAS)
+
+    animales = animales_sitemap().values_list('id', 'fecha_creacion')[inicio:fin]
+    for animal_id, fecha_creacion in animales.iterator(chunk_size=2000):
+        yield emitir(
+            f'    <url>\n'
+            f'        <loc>{base}/ver_animal/{animal_id}/</loc>\n'
+            f'        <lastmod>{timezone.localdate(fecha_creacion).isoformat()}</lastmod>\n'
+            f'        <changefreq>weekly</changefreq>\n'
+            f'        <priority>0.8</priority>\n'
+            f'    </url>\n'
+        )
+
+    yield emitir('</urlset>\n')
+    cache.set(_clave_parte(base_url, parte), ''.join(trozos), timeout=SITEMAP_TIMEOUT, version=generacion)
@@ -0,0 +1,97 @@
+// Subida directa de imágenes y videos a Cloudinary (ver myapp/subida_directa.py)
+// 1. Pide al servidor los parámetros firmados (/api/subidas/firmar/)
+// 2. Sube cada archivo directamente a Cloudinary
+// 3. Registra las subidas en el animal (/api/subidas/registrar/)
+(function () {
+    async function postJSON(url, datos, csrfToken) {
+        const response = await fetch(url, {
+            method: 'POST',
+            body: JSON.stringify(datos),
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Requested-With': 'XMLHttpRequest',
+                'X-CSRFToken': csrfToken
+            }
+        });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Error en la subida');
+        }
+        return data;
+    }
+
+    // XMLHttpRequest en vez de fetch para tener el progreso de la subida
+    function subirACloudinary(firma, archivo, alProgresar) {
+        return new Promise((resolve, reject) => {
+            const formData = new FormData();
+            for (const [campo, valor] of Object.entries(firma.campos)) {
+                formData.append(campo, valor);
+            }
+            formData.append('file', archivo);
+
+            const xhr = new XMLHttpRequest();
+            xhr.open('POST', firma.url);
+            xhr.upload.onprogress = e => alProgresar(e.loaded);
+            xhr.onload = () => {
+                if (xhr.status >= 200 && xhr.status < 300) {
+                    resolve(JSON.parse(xhr.responseText));
+                } else {
+                    reject(new Error(`Cloudinary respondió ${xhr.status}`));
+                }
+            };
+            xhr.onerror = () => reject(new Error('Error de red subiendo a Cloudinary'));
+            xhr.send(formData);
+        });
+    }
+
+    /**
+     * Sube imágenes y videos de un animal directamente a Cloudinary.
+     * alProgresar(subidos, total) recibe los bytes enviados de todos los archivos.
+     * Devuelve {registradas, rechazadas} del servidor.
+     */
+    async function subirMediosDirectamente(animalId, imagenes, videos, csrfToken, alProgresar) {
+        const grupos = [['imagen', Array.from(imagenes || [])], ['video', Array.from(videos || [])]]
+            .filter(([, archivos]) => archivos.length);
+        const total = grupos.reduce((suma, [, archivos]) => suma + archivos.reduce((s, a) => s + a.size, 0), 0);
+        const enviados = new Map();
+        const progreso = () => {
+            if (alProgresar) {
+                alProgresar(Array.from(enviados.values()).reduce((s, b) => s + b, 0), total);
+            }
+        };
+
+        // Primero todas las firmas: si el servidor rechaza alguna no se sube nada
+        const firmasPorTipo = [];
+        for (const [tipo, archivos] of grupos) {
+            const {firmas} = await postJSON('/api/subidas/firmar/', {
+                animal_id: animalId, tipo: tipo, cantidad: archivos.length
+            }, csrfToken);
+            firmasPorTipo.push(firmas);
+        }
+
+        const respuestas = await Promise.all(grupos.flatMap(([, archivos], g) =>
+            archivos.map((archivo, i) =>
+                subirACloudinary(firmasPorTipo[g][i], archivo, bytes => {
+                    enviados.set(archivo, bytes);
+                    progreso();
+                }).catch(error => {
+                    console.error('Error al subir archivo:', error);
+                    return null;
+                })
+            )
+        ));
+        // Se registran en el mismo orden en que se seleccionaron
+        const subidas = respuestas.filter(Boolean).map(respuesta => ({
+            public_id: respuesta.public_id,
+            version: respuesta.version,
+            signature: respuesta.signature
+        }));
+
+        if (!subidas.length) {
+            return {registradas: [], rechazadas: []};
+        }
+        return postJSON('/api/subidas/registrar/', {animal_id: animalId, subidas: subidas}, csrfToken);
+    }
+
+    window.subirMediosDirectamente = subirMediosDirectamente;
+})();
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# myapp/subida_directa.py
+"""
+Subida directa de imagenes y videos desde el navegador a Cloudinary
+
+Con subida_medios cada byte pasa por nginx y gunicorn antes de llegar a
+Cloudinary. Con MEDIA_SUBIDA_DIRECTA el navegador sube los archivos el
+mismo y los workers solo firman y registran:
+
+1. POST /api/subidas/firmar/ -> firmar_subidas(): parametros firmados de
+   Cloudinary con un public_id fijado por el servidor (y los formatos
+   permitidos y, en las fotos, el redimensionado al subir). Cada public_id
+   queda apuntado en la cache compartida para ese animal durante
+   FIRMA_TIMEOUT. Las firmas aun sin registrar cuentan para el maximo de
+   archivos por animal, asi que no se pueden pedir firmas sin limite.
+2. El navegador sube cada archivo a Cloudinary con esos campos.
+3. POST /api/subidas/registrar/ -> registrar_subidas(): por cada subida se
+   comprueba que el public_id se firmo para este animal, la firma de la
+   respuesta de Cloudinary (public_id + version) y, con la Admin API, el
+   tamano y el formato reales, y que el animal no supere el maximo. Si todo
+   cuadra se crea la ImagenAnimal o VideoAnimal; si no, se borra el archivo
+   de Cloudinary.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .cloudinary_storage import cloudinary_storage
+from .models import ImagenAnimal, VideoAnimal
+from .subida_medios import MAX_IMAGENES, MAX_VIDEOS, actualizar_campos_legacy
+
+logger = logging.getLogger(__name__)
+
+# Un public_id firmado se puede registrar durante 15 minutos
+FIRMA_TIMEOUT = 900
+
+# Mismos limites que validate_image_file / validate_video_file
+TIPOS_SUBIDA = {
+    'imagen': {
+        'folder': 'animales/fotos',
+        'resource_type': 'image',
+        'formatos': ('jpg', 'jpeg', 'png', 'gif', 'webp'),
+        'max_bytes': 5 * 1024 * 1024,
+        'maximo': MAX_IMAGENES,
+    },
+    'video': {
+        'folder': 'animales/videos',
+        'resource_type': 'video',
+        'formatos': ('mp4', 'mpeg', 'mpg', 'mov', 'avi', 'webm'),
+        'max_bytes': 10 * 1024 * 1024,
+        'maximo': MAX_VIDEOS,
+    },
+}
+
+
+class SubidaNoValida(Exception):
+    """Peticion de firma o registro que no se puede atender"""
+
+
+def _cache():
+    # Sin L1: se firma en un worker y se registra en otro
+    return caches['compartida']
+
+
+def _clave_firma(public_id):
+    return f'subida_directa:{public_id}'
+
+
+def _clave_pendientes(animal, tipo):
+    return f'subida_directa:pendientes:{animal.id}:{tipo}'
+
+
+def _pendientes(animal, tipo):
+    """public_ids firmados para el animal que aun no se han registrado ni caducado"""
+    public_ids = _cache().get(_clave_pendientes(animal, tipo), [])
+    vigentes = _cache().get_many([_clave_firma(public_id) for public_id in public_ids])
+    return [public_id for public_id in public_ids if _clave_firma(public_id) in vigentes]
+
+
+def _existentes(animal, tipo):
+    return animal.imagenes.count() if tipo == 'imagen' else animal.videos.count()
+
+
+def firmar_subidas(animal, tipo, cantidad):
+    """
+    Firma `cantidad` subidas directas de un tipo para un animal.
+
+    Returns:
+        list: [{'public_id', 'url', 'campos'}] (ver CloudinaryStorage.firmar_subida)
+
+    Raises:
+        SubidaNoValida: tipo desconocido o se superaria el maximo por animal
+                        (contando las firmas pendientes de registrar)
+    """
+    if tipo not in TIPOS_SUBIDA:
+        raise SubidaNoValida(f"Tipo de archivo no valido: {tipo}")
+    config = TIPOS_SUBIDA[tipo]
+    pendientes = _pendientes(animal, tipo)
+    if cantidad < 1 or _existentes(animal, tipo) + len(pendientes) + cantidad > config['maximo']:
+        raise SubidaNoValida(f"Máximo {config['maximo']} archivos de tipo {tipo} por animal")
+
+    transformation = None
+    if tipo == 'imagen':
+        # Mismo tope que los derivados de imagenes.py, aplicado por Cloudinary
+        lado = settings.IMAGEN_LADO_MAXIMO
+        transformation = f'c_limit,w_{lado},h_{lado}'
+
+    firmas = []
+    for _ in range(cantidad):
+        firma = cloudinary_storage.firmar_subida(
+            config['folder'],
+            resource_type=config['resource_type'],
+            allowed_formats=config['formatos'],
+            transformation=transformation,
+        )
+        _cache().set(_clave_firma(firma['public_id']), {'animal_id': animal.id, 'tipo': tipo}, timeout=FIRMA_TIMEOUT)
+        firmas.append(firma)
+    pendientes += [firma['public_id'] for firma in firmas]
+    _cache().set(_clave_pendientes(animal, tipo), pendientes, timeout=FIRMA_TIMEOUT)
+    return firmas
+
+
+def _verificar(animal, subida):
+    """Devuelve (tipo, recurso de Cloudinary, orden de la nueva fila) o lanza SubidaNoValida"""
+    public_id = str(subida.get('public_id', ''))
+    firmada = _cache().get(_clave_firma(public_id))
+    if not firmada or firmada['animal_id'] != animal.id:
+        raise SubidaNoValida(f"Subida no firmada para este animal: {public_id}")
+    # Cada firma se registra una sola vez: delete() es atomico en Redis y en
+    # la cache de ficheros, y solo la peticion que la borra recibe True
+    if not _cache().delete(_clave_firma(public_id)):
+        raise SubidaNoValida(f"Subida ya registrada: {public_id}")
+
+    config = TIPOS_SUBIDA[firmada['tipo']]
+    if not cloudinary_storage.verificar_subida(public_id, subida.get('version'), subida.get('signature')):
+        raise SubidaNoValida(f"Firma de Cloudinary no valida: {public_id}")
+
+    recurso = cloudinary_storage.obtener_recurso(public_id, resource_type=config['resource_type'])
+    if not recurso:
+        raise SubidaNoValida(f"El archivo no existe en Cloudinary: {public_id}")
+    if recurso.get('bytes', 0) > config['max_bytes'] or recurso.get('format') not in config['formatos']:
+        cloudinary_storage.borrar([public_id], firmada['tipo'])
+        raise SubidaNoValida(f"Archivo demasiado grande o de formato no permitido: {public_id}")
+    # Se cuenta en cada subida: incluye las registradas por otras peticiones
+    # mientras se verificaba esta (y las de esta misma), y queda detras de
+    # los existentes, como editar_animal
+    orden = _existentes(animal, firmada['tipo'])
+    if orden >= config['maximo']:
+        cloudinary_storage.borrar([public_id], firmada['tipo'])
+        raise SubidaNoValida(f"Máximo {config['maximo']} archivos de tipo {firmada['tipo']} por animal: {public_id}")
+    return firmada['tipo'], recurso, orden
+
+
+def registrar_subidas(animal, subidas):
+    """
+    Crea las ImagenAnimal/VideoAnimal de las subidas directas ya terminadas.
+
+    Args:
+        animal: animal al que se firmaron las subidas
+        subidas: [{'public_id', 'version', 'signature'}] tal y como los
+                 devuelve Cloudinary al navegador
+
+    Returns:
+        dict: {'registradas': [public_id...], 'rechazadas': [public_id...]}
+    """
+    falta_principal = not animal.imagenes.filter(es_principal=True).exists()
+
+    registradas, rechazadas = [], []
+    for subida in subidas:
+        try:
+            tipo, recurso, orden = _verificar(animal, subida)
+        except SubidaNoValida as e:
+            logger.warning(f"Animal {animal.id}: {e}")
+            rechazadas.append(subida.get('public_id'))
+            continue
+
+        if tipo == 'imagen':
+            ImagenAnimal.objects.create(
+                animal=animal,
+                imagen=recurso['secure_url'],
+                clave=recurso['public_id'],
+                miniatura=cloudinary_storage.url_miniatura(
+                    recurso['public_id'], recurso['version'], settings.IMAGEN_LADO_MINIATURA,
+                ),
+                orden=orden,
+                es_principal=falta_principal,
+            )
+            falta_principal = False
+        else:
+            VideoAnimal.objects.create(
+                animal=animal, video=recurso['secure_url'], clave=recurso['public_id'], orden=orden,
+            )
+        registradas.append(recurso['public_id'])
+
+    if registradas:
+        actualizar_campos_legacy(animal.id)
+    return {'registradas': registradas, 'rechazadas': rechazadas}
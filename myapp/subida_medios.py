@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+# myapp/subida_medios.py
+"""
+Subida de imagenes y videos de animales en segundo plano
+
+crear_animal y editar_animal ya no suben los archivos a Cloudinary uno tras
+otro dentro de la peticion:
+
+1. Cada archivo se vuelca a un fichero temporal (Django borra los suyos al
+   terminar la peticion) y el animal se guarda inmediatamente.
+2. Tras el commit, cada archivo se sube en un pool de hilos compartido por
+   el proceso (MEDIA_UPLOAD_WORKERS subidas simultaneas como maximo) y su
+   ImagenAnimal/VideoAnimal se crea en cuanto termina. El cache de animales
+   se invalida una sola vez, al terminar la tarea, y no con cada fila.
+3. Las fotos no se suben tal cual: en el mismo hilo se genera una imagen
+   WebP de tamano limitado y la miniatura de las tarjetas (myapp/imagenes.py)
+   y se suben las dos. Una foto que no se puede decodificar cuenta como
+   fallida.
+4. Los archivos van al almacen de MEDIA_STORAGE_BACKEND (media_storage.py),
+   que devuelve la URL y la clave guardadas en la fila. Los videos se suben
+   por trozos leyendo del fichero temporal, sin cargarlos en memoria.
+5. El progreso, total y de cada archivo (bytes subidos), se guarda en la
+   cache compartida para que cualquier worker pueda responder a
+   /api/subidas/<tarea_id>/ mientras el modal consulta.
+
+Limitacion: si el proceso se reinicia con subidas pendientes, esos archivos
+se pierden (la tarea queda 'en_curso' hasta caducar).
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from .cache_animales import invalidacion_agrupada, programar_invalidacion
+from .imagenes import ImagenNoValida, generar_derivados
+from .media_storage import obtener_storage
+from .models import CreacionAnimales, ImagenAnimal, VideoAnimal
+
+logger = logging.getLogger(__name__)
+
+MAX_IMAGENES = 10
+MAX_VIDEOS = 5
+
+# El estado de una tarea se conserva una hora
+ESTADO_TIMEOUT = 3600
+
+TAMANO_BLOQUE = 1024 * 1024
+
+_executor = None
+_lock_executor = threading.Lock()
+# Protege la lectura-modificacion-escritura del estado de las tareas
+_lock_estados = threading.Lock()
+
+
+def _cache_estados():
+    # Sin L1: el estado lo escriben hilos de un worker y lo leen los demas
+    return caches['compartida']
+
+
+def _clave_estado(tarea_id):
+    return f'subida_medios:{tarea_id}'
+
+
+def _obtener_executor():
+    global _executor
+    with _lock_executor:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.MEDIA_UPLOAD_WORKERS,
+                thread_name_prefix='subida-medios',
+            )
+        return _executor
+
+
+def esperar_subidas():
+    """Espera a que terminen las subidas en curso de este proceso (benchmark)"""
+    global _executor
+    with _lock_executor:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def _guardar_archivo_temporal(archivo):
+    """Copia un UploadedFile a un fichero temporal que sobrevive a la peticion"""
+    sufijo = os.path.splitext(archivo.name)[1].lower()
+    if hasattr(archivo, 'temporary_file_path'):
+        # Django ya lo ha volcado a disco (archivos grandes, como los videos):
+        # se mueve en vez de copiarlo; al cerrarlo Django tolera que no exista
+        descriptor, ruta = tempfile.mkstemp(prefix='subida_', suffix=sufijo)
+        os.close(descriptor)
+        try:
+            os.replace(archivo.temporary_file_path(), ruta)
+            return ruta
+        except OSError:
+            os.remove(ruta)
+    with tempfile.NamedTemporaryFile(prefix='subida_', suffix=sufijo, delete=False) as destino:
+        for bloque in archivo.chunks(TAMANO_BLOQUE):
+            destino.write(bloque)
+    return destino.name
+
+
+def obtener_estado_subida(tarea_id):
+    """
+    Devuelve el estado de una tarea o None si no existe (o ha caducado).
+
+    Returns:
+        dict: {'animal_id', 'asociacion_id', 'estado': 'en_curso'|'completada'|
+               'completada_con_errores', 'total', 'completadas', 'fallidas',
+               'archivos': [{'tipo', 'nombre', 'tamano', 'subidos', 'estado'}]}
+    """
+    return _cache_estados().get(_clave_estado(tarea_id))
+
+
+def encolar_subidas(animal, imagenes=(), videos=(), orden_imagenes=0, orden_videos=0, primera_principal=False):
+    """
+    Programa la subida de las imagenes y videos de un animal.
+
+    Args:
+        animal: animal ya guardado al que se asocian los archivos
+        imagenes, videos: UploadedFile recibidos (se respetan los maximos)
+        orden_imagenes, orden_videos: orden del primer archivo nuevo
+        primera_principal: marcar la primera imagen como principal
+
+    Returns:
+        str: id de la tarea para consultar su estado, o None si no hay archivos
+    """
+    archivos = [
+        {
+            'tipo': 'imagen',
+            'nombre': imagen.name,
+            'tamano': imagen.size,
+            'ruta': _guardar_archivo_temporal(imagen),
+            'orden': orden_imagenes + idx,
+            'es_principal': primera_principal and idx == 0,
+        }
+        for idx, imagen in enumerate(list(imagenes)[:MAX_IMAGENES])
+    ] + [
+        {
+            'tipo': 'video',
+            'nombre': video.name,
+            'tamano': video.size,
+            'ruta': _guardar_archivo_temporal(video),
+            'orden': orden_videos + idx,
+            'es_principal': False,
+        }
+        for idx, video in enumerate(list(videos)[:MAX_VIDEOS])
+    ]
+    if not archivos:
+        return None
+
+    for indice, archivo in enumerate(archivos):
+        archivo['indice'] = indice
+
+    tarea_id = uuid.uuid4().hex
+    _cache_estados().set(_clave_estado(tarea_id), {
+        'animal_id': animal.id,
+        'asociacion_id': animal.asociacion_id,
+        'estado': 'en_curso',
+        'total': len(archivos),
+        'completadas': 0,
+        'fallidas': 0,
+        'archivos': [
+            {
+                'tipo': archivo['tipo'],
+                'nombre': archivo['nombre'],
+                'tamano': archivo['tamano'],
+                'subidos': 0,
+                'estado': 'pendiente',
+            }
+            for archivo in archivos
+        ],
+    }, timeout=ESTADO_TIMEOUT)
+
+    def lanzar():
+        if settings.MEDIA_UPLOAD_BACKGROUND:
+            executor = _obtener_executor()
+            for archivo in archivos:
+                executor.submit(_subir_archivo, tarea_id, animal.id, archivo)
+        else:
+            for archivo in archivos:
+                _subir_archivo(tarea_id, animal.id, archivo)
+
+    # El hilo tiene que ver el animal ya guardado en la BD
+    transaction.on_commit(lanzar)
+    logger.info(f"Tarea {tarea_id}: {len(archivos)} archivos en cola para el animal {animal.id}")
+    return tarea_id
+
+
+def _subir_archivo(tarea_id, animal_id, archivo):
+    """Sube un archivo, crea su ImagenAnimal/VideoAnimal y actualiza la tarea"""
+    url = None
+    try:
+        if archivo['tipo'] == 'imagen':
+            url = _subir_imagen(animal_id, archivo)
+        else:
+            with open(archivo['ruta'], 'rb') as fichero:
+                subido = obtener_storage().subir(fichero, 'videos', 'video', progreso=_progreso(tarea_id, archivo))
+            if subido:
+                url = subido.url
+                # Se invalida al terminar la tarea (_registrar_resultado)
+                with invalidacion_agrupada(invalidar_al_salir=False):
+                    VideoAnimal.objects.create(animal_id=animal_id, video=url, clave=subido.clave, orden=archivo['orden'])
+    except ImagenNoValida as e:
+        logger.warning(f"Tarea {tarea_id}: imagen {archivo['orden']} descartada: {e}")
+        url = None
+    except Exception:
+        logger.exception(f"Tarea {tarea_id}: error subiendo {archivo['tipo']} {archivo['orden']}")
+        url = None
+    finally:
+        try:
+            os.remove(archivo['ruta'])
+        except OSError:
+            pass
+
+    try:
+        _registrar_resultado(tarea_id, animal_id, archivo, correcto=url is not None)
+    finally:
+        if settings.MEDIA_UPLOAD_BACKGROUND:
+            # Cada hilo del pool abre su propia conexion: no dejarla colgada
+            connection.close()
+
+
+def _subir_imagen(animal_id, archivo):
+    """Sube la imagen y la miniatura WebP de una foto y crea su ImagenAnimal"""
+    storage = obtener_storage()
+    with open(archivo['ruta'], 'rb') as fichero:
+        derivados = generar_derivados(fichero)
+        imagen = storage.subir(derivados['imagen'], 'fotos', 'imagen')
+    if not imagen:
+        return None
+
+    # Sin miniatura las tarjetas usan la imagen: no es motivo para fallar
+    miniatura = storage.subir(derivados['miniatura'], 'miniaturas', 'imagen')
+    # Se invalida al terminar la tarea (_registrar_resultado)
+    with invalidacion_agrupada(invalidar_al_salir=False):
+        ImagenAnimal.objects.create(
+            animal_id=animal_id,
+            imagen=imagen.url,
+            clave=imagen.clave,
+            miniatura=miniatura.url if miniatura else '',
+            clave_miniatura=miniatura.clave if miniatura else '',
+            orden=archivo['orden'],
+            es_principal=archivo['es_principal'],
+        )
+    return imagen.url
+
+
+def _progreso(tarea_id, archivo):
+    """Funcion de progreso para el storage: guarda los bytes subidos de un archivo"""
+    ultimo = [0]
+
+    def registrar(subidos):
+        # Como mucho una escritura en la cache por cada TAMANO_BLOQUE subido
+        if subidos - ultimo[0] < TAMANO_BLOQUE and subidos < archivo['tamano']:
+            return
+        ultimo[0] = subidos
+        clave = _clave_estado(tarea_id)
+        with _lock_estados:
+            estado = _cache_estados().get(clave)
+            if estado is None:
+                return
+            estado['archivos'][archivo['indice']].update(subidos=min(subidos, archivo['tamano']), estado='subiendo')
+            _cache_estados().set(clave, estado, timeout=ESTADO_TIMEOUT)
+
+    return registrar
+
+
+def _registrar_resultado(tarea_id, animal_id, archivo, correcto):
+    """Cuenta un archivo terminado y, si era el ultimo, cierra la tarea e invalida el cache"""
+    clave = _clave_estado(tarea_id)
+    with _lock_estados:
+        estado = _cache_estados().get(clave)
+        if estado is None:
+            # Tarea caducada: no se sabe si es la ultima, invalidar por esta fila
+            if correcto:
+                programar_invalidacion()
+            return
+        estado['completadas' if correcto else 'fallidas'] += 1
+        estado['archivos'][archivo['indice']].update(
+            subidos=archivo['tamano'] if correcto else 0,
+            estado='completado' if correcto else 'fallido',
+        )
+        terminada = estado['completadas'] + estado['fallidas'] >= estado['total']
+        if terminada:
+            estado['estado'] = 'completada_con_errores' if estado['fallidas'] else 'completada'
+        _cache_estados().set(clave, estado, timeout=ESTADO_TIMEOUT)
+
+    if terminada:
+        # Una sola invalidacion por tarea (filas nuevas + campos legacy)
+        with invalidacion_agrupada():
+            actualizar_campos_legacy(animal_id)
+            if estado['completadas']:
+                programar_invalidacion()
+        logger.info(
+            f"Tarea {tarea_id} terminada: {estado['completadas']} subidos, {estado['fallidas']} fallidos"
+        )
+
+
+def actualizar_campos_legacy(animal_id):
+    """Rellena animal.imagen / animal.video si estaban vacios (campos legacy)"""
+    animal = CreacionAnimales.objects.filter(pk=animal_id).first()
+    if animal is None:
+        return
+
+    campos = []
+    if not animal.imagen:
+        animal.imagen = animal.get_primera_imagen()
+        if animal.imagen:
+            campos.append('imagen')
+    if not animal.video:
+        animal.video = animal.videos.values_list('video', flat=True).first()
+        if animal.video:
+            campos.append('video')
+    if campos:
+        animal.save(update_fields=campos)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+# myapp/telegram_client.py
+"""
+Cliente HTTP para la API de bots de Telegram
+
+Antes cada llamada hacia requests.post(...) por su cuenta, pagando una
+conexion TCP + TLS nueva cada vez. TelegramClient reutiliza una unica
+requests.Session (keep-alive, pool de conexiones) y además:
+
+- Respeta los limites de Telegram en el lado del cliente: como mucho
+  TELEGRAM_MENSAJES_POR_SEGUNDO envios en total y un mensaje cada
+  TELEGRAM_INTERVALO_CHAT segundos a un mismo chat.
+- Si Telegram responde 429, espera los segundos de `retry_after` y reintenta.
+  Los errores 5xx y de conexion se reintentan con una espera corta.
+- enviar_lote() manda varios mensajes seguidos por la misma conexion
+  (la API no tiene envio multiple) sin cortar el lote si uno falla.
+
+La URL base sale de TELEGRAM_API_URL para poder apuntar los tests a un
+servidor falso local.
+"""
+
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Limite de Telegram para los textos de answerCallbackQuery
+LONGITUD_MAXIMA_CALLBACK = 200
+
+# Espera antes de reintentar un 5xx o un error de conexion (se duplica)
+ESPERA_ERROR_SERVIDOR = 1
+
+
+class ErrorTelegram(Exception):
+    """La API de Telegram rechazo la llamada (o no se pudo contactar)"""
+
+    def __init__(self, descripcion, codigo=None, retry_after=None):
+        super().__init__(descripcion)
+        self.descripcion = descripcion
+        self.codigo = codigo
+        self.retry_after = retry_after
+
+
+class LimitadorEnvios:
+    """
+    Espacia los envios para no superar los limites de Telegram.
+
+    Guarda el instante en que se podra hacer el siguiente envio (en total y
+    por chat) y hace esperar al que llega antes. Es seguro entre hilos.
+    """
+
+    def __init__(self, por_segundo, intervalo_chat, reloj=time.monotonic, dormir=time.sleep):
+        self.intervalo_global = 1.0 / por_segundo if por_segundo else 0
+        self.intervalo_chat = intervalo_chat
+        self.reloj = reloj
+        self.dormir = dormir
+        self._lock = threading.Lock()
+        self._siguiente_global = 0.0
+        self._siguiente_chat = {}
+
+    def esperar_turno(self, chat_id=None):
+        """Bloquea hasta que se pueda enviar y reserva el turno"""
+        with self._lock:
+            ahora = self.reloj()
+            turno = max(ahora, self._siguiente_global)
+            if chat_id is not None:
+                turno = max(turno, self._siguiente_chat.get(chat_id, 0.0))
+                self._siguiente_chat[chat_id] = turno + self.intervalo_chat
+                # Los chats que ya pueden volver a recibir no hace falta recordarlos
+                if len(self._siguiente_chat) > 1000:
+                    self._siguiente_chat = {
+                        chat: siguiente for chat, siguiente in self._siguiente_chat.items()
+                        if siguiente > ahora
+                    }
+            self._siguiente_global = turno + self.intervalo_global
+
+        if turno > ahora:
+            self.dormir(turno - ahora)
+
+
+class TelegramClient:
+    """Cliente de la API de bots con conexion persistente, limites y reintentos"""
+
+    def __init__(self, token, api_url=None, timeout=10, max_reintentos=3, limitador=None, dormir=time.sleep):
+        self.base_url = f"{(api_url or settings.TELEGRAM_API_URL).rstrip('/')}/bot{token}"
+        self.timeout = timeout
+        self.max_reintentos = max_reintentos
+        self.dormir = dormir
+        self.limitador = limitador or LimitadorEnvios(
+            settings.TELEGRAM_MENSAJES_POR_SEGUNDO,
+            settings.TELEGRAM_INTERVALO_CHAT,
+            dormir=dormir,
+        )
+
+        self.session = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=10)
+        self.session.mount('https://', adaptador)
+        self.session.mount('http://', adaptador)
+
+    def close(self):
+        self.session.close()
+
+    # ==================== LLAMADA GENERICA ====================
+
+    def llamar(self, metodo, datos=None, chat_id=None, timeout=None):
+        """
+        Llama a un metodo de la API y devuelve su 'result'.
+
+        Args:
+            metodo: nombre del metodo ('sendMessage', 'getUpdates'...)
+            datos: parametros (se envian como JSON)
+            chat_id: chat destinatario, para el limite por chat (None = sin limite)
+
+        Raises:
+            ErrorTelegram: si Telegram rechaza la llamada o se agotan los reintentos
+        """
+        url = f"{self.base_url}/{metodo}"
+        espera_error = ESPERA_ERROR_SERVIDOR
+
+        for intento in range(1, self.max_reintentos + 2):
+            if chat_id is not None:
+                self.limitador.esperar_turno(chat_id)
+
+            try:
+                response = self.session.post(url, json=datos or {}, timeout=timeout or self.timeout)
+            except requests.exceptions.RequestException as e:
+                error = ErrorTelegram(f"Error de conexión: {e}")
+                espera = espera_error
+                espera_error *= 2
+            else:
+                respuesta = self._decodificar(response)
+                if respuesta.get('ok'):
+                    return respuesta.get('result')
+
+                parametros = respuesta.get('parameters') or {}
+                error = ErrorTelegram(
+                    respuesta.get('description') or f"HTTP {response.status_code}",
+                    codigo=respuesta.get('error_code', response.status_code),
+                    retry_after=parametros.get('retry_after'),
+                )
+                if error.codigo == 429:
+                    espera = error.retry_after or 1
+                elif error.codigo and error.codigo >= 500:
+                    espera = espera_error
+                    espera_error *= 2
+                else:
+                    # 400, 403...: repetir la llamada daria el mismo error
+                    raise error
+
+            if intento > self.max_reintentos:
+                raise error
+            logger.warning(f"Telegram {metodo}: {error} (intento {intento}), reintento en {espera}s")
+            self.dormir(espera)
+
+    @staticmethod
+    def _decodificar(response):
+        try:
+            return response.json()
+        except ValueError:
+            return {'ok': False, 'error_code': response.status_code, 'description': response.text[:200]}
+
+    # ==================== METODOS ====================
+
+    def enviar_mensaje(self, chat_id, texto, botones=None, parse_mode=None):
+        """Envia un mensaje (con teclado inline opcional) y devuelve el Message"""
+        datos = {'chat_id': chat_id, 'text': texto}
+        if parse_mode:
+            datos['parse_mode'] = parse_mode
+        if botones:
+            datos['reply_markup'] = {'inline_keyboard': botones}
+        return self.llamar('sendMessage', datos, chat_id=chat_id)
+
+    def editar_mensaje(self, chat_id, message_id, texto, botones=None, parse_mode=None):
+        """Reemplaza el texto (y el teclado) de un mensaje ya enviado"""
+        datos = {'chat_id': chat_id, 'message_id': message_id, 'text': texto}
+        if parse_mode:
+            datos['parse_mode'] = parse_mode
+        if botones:
+            datos['reply_markup'] = {'inline_keyboard': botones}
+        return self.llamar('editMessageText', datos, chat_id=chat_id)
+
+    def responder_callback(self, callback_query_id, texto=''):
+        """Quita el spinner de un boton inline (con un aviso opcional)"""
+        datos = {'callback_query_id': str(callback_query_id)}
+        if texto:
+            datos['text'] = str(texto)[:LONGITUD_MAXIMA_CALLBACK]
+        # No cuenta para el limite de mensajes por chat
+        return self.llamar('answerCallbackQuery', datos)
+
+    def enviar_lote(self, mensajes):
+        """
+        Envia varios mensajes reutilizando la conexion y respetando los limites.
+
+        Args:
+            mensajes: iterable de dicts con 'chat_id', 'texto' y opcionalmente
+                      'botones' y 'parse_mode'
+
+        Returns:
+            list: por cada mensaje, el Message enviado o la ErrorTelegram que
+                  lo impidio (en el mismo orden)
+        """
+        resultados = []
+        for mensaje in mensajes:
+            try:
+                resultados.append(self.enviar_mensaje(
+                    mensaje['chat_id'],
+                    mensaje['texto'],
+                    botones=mensaje.get('botones'),
+                    parse_mode=mensaje.get('parse_mode'),
+                ))
+            except ErrorTelegram as e:
+                logger.error(f"Error enviando mensaje del lote a {mensaje['chat_id']}: {e}")
+                resultados.append(e)
+        return resultados
+
+
+_cliente = None
+_lock_cliente = threading.Lock()
+
+
+def obtener_cliente():
+    """Cliente compartido por el proceso (una sola sesion y un solo limitador)"""
+    global _cliente
+    with _lock_cliente:
+        if _cliente is None:
+            from .telegram_utils import TELEGRAM_BOT_TOKEN
+
+            _cliente = TelegramClient(TELEGRAM_BOT_TOKEN)
+        return _cliente
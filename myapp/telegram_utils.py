@@ -3,6 +3,7 @@ import json
 import os
 import logging
 from django.conf import settings
+from django.core.cache import cache
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
@@ -10,6 +11,10 @@ from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
 
+from .estados_conversacion import obtener_almacen
+from .telegram_client import ErrorTelegram, obtener_cliente
+from .updates_telegram import guardar_update
+
 # Configurar logging
 logger = logging.getLogger(__name__)
 
@@ -25,56 +30,51 @@ if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
     )
 
 # ==================== SISTEMA DE ESTADOS CONVERSACIONALES ====================
-# Almacenamiento temporal de estados (en producción usar Redis o base de datos)
-ESTADOS_CONVERSACION = {}
-
-def guardar_estado_conversacion(chat_id, estado, datos=None):
-    """Guarda el estado de la conversación para un chat específico"""
-    ESTADOS_CONVERSACION[chat_id] = {
-        'estado': estado,
-        'datos': datos or {},
-        'timestamp': timezone.now()
-    }
-    logger.info(f"Estado guardado para chat {chat_id}: {estado}")
+# Los estados se guardan en un almacén compartido por todos los workers y
+# caducan solos (ver estados_conversacion.py y TELEGRAM_ESTADOS_BACKEND)
+
+def guardar_estado_conversacion(chat_id, estado, datos=None, version=None):
+    """
+    Guarda el estado de la conversación para un chat específico.
+    Con `version` (la leída con obtener_estado_conversacion) solo lo guarda si
+    nadie lo ha cambiado entretanto. Devuelve False si no se guardó.
+    """
+    guardado = obtener_almacen().guardar(chat_id, estado, datos or {}, version=version)
+    if guardado:
+        logger.info(f"Estado guardado para chat {chat_id}: {estado}")
+    else:
+        logger.warning(f"Estado de chat {chat_id} modificado por otro proceso, no se guarda {estado}")
+    return guardado
 
 def obtener_estado_conversacion(chat_id):
-    """Obtiene el estado actual de la conversación"""
-    return ESTADOS_CONVERSACION.get(chat_id, None)
+    """Obtiene el estado actual de la conversación ({'estado', 'datos', 'version'} o None)"""
+    return obtener_almacen().obtener(chat_id)
 
 def limpiar_estado_conversacion(chat_id):
     """Limpia el estado de la conversación"""
-    if chat_id in ESTADOS_CONVERSACION:
-        del ESTADOS_CONVERSACION[chat_id]
-        logger.info(f"Estado limpiado para chat {chat_id}")
+    obtener_almacen().limpiar(chat_id)
+    logger.info(f"Estado limpiado para chat {chat_id}")
 
 # ==================== FUNCIONES BÁSICAS ====================
+# Todas las llamadas pasan por el TelegramClient compartido (telegram_client.py):
+# conexión persistente, límites de envío y reintentos ante 429.
+
+def _texto_utf8(texto):
+    """Asegura que el texto esté en UTF-8"""
+    if isinstance(texto, str):
+        return texto.encode('utf-8', errors='replace').decode('utf-8')
+    return texto
 
 def enviar_mensaje_telegram(mensaje, botones=None):
     """Función base para enviar mensajes a Telegram"""
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-
-    # Asegurar que el mensaje esté en UTF-8
-    if isinstance(mensaje, str):
-        mensaje = mensaje.encode('utf-8', errors='replace').decode('utf-8')
-
-    data = {
-        'chat_id': TELEGRAM_CHAT_ID,
-        'text': mensaje,
-        'parse_mode': 'Markdown'
-    }
-
-    if botones:
-        data['reply_markup'] = json.dumps({
-            'inline_keyboard': botones
-        }, ensure_ascii=False)
-
     try:
-        response = requests.post(url, data=data, timeout=10)
-        response.raise_for_status()
+        obtener_cliente().enviar_mensaje(
+            TELEGRAM_CHAT_ID, _texto_utf8(mensaje), botones=botones, parse_mode='Markdown'
+        )
         logger.info("Mensaje de Telegram enviado exitosamente")
         return True
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error de conexión enviando mensaje de Telegram: {e}")
+    except ErrorTelegram as e:
+        logger.error(f"Error enviando mensaje de Telegram: {e}")
         return False
     except Exception as e:
         logger.error(f"Error general en enviar_mensaje_telegram: {e}")
@@ -82,44 +82,17 @@ def enviar_mensaje_telegram(mensaje, botones=None):
 
 def editar_mensaje_telegram(chat_id, message_id, nuevo_texto, botones=None, parse_mode=None):
     """Edita un mensaje existente en Telegram"""
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/editMessageText"
-
-    # Asegurar que el texto esté en UTF-8
-    if isinstance(nuevo_texto, str):
-        nuevo_texto = nuevo_texto.encode('utf-8', errors='replace').decode('utf-8')
-
-    data = {
-        'chat_id': chat_id,
-        'message_id': message_id,
-        'text': nuevo_texto
-    }
-
-    if parse_mode:
-        data['parse_mode'] = parse_mode
-
-    if botones:
-        data['reply_markup'] = json.dumps({
-            'inline_keyboard': botones
-        }, ensure_ascii=False)
+    nuevo_texto = _texto_utf8(nuevo_texto)
 
     try:
-        response = requests.post(url, data=data, timeout=10)
-        response.raise_for_status()
+        obtener_cliente().editar_mensaje(
+            chat_id, message_id, nuevo_texto, botones=botones, parse_mode=parse_mode
+        )
         logger.info(f"Mensaje {message_id} editado exitosamente")
         return True
-    except requests.exceptions.HTTPError as e:
-        # Log más detallado del error de Telegram
-        try:
-            error_detail = response.json()
-            logger.error(f"Error HTTP editando mensaje: Status {response.status_code}")
-            logger.error(f"Detalle del error: {error_detail}")
-            logger.error(f"Datos enviados: chat_id={chat_id}, message_id={message_id}, texto_length={len(nuevo_texto)}")
-        except:
-            logger.error(f"Error HTTP editando mensaje: {e}")
-            logger.error(f"Response text: {response.text}")
-        return False
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error de conexión editando mensaje: {e}")
+    except ErrorTelegram as e:
+        logger.error(f"Error editando mensaje (código {e.codigo}): {e.descripcion}")
+        logger.error(f"Datos enviados: chat_id={chat_id}, message_id={message_id}, texto_length={len(nuevo_texto)}")
         return False
     except Exception as e:
         logger.error(f"Error general editando mensaje: {e}")
@@ -127,64 +100,68 @@ def editar_mensaje_telegram(chat_id, message_id, nuevo_texto, botones=None, pars
 
 def responder_callback(callback_query_id, texto=""):
     """Responde al callback query para quitar el spinner"""
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/answerCallbackQuery"
-
-    # Preparar payload como JSON (formato preferido por Telegram)
-    payload = {
-        'callback_query_id': str(callback_query_id)
-    }
-
-    # Si hay texto, agregarlo (opcional)
-    if texto:
-        payload['text'] = str(texto)[:200]  # Telegram límite de 200 caracteres
-
     try:
-        response = requests.post(url, json=payload, timeout=10)
-        response.raise_for_status()
+        obtener_cliente().responder_callback(callback_query_id, texto)
         logger.info(f"Callback {callback_query_id} respondido exitosamente")
         return True
-    except requests.exceptions.HTTPError as e:
-        # Log más detallado del error de Telegram
-        try:
-            error_detail = response.json()
-            logger.error(f"Error HTTP respondiendo callback: Status {response.status_code}")
-            logger.error(f"Detalle del error: {error_detail}")
-            logger.error(f"Datos enviados: callback_query_id={callback_query_id}, texto='{texto}'")
-        except:
-            logger.error(f"Error HTTP respondiendo callback: {e}")
-            logger.error(f"Response text: {response.text}")
-        return False
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error de conexión respondiendo callback: {e}")
+    except ErrorTelegram as e:
+        logger.error(f"Error respondiendo callback (código {e.codigo}): {e.descripcion}")
+        logger.error(f"Datos enviados: callback_query_id={callback_query_id}, texto='{texto}'")
         return False
     except Exception as e:
         logger.error(f"Error general respondiendo callback: {e}")
         return False
 
-# ==================== FUNCIONES DE NOTIFICACIÓN ====================
+# La URL pública apenas cambia: antes se consultaba la API local de ngrok
+# (con 2 s de timeout si no estaba) en cada notificación y cada botón
+DURACION_CACHE_URL_BASE = 300
 
-def enviar_notificacion_nueva_asociacion(asociacion, request):
-    """Envía notificación de nueva asociación con URLs directas"""
+def obtener_url_base():
+    """URL pública del servidor para los enlaces de los mensajes (túnel de ngrok, Render o local)"""
+    base_url = cache.get('telegram:url_base')
+    if base_url:
+        return base_url
 
-    # Obtener la URL base del servidor
     try:
-        import requests as req
-        response = req.get('http://localhost:4040/api/tunnels', timeout=2)
-        if response.status_code == 200:
-            tunnels = response.json().get('tunnels', [])
-            if tunnels:
-                base_url = tunnels[0]['public_url']
-                logger.info(f"Usando URL de ngrok: {base_url}")
-            else:
-                raise Exception("No hay túneles activos")
-    except:
+        response = requests.get('http://localhost:4040/api/tunnels', timeout=2)
+        tunnels = response.json().get('tunnels', []) if response.status_code == 200 else []
+        if not tunnels:
+            raise Exception("No hay túneles activos")
+        base_url = tunnels[0]['public_url']
+        logger.info(f"Usando URL de ngrok: {base_url}")
+    except Exception:
         # Si no hay ngrok, usar configuración por defecto
-        from django.conf import settings
-        if hasattr(settings, 'RENDER_EXTERNAL_HOSTNAME') and settings.RENDER_EXTERNAL_HOSTNAME:
+        if getattr(settings, 'RENDER_EXTERNAL_HOSTNAME', None):
             base_url = f"https://{settings.RENDER_EXTERNAL_HOSTNAME}"
         else:
             base_url = "http://127.0.0.1:8000"
 
+    cache.set('telegram:url_base', base_url, DURACION_CACHE_URL_BASE)
+    return base_url
+
+# ==================== FUNCIONES DE NOTIFICACIÓN ====================
+# Las notificaciones al admin no se envían dentro de la petición: se encolan
+# en NotificacionSaliente y las envía el worker procesar_notificaciones
+# (ver notificaciones.py). La clave evita duplicados si el evento se repite.
+
+def encolar_notificacion_telegram(mensaje, clave=None):
+    """Encola un mensaje para el chat del admin. Devuelve True si quedó en la cola"""
+    from .notificaciones import encolar_telegram
+
+    try:
+        encolar_telegram(mensaje, clave=clave)
+        return True
+    except Exception as e:
+        logger.error(f"Error encolando notificación de Telegram: {e}")
+        return False
+
+
+def enviar_notificacion_nueva_asociacion(asociacion, request):
+    """Envía notificación de nueva asociación con URLs directas"""
+
+    # Obtener la URL base del servidor
+    base_url = obtener_url_base()
+
     # Construir URLs para las acciones
     url_aprobar = f"{base_url}/admin/aprobar/{asociacion.token_aprobacion}/"
     url_rechazar = f"{base_url}/admin/rechazar/{asociacion.token_aprobacion}/"
@@ -208,7 +185,7 @@ ID: {asociacion.id}
 👁️ Panel Admin: {url_panel}
     """
 
-    return enviar_mensaje_telegram(mensaje)
+    return encolar_notificacion_telegram(mensaje, clave=f"telegram:nueva_asociacion:{asociacion.id}")
 
 def enviar_notificacion_aprobacion(asociacion):
     """Envía notificación de asociación aprobada"""
@@ -224,7 +201,7 @@ def enviar_notificacion_aprobacion(asociacion):
 🎉 Ya pueden acceder al sistema.
     """
     
-    return enviar_mensaje_telegram(mensaje)
+    return encolar_notificacion_telegram(mensaje, clave=f"telegram:aprobacion:{asociacion.id}:{asociacion.fecha_aprobacion.isoformat()}")
 
 def enviar_notificacion_rechazo(asociacion, motivo):
     """Envía notificación de asociación rechazada"""
@@ -241,7 +218,7 @@ def enviar_notificacion_rechazo(asociacion, motivo):
 ✉️ Email explicativo enviado a la asociación.
     """
 
-    return enviar_mensaje_telegram(mensaje)
+    return encolar_notificacion_telegram(mensaje, clave=f"telegram:rechazo:{asociacion.id}:{asociacion.token_aprobacion}")
 
 def enviar_notificacion_rechazo_web(nombre_asociacion, email_asociacion, motivo):
     """Envía notificación de asociación rechazada desde el panel web"""
@@ -263,7 +240,7 @@ def enviar_notificacion_rechazo_web(nombre_asociacion, email_asociacion, motivo)
 <i>Acción realizada por: Administrador Web</i>
     """
 
-    return enviar_mensaje_telegram(mensaje)
+    return encolar_notificacion_telegram(mensaje)
 
 def enviar_notificacion_suspension(asociacion):
     """Envía notificación de asociación suspendida"""
@@ -282,7 +259,7 @@ def enviar_notificacion_suspension(asociacion):
 ⚠️ La asociación no puede acceder, pero sus animales siguen visibles.
     """
     
-    return enviar_mensaje_telegram(mensaje)
+    return encolar_notificacion_telegram(mensaje, clave=f"telegram:suspension:{asociacion.id}:{asociacion.fecha_modificacion_estado.isoformat()}")
 
 def enviar_notificacion_reactivacion(asociacion):
     """Envía notificación de asociación reactivada"""
@@ -301,7 +278,7 @@ def enviar_notificacion_reactivacion(asociacion):
 ✅ La asociación ya puede acceder normalmente al sistema.
     """
     
-    return enviar_mensaje_telegram(mensaje)
+    return encolar_notificacion_telegram(mensaje, clave=f"telegram:reactivacion:{asociacion.id}:{asociacion.fecha_modificacion_estado.isoformat()}")
 
 def enviar_notificacion_eliminacion(asociacion):
     """Envía notificación de asociación eliminada"""
@@ -320,7 +297,7 @@ def enviar_notificacion_eliminacion(asociacion):
 ❌ Eliminación permanente. No pueden acceder y sus animales no aparecen.
     """
     
-    return enviar_mensaje_telegram(mensaje)
+    return encolar_notificacion_telegram(mensaje, clave=f"telegram:eliminacion:{asociacion.id}:{asociacion.fecha_modificacion_estado.isoformat()}")
 
 def enviar_notificacion_nuevo_animal(animal):
     """Envía notificación cuando una asociación registra un nuevo animal"""
@@ -336,21 +313,25 @@ def enviar_notificacion_nuevo_animal(animal):
 📅 <b>Registrado:</b> {animal.fecha_creacion.strftime("%d/%m/%Y %H:%M")}
     """
     
-    return enviar_mensaje_telegram(mensaje)
+    return encolar_notificacion_telegram(mensaje, clave=f"telegram:nuevo_animal:{animal.id}")
 
 def enviar_estadisticas_diarias():
     """Envía un resumen diario de la actividad de la plataforma"""
     from .models import RegistroAsociacion, CreacionAnimales
+    from .estadisticas import actualizar_estadisticas, resumen
     from django.utils import timezone
     from datetime import datetime, timedelta
 
-    hoy = timezone.now().date()
+    hoy = timezone.localdate()
     ayer = hoy - timedelta(days=1)
 
-    # Obtener estadísticas
-    nuevas_asociaciones = RegistroAsociacion.objects.filter(fecha_registro__date=ayer).count()
-    asociaciones_aprobadas = RegistroAsociacion.objects.filter(fecha_aprobacion__date=ayer).count()
-    nuevos_animales = CreacionAnimales.objects.filter(fecha_creacion__date=ayer).count()
+    # Actividad de ayer desde la tabla de estadísticas diarias (se pone al día si hace falta)
+    actualizar_estadisticas(hasta=ayer)
+    actividad = resumen(ayer, ayer)
+    nuevas_asociaciones = actividad['nuevas_asociaciones']
+    asociaciones_aprobadas = actividad['asociaciones_aprobadas']
+    nuevos_animales = actividad['nuevos_animales']
+    adopciones = actividad['adopciones']
     total_asociaciones = RegistroAsociacion.objects.filter(estado='activa').count()
     total_animales = CreacionAnimales.objects.filter(adoptado=False).count()
 
@@ -361,6 +342,7 @@ def enviar_estadisticas_diarias():
 • 🆕 Nuevas asociaciones: {nuevas_asociaciones}
 • ✅ Asociaciones aprobadas: {asociaciones_aprobadas}
 • 🐕 Nuevos animales: {nuevos_animales}
+• 🏠 Adopciones: {adopciones}
 
 📊 <b>Totales actuales:</b>
 • 🏢 Asociaciones activas: {total_asociaciones}
@@ -369,7 +351,7 @@ def enviar_estadisticas_diarias():
 🌟 ¡Siguiendo adelante con la misión de ayudar a los animales!
     """
 
-    return enviar_mensaje_telegram(mensaje)
+    return encolar_notificacion_telegram(mensaje, clave=f"telegram:estadisticas_diarias:{ayer.isoformat()}")
 
 # ==================== FUNCIONES DE REGISTRO DE ASOCIACIÓN ====================
 
@@ -408,6 +390,8 @@ def procesar_paso_registro(chat_id, texto):
 
     estado = estado_actual['estado']
     datos = estado_actual['datos']
+    # Si otro proceso avanza la conversación antes (mensaje repetido), este paso no hace nada
+    version = estado_actual['version']
 
     # PASO 1: Nombre
     if estado == 'esperando_nombre':
@@ -419,7 +403,8 @@ def procesar_paso_registro(chat_id, texto):
             return
 
         datos['nombre'] = texto
-        guardar_estado_conversacion(chat_id, 'esperando_email', datos)
+        if not guardar_estado_conversacion(chat_id, 'esperando_email', datos, version=version):
+            return
         enviar_mensaje_telegram(f"✅ Nombre: {texto}\n\nAhora envíame el EMAIL de contacto:")
 
     # PASO 2: Email
@@ -431,7 +416,8 @@ def procesar_paso_registro(chat_id, texto):
             return
 
         datos['email'] = texto
-        guardar_estado_conversacion(chat_id, 'esperando_telefono', datos)
+        if not guardar_estado_conversacion(chat_id, 'esperando_telefono', datos, version=version):
+            return
         enviar_mensaje_telegram(f"✅ Email: {texto}\n\nAhora envíame el TELÉFONO de contacto:")
 
     # PASO 3: Teléfono
@@ -443,7 +429,8 @@ def procesar_paso_registro(chat_id, texto):
             return
 
         datos['telefono'] = texto
-        guardar_estado_conversacion(chat_id, 'esperando_direccion', datos)
+        if not guardar_estado_conversacion(chat_id, 'esperando_direccion', datos, version=version):
+            return
         enviar_mensaje_telegram(f"✅ Teléfono: {texto}\n\nAhora envíame la DIRECCIÓN completa:")
 
     # PASO 4: Dirección
@@ -453,7 +440,8 @@ def procesar_paso_registro(chat_id, texto):
             return
 
         datos['direccion'] = texto
-        guardar_estado_conversacion(chat_id, 'esperando_poblacion', datos)
+        if not guardar_estado_conversacion(chat_id, 'esperando_poblacion', datos, version=version):
+            return
         enviar_mensaje_telegram(f"✅ Dirección: {texto}\n\nAhora envíame la POBLACIÓN:")
 
     # PASO 5: Población
@@ -463,7 +451,8 @@ def procesar_paso_registro(chat_id, texto):
             return
 
         datos['poblacion'] = texto
-        guardar_estado_conversacion(chat_id, 'esperando_provincia', datos)
+        if not guardar_estado_conversacion(chat_id, 'esperando_provincia', datos, version=version):
+            return
         enviar_mensaje_telegram(f"✅ Población: {texto}\n\nAhora envíame la PROVINCIA:")
 
     # PASO 6: Provincia
@@ -473,7 +462,8 @@ def procesar_paso_registro(chat_id, texto):
             return
 
         datos['provincia'] = texto
-        guardar_estado_conversacion(chat_id, 'esperando_codigo_postal', datos)
+        if not guardar_estado_conversacion(chat_id, 'esperando_codigo_postal', datos, version=version):
+            return
         enviar_mensaje_telegram(f"✅ Provincia: {texto}\n\nAhora envíame el CÓDIGO POSTAL:")
 
     # PASO 7: Código postal
@@ -483,7 +473,8 @@ def procesar_paso_registro(chat_id, texto):
             return
 
         datos['codigo_postal'] = texto
-        guardar_estado_conversacion(chat_id, 'esperando_password', datos)
+        if not guardar_estado_conversacion(chat_id, 'esperando_password', datos, version=version):
+            return
         enviar_mensaje_telegram(f"✅ Código postal: {texto}\n\nFinalmente, envíame la CONTRASEÑA para acceso al sistema (mínimo 6 caracteres):")
 
     # PASO 8: Password (último paso)
@@ -492,6 +483,10 @@ def procesar_paso_registro(chat_id, texto):
             enviar_mensaje_telegram("❌ La contraseña debe tener al menos 6 caracteres. Por favor, envía una contraseña más segura:")
             return
 
+        # Reservar el último paso para no crear la asociación dos veces
+        if not guardar_estado_conversacion(chat_id, 'creando_asociacion', datos, version=version):
+            return
+
         datos['password'] = texto
 
         # Crear la asociación
@@ -572,7 +567,10 @@ def verify_telegram_webhook(request):
 
 @csrf_exempt
 def telegram_webhook(request):
-    """Webhook completamente renovado para manejar correctamente las peticiones de Telegram"""
+    """
+    Webhook de Telegram: valida el update, lo guarda (sin duplicar update_id)
+    y responde al momento. El procesamiento lo hace procesar_updates_telegram.
+    """
 
     # Logging detallado para debugging
     logger.info("=== WEBHOOK TELEGRAM RECIBIDO ===")
@@ -596,6 +594,10 @@ def telegram_webhook(request):
         logger.warning(f"Método no permitido: {request.method}")
         return JsonResponse({'error': 'Method not allowed'}, status=405)
 
+    if not verify_telegram_webhook(request):
+        logger.warning("Webhook rechazado: secret token incorrecto")
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
     try:
         # Verificar que hay contenido
         if not request.body:
@@ -627,6 +629,29 @@ def telegram_webhook(request):
             logger.error("Los datos no son un diccionario válido")
             return JsonResponse({'error': 'Invalid data format'}, status=400)
 
+        if not isinstance(data.get('update_id'), int):
+            logger.error("Update sin update_id válido")
+            return JsonResponse({'error': 'Missing update_id'}, status=400)
+
+        # Guardar y responder ya: el worker procesar_updates_telegram lo procesa
+        if guardar_update(data):
+            return JsonResponse({'status': 'queued', 'update_id': data['update_id']})
+        return JsonResponse({'status': 'duplicate', 'update_id': data['update_id']})
+
+    except Exception as e:
+        logger.error(f"Error general en webhook: {e}", exc_info=True)
+        return JsonResponse({
+            'status': 'error',
+            'error': 'Internal server error',
+            'message': str(e)[:100]  # Limitar mensaje de error
+        }, status=500)
+
+def procesar_update(data):
+    """
+    Procesa un update de Telegram (botones y mensajes) y devuelve un JsonResponse
+    con el resultado. Lo llama el worker, no el webhook (ver updates_telegram.py).
+    """
+    try:
         # Manejar callback queries (botones presionados)
         if 'callback_query' in data:
             callback_query = data['callback_query']
@@ -749,7 +774,7 @@ def telegram_webhook(request):
             return JsonResponse({'status': 'update_not_processed', 'keys': list(data.keys())})
 
     except Exception as e:
-        logger.error(f"Error general en webhook: {e}", exc_info=True)
+        logger.error(f"Error general procesando update: {e}", exc_info=True)
         return JsonResponse({
             'status': 'error',
             'error': 'Internal server error',
@@ -900,35 +925,13 @@ def manejar_ver_detalles(callback_data, chat_id, message_id, callback_query_id):
         asociacion_id = callback_data.split('_')[1]
 
         from .models import RegistroAsociacion
-        import os
-        from django.conf import settings
 
         asociacion = RegistroAsociacion.objects.get(id=asociacion_id)
 
-        # Obtener la URL base del panel de administración de manera dinámica
-        # Primero intentar obtener la URL de ngrok si está disponible
-        try:
-            import requests
-            response = requests.get('http://localhost:4040/api/tunnels', timeout=2)
-            if response.status_code == 200:
-                tunnels = response.json().get('tunnels', [])
-                if tunnels:
-                    ngrok_url = tunnels[0]['public_url']
-                    admin_url = f"{ngrok_url}/admin/panel/"
-                    asociacion_detail_url = f"{ngrok_url}/admin/info/{asociacion.token_aprobacion}/"
-                    logger.info(f"Usando URL de ngrok para enlaces: {ngrok_url}")
-                else:
-                    raise Exception("No hay túneles activos")
-        except:
-            # Si no hay ngrok, usar configuración por defecto
-            if hasattr(settings, 'RENDER_EXTERNAL_HOSTNAME') and settings.RENDER_EXTERNAL_HOSTNAME:
-                # En producción (Render)
-                admin_url = f"https://{settings.RENDER_EXTERNAL_HOSTNAME}/admin/panel/"
-                asociacion_detail_url = f"https://{settings.RENDER_EXTERNAL_HOSTNAME}/admin/info/{asociacion.token_aprobacion}/"
-            else:
-                # En desarrollo local
-                admin_url = "http://127.0.0.1:8000/admin/panel/"
-                asociacion_detail_url = f"http://127.0.0.1:8000/admin/info/{asociacion.token_aprobacion}/"
+        # Obtener la URL base del panel de administración (ngrok, Render o local)
+        base_url = obtener_url_base()
+        admin_url = f"{base_url}/admin/panel/"
+        asociacion_detail_url = f"{base_url}/admin/info/{asociacion.token_aprobacion}/"
 
         # IMPORTANTE: Responder al callback PRIMERO para quitar el loading
         responder_callback(callback_query_id, "Detalles cargados")
@@ -1147,23 +1150,14 @@ def probar_telegram():
     """Función para probar la configuración de Telegram"""
     mensaje = "🧪 Prueba de configuración - ¡Telegram funcionando correctamente!"
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    data = {
-        'chat_id': TELEGRAM_CHAT_ID,
-        'text': mensaje
-    }
-
     try:
-        response = requests.post(url, data=data)
-        print(f"Respuesta: {response.status_code}")
-        print(f"Contenido: {response.text}")
-
-        if response.status_code == 200:
-            print("✅ ¡Telegram configurado correctamente!")
-            return True
-        else:
-            print("❌ Error en la configuración")
-            return False
+        respuesta = obtener_cliente().enviar_mensaje(TELEGRAM_CHAT_ID, mensaje)
+        print(f"Respuesta: {respuesta}")
+        print("✅ ¡Telegram configurado correctamente!")
+        return True
+    except ErrorTelegram as e:
+        print(f"❌ Error en la configuración: {e}")
+        return False
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
@@ -1218,27 +1212,19 @@ Esta es una prueba para verificar que los botones de Telegram funcionan correcta
 
 def verificar_webhook_url():
     """Verifica la configuración del webhook de Telegram"""
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getWebhookInfo"
-
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            webhook_info = data.get('result', {})
-
-            logger.info("Informacion del Webhook:")
-            logger.info(f"   URL: {webhook_info.get('url', 'No configurada')}")
-            logger.info(f"   Pendientes: {webhook_info.get('pending_update_count', 0)}")
-            logger.info(f"   Ultima actualizacion: {webhook_info.get('last_error_date', 'Nunca')}")
-
-            if webhook_info.get('url'):
-                logger.info("Webhook configurado correctamente")
-                return True
-            else:
-                logger.warning("Webhook no configurado")
-                return False
+        webhook_info = obtener_cliente().llamar('getWebhookInfo') or {}
+
+        logger.info("Informacion del Webhook:")
+        logger.info(f"   URL: {webhook_info.get('url', 'No configurada')}")
+        logger.info(f"   Pendientes: {webhook_info.get('pending_update_count', 0)}")
+        logger.info(f"   Ultima actualizacion: {webhook_info.get('last_error_date', 'Nunca')}")
+
+        if webhook_info.get('url'):
+            logger.info("Webhook configurado correctamente")
+            return True
         else:
-            logger.error(f"Error obteniendo info del webhook: {response.status_code}")
+            logger.warning("Webhook no configurado")
             return False
 
     except Exception as e:
@@ -1,3 +1,1627 @@
-from django.test import TestCase
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .cache_animales import (
+    DURACION_LEASE,
+    GENERACION_KEY,
+    guardar_en_cache,
+    incrementar_generacion,
+    invalidacion_agrupada,
+    obtener_de_cache,
+    obtener_generacion,
+    obtener_metricas,
+    obtener_o_calcular,
+)
+from .checks import comprobar_subida_directa
+from .cloudinary_storage import TAMANO_TROZO_VIDEO, CloudinaryStorage
+from .estadisticas import DIAS_RECALCULO, actualizar_estadisticas, ranking, resumen
+from .estados_conversacion import AlmacenEstadosBD, AlmacenEstadosCache
+from .imagenes import ImagenNoValida, generar_derivados
+from .indice_busqueda import tokenizar
+from .media_storage import ArchivoSubido, LocalMediaStorage
+from .models import (
+    RegistroAsociacion, CreacionAnimales, ImagenAnimal, VideoAnimal, NotificacionSaliente, UpdateTelegram,
+    EstadoConversacion, EstadisticaDiaria, TokenBusquedaAnimal,
+)
+from .notificaciones import encolar, encolar_email, encolar_telegram, procesar_pendientes, reclamar
+from .paginacion import _calcular_pagina_feed
+from . import benchmark, sitemap
+from .panel_admin import CLAVE_CONTADORES, contar_por_estado, listar_asociaciones
+from .subida_medios import MAX_IMAGENES, encolar_subidas, obtener_estado_subida
+from .telegram_client import ErrorTelegram, LimitadorEnvios, TelegramClient
+from .updates_telegram import procesar_pendientes as procesar_updates_pendientes, reclamar as reclamar_updates
+
+
+def crear_asociacion(nombre='Protectora Test', estado='activa', **kwargs):
+    """Crea una asociación mínima para los tests"""
+    datos = {
+        'nombre': nombre,
+        'password': 'x',
+        'email': f'{nombre.replace(" ", "").lower()}@test.com',
+        'telefono': '600000000',
+        'direccion': 'Calle Test 1',
+        'poblacion': 'Madrid',
+        'provincia': 'Madrid',
+        'codigo_postal': '28001',
+        'estado': estado,
+    }
+    datos.update(kwargs)
+    return RegistroAsociacion.objects.create(**datos)
+
+
+def crear_animal(asociacion, nombre='Toby', **kwargs):
+    """Crea un animal mínimo para los tests"""
+    datos = {
+        'asociacion': asociacion,
+        'nombre': nombre,
+        'tipo_de_animal': 'Perro',
+        'raza': 'Mestizo',
+        'email': 'animal@test.com',
+        'telefono': '600000000',
+        'poblacion': 'Madrid',
+        'provincia': 'Madrid',
+        'codigo_postal': '28001',
+        'descripcion': 'Descripción de prueba',
+    }
+    datos.update(kwargs)
+    return CreacionAnimales.objects.create(**datos)
+
+
+def imagen_jpeg(ancho=64, alto=48, orientacion=None, gps=False):
+    """Bytes de un JPEG de prueba, opcionalmente con orientación o GPS en el EXIF"""
+    exif = Image.Exif()
+    if orientacion:
+        exif[0x0112] = orientacion
+    if gps:
+        exif[0x8825] = {1: 'N', 2: (40.0, 25.0, 0.0)}
+    salida = BytesIO()
+    Image.new('RGB', (ancho, alto), (200, 120, 40)).save(salida, 'JPEG', exif=exif)
+    return salida.getvalue()
+
+
+class FeedInicioTest(TestCase):
+    """Tests para la paginación por cursor del feed de inicio"""
+
+    def setUp(self):
+        cache.clear()
+        self.asociacion = crear_asociacion()
+        self.url = reverse('api_feed_animales')
+
+    def test_paginas_sin_duplicados_ni_huecos(self):
+        """Test: Recorrer el feed con cursores devuelve todos los animales una sola vez"""
+        ids = {crear_animal(self.asociacion, nombre=f'Animal {i}').id for i in range(7)}
+
+        vistos = []
+        cursor = None
+        while True:
+            params = {'limite': 3}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(self.url, params).json()
+            vistos.extend(animal['id'] for animal in data['animales'])
+            cursor = data['siguiente_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(len(vistos), len(ids))
+        self.assertEqual(set(vistos), ids)
+
+    def test_primera_pagina_incluye_total(self):
+        """Test: Solo la primera página calcula el total de animales"""
+        for i in range(4):
+            crear_animal(self.asociacion, nombre=f'Animal {i}')
+
+        data = self.client.get(self.url, {'limite': 2}).json()
+        self.assertEqual(data['total'], 4)
+
+        siguiente = self.client.get(self.url, {'limite': 2, 'cursor': data['siguiente_cursor']}).json()
+        self.assertIsNone(siguiente['total'])
+
+    def test_filtra_asociaciones_no_visibles(self):
+        """Test: Los animales de asociaciones eliminadas no aparecen en el feed"""
+        eliminada = crear_asociacion(nombre='Eliminada', estado='eliminada')
+        visible = crear_animal(self.asociacion)
+        crear_animal(eliminada, nombre='Oculto')
+
+        data = self.client.get(self.url).json()
+        self.assertEqual([animal['id'] for animal in data['animales']], [visible.id])
+
+    def test_filtro_categoria(self):
+        """Test: El filtro de categoría se aplica en el servidor"""
+        crear_animal(self.asociacion, nombre='Perro', tipo_de_animal='Perro')
+        gato = crear_animal(self.asociacion, nombre='Gato', tipo_de_animal='Gato')
+
+        data = self.client.get(self.url, {'categoria': 'gato'}).json()
+        self.assertEqual([animal['id'] for animal in data['animales']], [gato.id])
+
+    def test_facetas_de_todo_el_catalogo(self):
+        """Test: La primera página trae las opciones de los selectores aunque estén en páginas no cargadas"""
+        crear_animal(self.asociacion, nombre='Antiguo', tipo_de_animal='Perro', provincia='Cádiz', raza='Galgo')
+        for i in range(3):
+            crear_animal(self.asociacion, nombre=f'Animal {i}', tipo_de_animal='Perro', provincia='Madrid')
+        crear_animal(self.asociacion, nombre='Gato', tipo_de_animal='Gato', provincia='Sevilla')
+
+        data = self.client.get(self.url, {'limite': 2, 'categoria': 'perro', 'provincia': 'Madrid'}).json()
+        # Cada selector ignora su propio filtro pero respeta los demás
+        self.assertEqual(data['facetas']['provincia'], ['Cádiz', 'Madrid'])
+        self.assertNotIn('Galgo', data['facetas']['raza'])
+        siguiente = self.client.get(self.url, {'limite': 2, 'cursor': data['siguiente_cursor']}).json()
+        self.assertIsNone(siguiente['facetas'])
+
+    def test_facetas_incluyen_adoptados(self):
+        """Test: Los selectores ofrecen los valores de los adoptados, que el feed también lista"""
+        crear_animal(self.asociacion, nombre='Disponible', provincia='Madrid')
+        adoptado = crear_animal(self.asociacion, nombre='Adoptado', provincia='Huelva', adoptado=True)
+
+        data = self.client.get(self.url).json()
+        self.assertIn(adoptado.id, [animal['id'] for animal in data['animales']])
+        self.assertEqual(data['facetas']['provincia'], ['Huelva', 'Madrid'])
+
+    def test_cursor_invalido(self):
+        """Test: Un cursor corrupto devuelve 400"""
+        response = self.client.get(self.url, {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cache_invalidada_al_crear_animal(self):
+        """Test: Crear un animal invalida las páginas cacheadas del feed"""
+        # bulk_create no dispara signals: la página queda cacheada con 1 animal
+        CreacionAnimales.objects.bulk_create([CreacionAnimales(
+            asociacion=self.asociacion, nombre='Primero', tipo_de_animal='Perro', raza='Mestizo',
+            email='animal@test.com', telefono='600000000', poblacion='Madrid',
+            provincia='Madrid', codigo_postal='28001', descripcion='Descripción de prueba',
+        )])
+        self.assertEqual(self.client.get(self.url).json()['total'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_animal(self.asociacion, nombre='Segundo')
+        self.assertEqual(self.client.get(self.url).json()['total'], 2)
+
+    def test_inicio_incrusta_primera_pagina(self):
+        """Test: La portada incrusta solo la primera página del feed como JSON"""
+        crear_animal(self.asociacion, nombre='Portada')
+
+        response = self.client.get(reverse('inicio'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'id="feed-inicial"')
+        self.assertContains(response, 'Portada')
+
+
+class GeneracionCacheTest(TestCase):
+    """Tests para el espacio de nombres versionado del cache de animales"""
+
+    def setUp(self):
+        cache.clear()
+        self.asociacion = crear_asociacion()
+
+    def test_invalidar_oculta_entradas_anteriores(self):
+        """Test: Tras una invalidación las claves de la generación anterior no se leen"""
+        guardar_en_cache('buscador_animales_v2', ['dato'])
+        self.assertEqual(obtener_de_cache('buscador_animales_v2'), ['dato'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_animal(self.asociacion)
+
+        self.assertIsNone(obtener_de_cache('buscador_animales_v2'))
+
+    def test_transaccion_agrupa_invalidaciones(self):
+        """Test: Un animal con varias imágenes incrementa la generación una sola vez"""
+        generacion = obtener_generacion()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            animal = crear_animal(self.asociacion)
+            for orden in range(5):
+                ImagenAnimal.objects.create(animal=animal, imagen=f'https://img/{orden}.jpg', orden=orden)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(cache.get(GENERACION_KEY), generacion + 1)
+
+    def test_ambito_agrupado(self):
+        """Test: invalidacion_agrupada() retrasa la invalidación hasta salir del bloque"""
+        generacion = obtener_generacion()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with invalidacion_agrupada():
+                crear_animal(self.asociacion, nombre='Uno')
+                crear_animal(self.asociacion, nombre='Dos')
+                self.assertEqual(len(callbacks), 0)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(cache.get(GENERACION_KEY), generacion + 1)
+
+
+class CacheDosNivelesTest(TestCase):
+    """Tests para el backend de caché L1 (memoria) + L2 (compartida)"""
+
+    def setUp(self):
+        cache.clear()
+        self.l2 = caches['compartida']
+
+    def test_acierto_en_l1_no_consulta_l2(self):
+        """Test: Una clave recién guardada se sirve desde memoria aunque desaparezca de L2"""
+        cache.set('clave', {'valor': 1})
+        self.l2.delete('clave')
+        self.assertEqual(cache.get('clave'), {'valor': 1})
+
+    def test_generacion_siempre_se_lee_de_l2(self):
+        """Test: El contador de generación no se queda en L1 (lo comparten los workers)"""
+        cache.set(GENERACION_KEY, 10, timeout=None)
+        self.l2.set(GENERACION_KEY, 11, timeout=None)  # Otro worker invalida
+        self.assertEqual(cache.get(GENERACION_KEY), 11)
+
+    def test_fallo_en_l1_rellena_desde_l2(self):
+        """Test: Lo que otro worker guardó en L2 se lee y se copia a L1"""
+        self.l2.set('compartida', 'dato')
+        self.assertEqual(cache.get('compartida'), 'dato')
+        self.l2.delete('compartida')
+        self.assertEqual(cache.get('compartida'), 'dato')
+
+
+class StaleWhileRevalidateTest(TestCase):
+    """Tests para la protección contra estampidas de obtener_o_calcular()"""
+
+    def setUp(self):
+        cache.clear()
+        self.llamadas = 0
+
+    def calcular(self):
+        self.llamadas += 1
+        return f'valor {self.llamadas}'
+
+    def test_valor_fresco_no_recalcula(self):
+        """Test: Mientras el valor está fresco solo se calcula una vez"""
+        for _ in range(3):
+            self.assertEqual(obtener_o_calcular('clave', self.calcular, metrica='test'), 'valor 1')
+        self.assertEqual(self.llamadas, 1)
+        self.assertEqual(obtener_metricas(['test'])['test']['recalculo'], 1)
+
+    def test_sirve_obsoleto_mientras_otro_recalcula(self):
+        """Test: Tras invalidar, si otro worker tiene el lease se sirve el valor anterior"""
+        obtener_o_calcular('clave', self.calcular, metrica='test')
+        generacion = incrementar_generacion()
+
+        # Otro worker ya está recalculando
+        cache.add('clave:lease', 1, timeout=DURACION_LEASE, version=generacion)
+
+        self.assertEqual(obtener_o_calcular('clave', self.calcular, metrica='test'), 'valor 1')
+        self.assertEqual(self.llamadas, 1)
+        self.assertEqual(obtener_metricas(['test'])['test']['obsoleto_servido'], 1)
+
+    def test_recalcula_tras_invalidar(self):
+        """Test: Sin nadie recalculando, la invalidación produce un valor nuevo"""
+        obtener_o_calcular('clave', self.calcular, metrica='test')
+        incrementar_generacion()
+
+        self.assertEqual(obtener_o_calcular('clave', self.calcular, metrica='test'), 'valor 2')
+        self.assertEqual(obtener_metricas(['test'])['test']['recalculo'], 2)
+
+    def test_error_libera_el_lease(self):
+        """Test: Si el cálculo falla el lease se libera y el siguiente puede recalcular"""
+        def fallar():
+            raise RuntimeError('BD caída')
+
+        with self.assertRaises(RuntimeError):
+            obtener_o_calcular('clave', fallar, metrica='test')
+        self.assertEqual(obtener_o_calcular('clave', self.calcular, metrica='test'), 'valor 1')
+
+
+class PrimeraImagenQueriesTest(TestCase):
+    """Tests para evitar el N+1 al resolver la imagen principal"""
+
+    def setUp(self):
+        cache.clear()
+        self.asociacion = crear_asociacion()
+
+    def crear_animales_con_imagenes(self, cantidad):
+        for i in range(cantidad):
+            animal = crear_animal(self.asociacion, nombre=f'Animal {i}')
+            ImagenAnimal.objects.create(animal=animal, imagen=f'https://img/{i}-a.jpg', orden=0)
+            ImagenAnimal.objects.create(animal=animal, imagen=f'https://img/{i}-b.jpg', orden=1, es_principal=True)
+
+    def test_prefiere_imagen_principal(self):
+        """Test: get_primera_imagen() devuelve la marcada como principal aunque no sea la primera"""
+        self.crear_animales_con_imagenes(1)
+        animal = CreacionAnimales.objects.get()
+        self.assertEqual(animal.get_primera_imagen(), 'https://img/0-b.jpg')
+
+    def test_sin_imagenes_usa_campo_legacy(self):
+        """Test: Sin ImagenAnimal se usa el campo legacy 'imagen'"""
+        animal = crear_animal(self.asociacion, imagen='https://legacy/foto.jpg')
+        self.assertEqual(animal.get_primera_imagen(), 'https://legacy/foto.jpg')
+
+    def test_prefetch_sin_queries_adicionales(self):
+        """Test: Con prefetch_related('imagenes') no se hace ninguna query por animal"""
+        self.crear_animales_con_imagenes(3)
+        animales = list(CreacionAnimales.objects.prefetch_related('imagenes'))
+        with self.assertNumQueries(0):
+            for animal in animales:
+                animal.get_primera_imagen()
+
+    def test_listado_con_queries_constantes(self):
+        """Test: Serializar una página del feed cuesta lo mismo con 2 que con 20 animales"""
+        self.crear_animales_con_imagenes(2)
+        # count + índice de facetas (uno por generación de cache) + animales (con asociación) + imágenes
+        with self.assertNumQueries(4):
+            _calcular_pagina_feed({}, None, 24)
+
+        self.crear_animales_con_imagenes(18)
+        cache.clear()
+        with self.assertNumQueries(4):
+            _calcular_pagina_feed({}, None, 24)
+
+    def test_vista_animal_queries_constantes(self):
+        """Test: La ficha del animal no hace una query por cada imagen o video"""
+        self.crear_animales_con_imagenes(1)
+        animal = CreacionAnimales.objects.get()
+        for orden in range(3):
+            VideoAnimal.objects.create(animal=animal, video=f'https://vid/{orden}.mp4', orden=orden)
+
+        # animal (con asociación) + imágenes + videos
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('vista_animal', args=[animal.id]))
+        self.assertEqual(response.status_code, 200)
+
+
+class BusquedaFacetadaTest(TestCase):
+    """Tests para el motor de búsqueda facetada del buscador avanzado"""
+
+    def setUp(self):
+        cache.clear()
+        self.asociacion = crear_asociacion()
+        self.url = reverse('api_buscador')
+        crear_animal(self.asociacion, nombre='Rex', tipo_de_animal='Perro', raza='Labrador', provincia='Madrid', color='Negro')
+        crear_animal(self.asociacion, nombre='Luna', tipo_de_animal='Perro', raza='Beagle', provincia='Sevilla', color='Negro')
+        crear_animal(self.asociacion, nombre='Misi', tipo_de_animal='Gato', raza='Siamés', provincia='Madrid', color='Blanco')
+        crear_animal(self.asociacion, nombre='Piolín', tipo_de_animal='Canario', raza='Canario', provincia='Madrid', color='Amarillo')
+        crear_animal(self.asociacion, nombre='Adoptado', tipo_de_animal='Perro', adoptado=True)
+
+    def test_facetas_ignoran_su_propio_filtro(self):
+        """Test: Con provincia=Madrid la faceta provincia sigue mostrando las demás provincias"""
+        data = self.client.get(self.url, {'categoria': 'perro', 'provincia': 'Madrid'}).json()
+
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['facetas']['provincia'], {'Madrid': 1, 'Sevilla': 1})
+        self.assertEqual(data['facetas']['raza'], {'Labrador': 1})
+        self.assertEqual(data['facetas']['categoria'], {'perro': 1, 'gato': 1, 'otros': 1})
+
+    def test_excluye_adoptados(self):
+        """Test: Los animales adoptados no aparecen en el buscador"""
+        data = self.client.get(self.url, {'categoria': 'perro'}).json()
+        self.assertEqual(sorted(animal['nombre'] for animal in data['animales']), ['Luna', 'Rex'])
+
+    def test_paginacion(self):
+        """Test: Las páginas recorren todos los resultados sin repetir"""
+        primera = self.client.get(self.url, {'por_pagina': 3}).json()
+        segunda = self.client.get(self.url, {'por_pagina': 3, 'pagina': 2}).json()
+
+        self.assertEqual(primera['total'], 4)
+        self.assertEqual(primera['paginas'], 2)
+        nombres = [animal['nombre'] for animal in primera['animales'] + segunda['animales']]
+        self.assertEqual(len(nombres), 4)
+        self.assertEqual(len(set(nombres)), 4)
+
+    def test_pagina_no_incrusta_catalogo(self):
+        """Test: La página del buscador solo incrusta la búsqueda inicial (categoría otros)"""
+        response = self.client.get(reverse('buscador_avanzado'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Canario')
+        self.assertNotContains(response, 'Rex')
+
+
+class IndiceBusquedaTest(TestCase):
+    """Tests para el índice de texto de resultados_busqueda"""
+
+    def setUp(self):
+        cache.clear()
+        self.asociacion = crear_asociacion()
+        self.url = reverse('resultados_busqueda')
+        crear_animal(self.asociacion, nombre='Piolín', tipo_de_animal='Pájaro', raza='Canario',
+                     color='Amarillo', provincia='Málaga')
+        crear_animal(self.asociacion, nombre='Rex', tipo_de_animal='Perro', raza='Labrador',
+                     descripcion='Muy cariñoso, le encanta jugar con pájaros')
+        crear_animal(self.asociacion, nombre='Luna', tipo_de_animal='Gato', raza='Siamés')
+
+    def nombres(self, response):
+        return [animal.nombre for animal in response.context['animales']]
+
+    def test_normalizar_y_tokenizar(self):
+        """Test: Los tokens no llevan tildes, mayúsculas ni palabras vacías"""
+        self.assertEqual(tokenizar('El Pájaro de Ñandú'), ['pajaro', 'nandu'])
+
+    def test_busqueda_sin_tildes(self):
+        """Test: 'pajaro' encuentra 'Pájaro' y el nombre pesa más que la descripción"""
+        response = self.client.get(self.url, {'q': 'pajaro'})
+        self.assertEqual(self.nombres(response), ['Piolín', 'Rex'])
+
+    def test_filtros_por_campo_y_prefijo(self):
+        """Test: Los filtros del buscador avanzado se restringen a su campo y admiten prefijos"""
+        self.assertEqual(self.nombres(self.client.get(self.url, {'raza': 'labra'})), ['Rex'])
+        self.assertEqual(self.nombres(self.client.get(self.url, {'ubicacion': 'malaga'})), ['Piolín'])
+        self.assertEqual(self.nombres(self.client.get(self.url, {'tipo': 'Otros'})), ['Piolín'])
+
+    def test_todos_los_terminos_deben_coincidir(self):
+        """Test: Varios términos se combinan con AND"""
+        response = self.client.get(self.url, {'q': 'rex siames'})
+        self.assertEqual(response.context['total_resultados'], 0)
+
+    def test_editar_animal_reindexa(self):
+        """Test: Al guardar un animal su índice se actualiza"""
+        animal = CreacionAnimales.objects.get(nombre='Luna')
+        animal.raza = 'Persa'
+        animal.save()
+
+        self.assertEqual(self.nombres(self.client.get(self.url, {'raza': 'persa'})), ['Luna'])
+        self.assertEqual(self.nombres(self.client.get(self.url, {'raza': 'siames'})), [])
+
+
+class PlanConsultasTest(TestCase):
+    """
+    Tests de regresión de planes de consulta: ejecuta EXPLAIN sobre las
+    consultas que lanzan las vistas públicas y falla si alguna recorre
+    entera una de las tablas grandes (scan secuencial).
+    """
+
+    TABLAS_VIGILADAS = ('Animales', 'asociaciones', 'imagenes_animales', 'tokens_busqueda_animales')
+
+    def setUp(self):
+        cache.clear()
+        self.asociacion = crear_asociacion()
+        crear_asociacion(nombre='Protectora Pendiente', estado='pendiente')
+        for i in range(3):
+            animal = crear_animal(self.asociacion, nombre=f'Animal {i}')
+            ImagenAnimal.objects.create(animal=animal, imagen=f'https://img/{i}.jpg', es_principal=True)
+        self.animal = animal
+
+    def explicar(self, sql):
+        """Devuelve el plan de ejecución de una consulta como texto"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Con tablas diminutas PostgreSQL prefiere siempre el seq scan
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+                return '\n'.join(' '.join(str(col) for col in fila) for fila in cursor.fetchall())
+            finally:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('RESET enable_seqscan')
+
+    def scans_secuenciales(self, plan):
+        """Tablas vigiladas que el plan recorre enteras"""
+        if connection.vendor == 'postgresql':
+            patron = r'Seq Scan on "?(\w+)"?'
+        else:
+            patron = r'\bSCAN "?(\w+)"?\s*$'
+        return [
+            tabla for tabla in re.findall(patron, plan, re.MULTILINE)
+            if tabla in self.TABLAS_VIGILADAS
+        ]
+
+    def assertSinScansSecuenciales(self, url, params=None):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, params or {})
+            if response.streaming:
+                # Las respuestas en streaming consultan la BD al consumirse
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+
+        selects = [q['sql'] for q in consultas.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            plan = self.explicar(sql)
+            self.assertEqual(self.scans_secuenciales(plan), [], f"Scan secuencial en:\n{sql}\n{plan}")
+
+    def test_inicio_y_feed(self):
+        self.assertSinScansSecuenciales(reverse('inicio'))
+        self.assertSinScansSecuenciales(reverse('api_feed_animales'), {'categoria': 'perro', 'limite': 2})
+
+    def test_buscadores(self):
+        self.assertSinScansSecuenciales(reverse('api_buscador'), {'categoria': 'perro'})
+        self.assertSinScansSecuenciales(reverse('resultados_busqueda'), {'q': 'animal'})
+
+    def test_ficha_favoritos_y_sitemap(self):
+        self.assertSinScansSecuenciales(reverse('vista_animal', args=[self.animal.id]))
+        self.assertSinScansSecuenciales(reverse('mis_favoritos'))
+        self.assertSinScansSecuenciales(reverse('sitemap_xml'))
+        self.assertSinScansSecuenciales(reverse('sitemap_parte_xml', args=[1]))
+
+
+class VisibilidadAnimalesTest(TestCase):
+    """Tests para la columna desnormalizada CreacionAnimales.visible"""
+
+    def setUp(self):
+        cache.clear()
+        self.asociacion = crear_asociacion()
+        # bulk_create no lanza signals: no queda ninguna invalidación pendiente
+        self.animal = CreacionAnimales.objects.bulk_create([CreacionAnimales(
+            asociacion=self.asociacion, nombre='Kira', tipo_de_animal='Gato', raza='Mestizo',
+            email='animal@test.com', telefono='600000000', poblacion='Madrid',
+            provincia='Madrid', codigo_postal='28001', descripcion='Prueba',
+        )])[0]
+
+    def visible(self):
+        return CreacionAnimales.objects.values_list('visible', flat=True).get(pk=self.animal.pk)
+
+    def test_visibilidad_al_crear(self):
+        """Test: Un animal nuevo hereda la visibilidad del estado de su asociación"""
+        pendiente = crear_asociacion(nombre='Protectora Pendiente', estado='pendiente')
+        self.assertTrue(crear_animal(self.asociacion).visible)
+        self.assertFalse(crear_animal(pendiente).visible)
+
+    def test_cambios_de_estado_propagan_visibilidad(self):
+        """Test: Suspender mantiene visible; eliminar oculta; reactivar vuelve a mostrar"""
+        asociacion = RegistroAsociacion.objects.get(pk=self.asociacion.pk)
+
+        asociacion.estado = 'suspendida'
+        asociacion.save()
+        self.assertTrue(self.visible())
+
+        asociacion.estado = 'eliminada'
+        asociacion.save()
+        self.assertFalse(self.visible())
+        self.assertEqual(self.client.get(reverse('api_feed_animales')).json()['total'], 0)
+
+        asociacion.estado = 'activa'
+        asociacion.save()
+        self.assertTrue(self.visible())
+
+    def test_cambio_de_estado_invalida_cache(self):
+        """Test: Ocultar animales invalida el cache de animales"""
+        generacion = obtener_generacion()
+        asociacion = RegistroAsociacion.objects.get(pk=self.asociacion.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            asociacion.rechazar(motivo='Prueba')
+
+        self.assertFalse(self.visible())
+        self.assertGreater(obtener_generacion(), generacion)
+
+
+class AlmacenLocalMixin:
+    """MEDIA_STORAGE_BACKEND local en un directorio temporal"""
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajustes = self.settings(MEDIA_ROOT=directorio, MEDIA_STORAGE_BACKEND='myapp.media_storage.LocalMediaStorage')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.media_root = directorio
+
+
+@override_settings(MEDIA_UPLOAD_BACKGROUND=False)
+class SubidaMediosTest(AlmacenLocalMixin, TestCase):
+    """Tests para la subida de imágenes/videos en segundo plano"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.asociacion = crear_asociacion()
+        self.animal = crear_animal(self.asociacion)
+
+    def archivo(self, nombre):
+        if nombre.endswith('.jpg'):
+            return SimpleUploadedFile(nombre, imagen_jpeg(), content_type='image/jpeg')
+        return SimpleUploadedFile(nombre, b'contenido', content_type='application/octet-stream')
+
+    def test_subidas_crean_filas_y_campos_legacy(self):
+        """Test: Cada archivo subido crea su fila y la tarea termina como completada"""
+        with self.captureOnCommitCallbacks(execute=True):
+            tarea_id = encolar_subidas(
+                self.animal,
+                imagenes=[self.archivo('a.jpg'), self.archivo('b.jpg')],
+                videos=[self.archivo('c.mp4')],
+                primera_principal=True,
+            )
+
+        self.animal.refresh_from_db()
+        primera = self.animal.imagenes.get(orden=0)
+        video = self.animal.videos.get()
+        self.assertEqual(self.animal.imagen, primera.imagen)
+        self.assertEqual(self.animal.video, video.video)
+        self.assertEqual(
+            list(self.animal.imagenes.values_list('orden', 'es_principal')),
+            [(0, True), (1, False)]
+        )
+        self.assertEqual(self.animal.get_miniatura(), primera.miniatura)
+        self.assertTrue(primera.clave.startswith('fotos/') and primera.clave_miniatura.startswith('miniaturas/'))
+        self.assertTrue(video.clave.startswith('videos/'))
+        # Se sube el WebP generado, no el JPEG original
+        with Image.open(os.path.join(self.media_root, 'animales', primera.clave)) as subida:
+            self.assertEqual(subida.format, 'WEBP')
+
+        self.client.cookies['asociacion_id'] = str(self.asociacion.id)
+        data = self.client.get(reverse('estado_subida_medios', args=[tarea_id])).json()
+        self.assertEqual(data['estado'], 'completada')
+        self.assertEqual((data['total'], data['completadas'], data['fallidas']), (3, 3, 0))
+        self.assertEqual(data['bytes_subidos'], data['bytes_total'])
+        self.assertEqual([archivo['estado'] for archivo in data['archivos']], ['completado'] * 3)
+
+    @patch('myapp.cache_animales._invalidacion_ya_programada', return_value=False)
+    def test_una_invalidacion_por_tarea(self, _):
+        """Test: Una tarea con varios archivos invalida el cache de animales una sola vez"""
+        with patch('myapp.cache_animales.incrementar_generacion') as incrementar, \
+                self.captureOnCommitCallbacks(execute=True):
+            encolar_subidas(
+                self.animal,
+                imagenes=[self.archivo('a.jpg'), self.archivo('b.jpg')],
+                videos=[self.archivo('c.mp4')],
+            )
+
+        self.assertEqual(self.animal.imagenes.count(), 2)
+        self.assertEqual(incrementar.call_count, 1)
+
+    @patch('myapp.subida_medios.obtener_storage')
+    def test_progreso_de_un_video_por_trozos(self, obtener_storage):
+        """Test: Los bytes que va subiendo el storage quedan en el estado de la tarea"""
+        video = SimpleUploadedFile('c.mp4', b'x' * (3 * 1024 * 1024), content_type='video/mp4')
+        progresos = []
+
+        def subir_video(fichero, carpeta, tipo, progreso):
+            progreso(1024 * 1024)
+            progresos.append(obtener_estado_subida(tarea_id)['archivos'][0].copy())
+            return ArchivoSubido('https://vid/1.mp4', 'videos/1')
+
+        obtener_storage.return_value.subir.side_effect = subir_video
+        with patch('myapp.subida_medios.transaction.on_commit') as on_commit:
+            tarea_id = encolar_subidas(self.animal, videos=[video])
+        on_commit.call_args.args[0]()
+
+        self.assertEqual((progresos[0]['subidos'], progresos[0]['estado']), (1024 * 1024, 'subiendo'))
+        archivo = obtener_estado_subida(tarea_id)['archivos'][0]
+        self.assertEqual((archivo['subidos'], archivo['estado']), (3 * 1024 * 1024, 'completado'))
+
+    @patch.object(LocalMediaStorage, 'subir', return_value=None)
+    def test_subida_fallida(self, subir):
+        """Test: Un fallo del almacén se cuenta y no crea ninguna fila"""
+        with self.captureOnCommitCallbacks(execute=True):
+            tarea_id = encolar_subidas(self.animal, imagenes=[self.archivo('a.jpg')])
+
+        self.assertFalse(self.animal.imagenes.exists())
+        self.assertEqual(obtener_estado_subida(tarea_id)['estado'], 'completada_con_errores')
+
+    @patch.object(LocalMediaStorage, 'subir')
+    def test_imagen_no_valida_no_se_sube(self, subir):
+        """Test: Un archivo que no es una imagen cuenta como fallido sin llegar al almacén"""
+        falso = SimpleUploadedFile('a.png', b'no soy una imagen', content_type='image/png')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tarea_id = encolar_subidas(self.animal, imagenes=[falso])
+
+        subir.assert_not_called()
+        self.assertEqual(obtener_estado_subida(tarea_id)['fallidas'], 1)
+
+    def test_borrar_animal_borra_sus_archivos_por_lotes(self):
+        """Test: Eliminar un animal borra todas sus imágenes, miniaturas y videos con una llamada por tipo"""
+        with self.captureOnCommitCallbacks(execute=True):
+            encolar_subidas(
+                self.animal,
+                imagenes=[self.archivo('a.jpg'), self.archivo('b.jpg')],
+                videos=[self.archivo('c.mp4')],
+            )
+        sesion = self.client.session
+        sesion['esta_logueado'] = True
+        sesion.save()
+        self.client.cookies['asociacion_id'] = str(self.asociacion.id)
+
+        with patch.object(LocalMediaStorage, 'borrar', autospec=True, side_effect=LocalMediaStorage.borrar) as borrar, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('eliminar_animal', args=[self.animal.id]))
+
+        self.assertEqual([(llamada.args[2], len(llamada.args[1])) for llamada in borrar.call_args_list],
+                         [('imagen', 4), ('video', 1)])
+        restantes = [fichero for _, _, ficheros in os.walk(self.media_root) for fichero in ficheros]
+        self.assertEqual(restantes, [])
+
+    def test_estado_solo_para_la_asociacion_propietaria(self):
+        """Test: Otra asociación no puede consultar la tarea"""
+        with patch('myapp.subida_medios.transaction.on_commit'):
+            tarea_id = encolar_subidas(self.animal, imagenes=[self.archivo('a.jpg')])
+
+        url = reverse('estado_subida_medios', args=[tarea_id])
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.cookies['asociacion_id'] = str(self.asociacion.id)
+        self.assertEqual(self.client.get(url).json()['estado'], 'en_curso')
+
+    def test_borrado_fallido_no_borra_archivos(self):
+        """Test: Si el borrado del animal falla, sus archivos siguen en el almacén"""
+        with self.captureOnCommitCallbacks(execute=True):
+            encolar_subidas(self.animal, imagenes=[self.archivo('a.jpg')])
+        sesion = self.client.session
+        sesion['esta_logueado'] = True
+        sesion.save()
+        self.client.cookies['asociacion_id'] = str(self.asociacion.id)
+
+        with patch.object(CreacionAnimales, 'delete', side_effect=DatabaseError('fallo')), \
+                patch.object(LocalMediaStorage, 'borrar') as borrar, \
+                self.captureOnCommitCallbacks(execute=True), self.assertRaises(DatabaseError):
+            self.client.post(reverse('eliminar_animal', args=[self.animal.id]))
+
+        borrar.assert_not_called()
+
+
+@override_settings(IMAGEN_LADO_MAXIMO=200, IMAGEN_LADO_MINIATURA=50, IMAGEN_MAX_PIXELES=1_000_000)
+class DerivadosImagenTest(SimpleTestCase):
+    """Tests para la imagen y miniatura WebP generadas antes de subir"""
+
+    def test_reduce_y_quita_exif(self):
+        """Test: La imagen se limita a IMAGEN_LADO_MAXIMO, en WebP y sin EXIF"""
+        derivados = generar_derivados(BytesIO(imagen_jpeg(800, 400, gps=True)))
+
+        imagen = Image.open(derivados['imagen'])
+        self.assertEqual(imagen.format, 'WEBP')
+        self.assertEqual(imagen.size, (200, 100))
+        self.assertNotIn('exif', imagen.info)
+        self.assertEqual(Image.open(derivados['miniatura']).size, (50, 50))
+
+    def test_aplica_orientacion_exif(self):
+        """Test: Una foto girada por EXIF (orientacion 6) sale vertical"""
+        derivados = generar_derivados(BytesIO(imagen_jpeg(160, 80, orientacion=6)))
+
+        self.assertEqual((derivados['ancho'], derivados['alto']), (80, 160))
+
+    def test_rechaza_imagenes_demasiado_grandes(self):
+        """Test: Una imagen por encima de IMAGEN_MAX_PIXELES no se decodifica"""
+        salida = BytesIO()
+        Image.new('1', (2000, 2000)).save(salida, 'PNG')
+        salida.seek(0)
+
+        with patch.object(Image.Image, 'load') as load, self.assertRaises(ImagenNoValida):
+            generar_derivados(salida)
+        load.assert_not_called()
+
+
+class SubidaVideoPorTrozosTest(SimpleTestCase):
+    """Tests para la subida de videos a Cloudinary por trozos"""
+
+    @patch('cloudinary.uploader.upload_large_part')
+    def test_sube_por_trozos_e_informa_del_progreso(self, upload_large_part):
+        """Test: Cada trozo es una petición y el progreso avanza trozo a trozo"""
+        upload_large_part.return_value = {'public_id': 'animales/videos/x', 'secure_url': 'https://vid/x.mp4'}
+        tamano = TAMANO_TROZO_VIDEO + 1000
+        progresos = []
+
+        archivo = CloudinaryStorage().subir(BytesIO(b'v' * tamano), 'videos', 'video', progreso=progresos.append)
+
+        self.assertEqual(archivo, ArchivoSubido('https://vid/x.mp4', 'animales/videos/x'))
+        self.assertEqual(upload_large_part.call_count, 2)
+        self.assertEqual(progresos, [TAMANO_TROZO_VIDEO, tamano])
+
+
+class MediosHuerfanosTest(AlmacenLocalMixin, TestCase):
+    """Tests para la limpieza de archivos huérfanos del almacén"""
+
+    def setUp(self):
+        super().setUp()
+        self.storage = LocalMediaStorage()
+        self.animal = crear_animal(crear_asociacion())
+
+    def subir(self, carpeta, horas=48):
+        archivo = self.storage.subir(BytesIO(b'x' * 100), carpeta)
+        antes = (timezone.now() - timedelta(hours=horas)).timestamp()
+        os.utime(self.storage.storage.path(archivo.clave), (antes, antes))
+        return archivo
+
+    def test_borra_solo_los_huerfanos_antiguos(self):
+        """Test: Se borran los archivos sin fila y se respetan los usados y los recientes"""
+        foto, miniatura = self.subir('fotos'), self.subir('miniaturas')
+        ImagenAnimal.objects.create(
+            animal=self.animal, imagen=foto.url, clave=foto.clave,
+            miniatura=miniatura.url, clave_miniatura=miniatura.clave,
+        )
+        # Fila anterior a la columna clave: se reconoce por la URL
+        video = self.subir('videos')
+        VideoAnimal.objects.create(animal=self.animal, video=video.url)
+        huerfano = self.subir('fotos')
+        reciente = self.subir('fotos', horas=1)
+
+        salida = StringIO()
+        call_command('limpiar_medios_huerfanos', stdout=salida)
+        self.assertIn('1 archivos huérfanos', salida.getvalue())
+        self.assertTrue(self.storage.storage.exists(huerfano.clave))
+
+        # Sin confirmar el almacén no se borra nada
+        with self.assertRaises(CommandError):
+            call_command('limpiar_medios_huerfanos', '--borrar', stdout=StringIO())
+        self.assertTrue(self.storage.storage.exists(huerfano.clave))
+
+        call_command('limpiar_medios_huerfanos', '--borrar', '--confirmar', 'local', stdout=StringIO())
+        existen = {archivo.clave: self.storage.storage.exists(archivo.clave)
+                   for archivo in (foto, miniatura, video, huerfano, reciente)}
+        self.assertEqual([clave for clave, existe in existen.items() if not existe], [huerfano.clave])
+
+
+class BorradoCloudinaryTest(SimpleTestCase):
+    """Tests para el borrado por lotes y las claves de Cloudinary"""
+
+    @patch('cloudinary.api.delete_resources')
+    def test_borra_en_lotes_de_cien(self, delete_resources):
+        """Test: 150 archivos se borran con dos llamadas a la Admin API"""
+        delete_resources.side_effect = lambda ids, **kwargs: {'deleted': {i: 'deleted' for i in ids}}
+        claves = [f'animales/fotos/{i}' for i in range(150)]
+
+        borrados = CloudinaryStorage().borrar(claves, 'imagen')
+
+        self.assertEqual(borrados, 150)
+        self.assertEqual([len(llamada.args[0]) for llamada in delete_resources.call_args_list], [100, 50])
+        self.assertEqual(delete_resources.call_args.kwargs['resource_type'], 'image')
+
+    @patch('cloudinary.api.resources')
+    def test_listar_sigue_el_cursor(self, resources):
+        """Test: listar() devuelve una página por cada next_cursor"""
+        recurso = {'public_id': 'animales/fotos/a', 'created_at': '2024-01-01T00:00:00Z', 'bytes': 10}
+        resources.side_effect = [
+            {'resources': [recurso], 'next_cursor': 'c1'},
+            {'resources': [dict(recurso, public_id='animales/fotos/b')]},
+        ]
+
+        paginas = list(CloudinaryStorage().listar('fotos'))
+
+        self.assertEqual([[archivo.clave for archivo in pagina] for pagina in paginas],
+                         [['animales/fotos/a'], ['animales/fotos/b']])
+        self.assertEqual(resources.call_args.kwargs['next_cursor'], 'c1')
+        self.assertIsNotNone(paginas[0][0].fecha.tzinfo)
+
+    def test_clave_desde_url(self):
+        """Test: La clave ignora transformaciones, versión y extensión"""
+        storage = CloudinaryStorage()
+        self.assertEqual(
+            storage.clave_desde_url('https://res.cloudinary.com/demo/image/upload/c_limit,w_480/v1712/animales/fotos/abc.webp'),
+            'animales/fotos/abc'
+        )
+        self.assertIsNone(storage.clave_desde_url('https://otro.example/x.jpg'))
+
+
+@override_settings(MEDIA_SUBIDA_DIRECTA=True)
+class SubidaDirectaTest(TestCase):
+    """Tests para la subida directa del navegador a Cloudinary"""
+
+    def setUp(self):
+        cache.clear()
+        self.asociacion = crear_asociacion()
+        self.animal = crear_animal(self.asociacion)
+        sesion = self.client.session
+        sesion['esta_logueado'] = True
+        sesion.save()
+        self.client.cookies['asociacion_id'] = str(self.asociacion.id)
+
+        simulado = patch('myapp.subida_directa.cloudinary_storage')
+        self.storage = simulado.start()
+        self.addCleanup(simulado.stop)
+        ids = iter(range(1, 100))
+        self.storage.firmar_subida.side_effect = lambda folder, **kwargs: {
+            'public_id': f'{folder}/{next(ids)}', 'url': 'https://api.cloudinary.com/upload', 'campos': {},
+        }
+        self.storage.verificar_subida.return_value = True
+        self.storage.url_miniatura.return_value = 'https://img/mini.webp'
+
+    def post(self, nombre, datos):
+        return self.client.post(reverse(nombre), json.dumps(datos), content_type='application/json')
+
+    def recurso(self, public_id, bytes=1000, format='jpg'):
+        return {'public_id': public_id, 'version': 1, 'secure_url': f'https://img/{public_id}.{format}',
+                'bytes': bytes, 'format': format}
+
+    def test_firmar_y_registrar(self):
+        """Test: Una subida firmada y verificada crea la imagen principal con su miniatura"""
+        firmas = self.post('firmar_subida_medios', {'animal_id': self.animal.id, 'tipo': 'imagen', 'cantidad': 2}).json()['firmas']
+        self.storage.obtener_recurso.side_effect = lambda public_id, **kwargs: self.recurso(public_id)
+
+        data = self.post('registrar_subida_medios', {'animal_id': self.animal.id, 'subidas': [
+            {'public_id': firma['public_id'], 'version': 1, 'signature': 'x'} for firma in firmas
+        ]}).json()
+
+        self.assertTrue(data['success'])
+        self.assertEqual(
+            list(self.animal.imagenes.values_list('orden', 'es_principal', 'miniatura')),
+            [(0, True, 'https://img/mini.webp'), (1, False, 'https://img/mini.webp')]
+        )
+        self.animal.refresh_from_db()
+        self.assertEqual(self.animal.imagen, 'https://img/animales/fotos/1.jpg')
+
+    def test_rechaza_subidas_no_firmadas_o_demasiado_grandes(self):
+        """Test: Un public_id ajeno no se registra y un archivo grande se borra de Cloudinary"""
+        firma = self.post('firmar_subida_medios', {'animal_id': self.animal.id, 'tipo': 'video'}).json()['firmas'][0]
+        self.storage.obtener_recurso.return_value = self.recurso(firma['public_id'], bytes=50 * 1024 * 1024, format='mp4')
+
+        data = self.post('registrar_subida_medios', {'animal_id': self.animal.id, 'subidas': [
+            {'public_id': 'animales/videos/ajeno', 'version': 1, 'signature': 'x'},
+            {'public_id': firma['public_id'], 'version': 1, 'signature': 'x'},
+        ]}).json()
+
+        self.assertEqual(data['rechazadas'], ['animales/videos/ajeno', firma['public_id']])
+        self.storage.borrar.assert_called_once_with([firma['public_id']], 'video')
+        self.assertFalse(self.animal.videos.exists())
+
+    def test_limites_y_permisos(self):
+        """Test: No se firman más archivos del máximo ni para animales de otra asociación"""
+        otro = crear_animal(crear_asociacion(nombre='Otra'))
+
+        response = self.post('firmar_subida_medios', {'animal_id': self.animal.id, 'tipo': 'imagen', 'cantidad': 11})
+        self.assertEqual(response.status_code, 400)
+        response = self.post('firmar_subida_medios', {'animal_id': otro.id, 'tipo': 'imagen'})
+        self.assertEqual(response.status_code, 403)
+        self.storage.firmar_subida.assert_not_called()
+
+    def test_firmas_pendientes_y_registro_cuentan_para_el_maximo(self):
+        """Test: No se pueden acumular firmas ni registrar más archivos del máximo"""
+        firmas = self.post('firmar_subida_medios', {'animal_id': self.animal.id, 'tipo': 'imagen', 'cantidad': 6}).json()['firmas']
+        # Las 6 firmas sin registrar ocupan sitio
+        response = self.post('firmar_subida_medios', {'animal_id': self.animal.id, 'tipo': 'imagen', 'cantidad': 6})
+        self.assertEqual(response.status_code, 400)
+
+        # Mientras tanto el animal se llena por otra vía
+        for orden in range(MAX_IMAGENES - 1):
+            ImagenAnimal.objects.create(animal=self.animal, imagen=f'https://img/{orden}.jpg', orden=orden)
+        self.storage.obtener_recurso.side_effect = lambda public_id, **kwargs: self.recurso(public_id)
+        data = self.post('registrar_subida_medios', {'animal_id': self.animal.id, 'subidas': [
+            {'public_id': firma['public_id'], 'version': 1, 'signature': 'x'} for firma in firmas[:2]
+        ]}).json()
+
+        self.assertEqual(data['registradas'], [firmas[0]['public_id']])
+        self.assertEqual(data['rechazadas'], [firmas[1]['public_id']])
+        self.storage.borrar.assert_called_once_with([firmas[1]['public_id']], 'imagen')
+        self.assertEqual(self.animal.imagenes.count(), MAX_IMAGENES)
+
+    def test_firma_reclamada_por_otra_peticion(self):
+        """Test: Si otra petición borra la firma entre la lectura y el borrado, esta no registra"""
+        firma = self.post('firmar_subida_medios', {'animal_id': self.animal.id, 'tipo': 'imagen'}).json()['firmas'][0]
+        self.storage.obtener_recurso.side_effect = lambda public_id, **kwargs: self.recurso(public_id)
+        subida = {'public_id': firma['public_id'], 'version': 1, 'signature': 'x'}
+
+        with patch.object(caches['compartida'], 'delete', return_value=False):
+            data = self.post('registrar_subida_medios', {'animal_id': self.animal.id, 'subidas': [subida]}).json()
+        self.assertEqual(data['rechazadas'], [firma['public_id']])
+        self.storage.obtener_recurso.assert_not_called()
+
+        data = self.post('registrar_subida_medios', {'animal_id': self.animal.id, 'subidas': [subida, subida]}).json()
+        self.assertEqual(data['registradas'], [firma['public_id']])
+        self.assertEqual(data['rechazadas'], [firma['public_id']])
+        self.assertEqual(self.animal.imagenes.count(), 1)
+
+    @override_settings(MEDIA_SUBIDA_DIRECTA=False)
+    def test_desactivada_por_defecto(self):
+        """Test: Sin MEDIA_SUBIDA_DIRECTA las APIs no existen"""
+        for nombre in ('firmar_subida_medios', 'registrar_subida_medios'):
+            self.assertEqual(self.post(nombre, {'animal_id': self.animal.id, 'tipo': 'imagen'}).status_code, 404)
+        self.storage.firmar_subida.assert_not_called()
+
+    def test_solo_con_el_almacen_de_cloudinary(self):
+        """Test: Django no arranca con subida directa y otro almacén de medios"""
+        self.assertEqual(comprobar_subida_directa(None), [])
+        with override_settings(MEDIA_STORAGE_BACKEND='myapp.backblaze_storage.BackblazeStorage'):
+            self.assertEqual([error.id for error in comprobar_subida_directa(None)], ['myapp.E001'])
+
+
+class NotificacionesTest(TestCase):
+    """Tests para la cola persistente de emails y mensajes de Telegram"""
+
+    def test_clave_de_idempotencia(self):
+        """Test: Encolar dos veces el mismo evento no duplica la notificación"""
+        encolar_email('Asunto', 'Texto', ['a@test.com'], clave='email:prueba:1')
+        encolar_email('Asunto', 'Texto', ['a@test.com'], clave='email:prueba:1')
+        self.assertEqual(NotificacionSaliente.objects.count(), 1)
+
+    def test_worker_envia_emails(self):
+        """Test: El email se envía al procesar la cola, no al encolarlo"""
+        encolar_email('Asunto', 'Texto', ['a@test.com'], html='<p>Texto</p>')
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(procesar_pendientes(), {'enviadas': 1, 'errores': 0})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['a@test.com'])
+        self.assertEqual(NotificacionSaliente.objects.get().estado, 'enviada')
+
+    @patch('myapp.telegram_utils.enviar_mensaje_telegram', return_value=False)
+    def test_reintentos_con_backoff_y_dead_letter(self, enviar_mensaje):
+        """Test: Un fallo se reintenta más tarde y al agotar los intentos queda como fallida"""
+        notificacion = encolar('telegram', {'mensaje': 'Hola'}, max_intentos=2)
+
+        self.assertEqual(procesar_pendientes(), {'enviadas': 0, 'errores': 1})
+        notificacion.refresh_from_db()
+        self.assertEqual((notificacion.estado, notificacion.intentos), ('pendiente', 1))
+        self.assertGreater(notificacion.ejecutar_despues, timezone.now())
+        # Todavía no toca reintentarla
+        self.assertEqual(reclamar(), [])
+
+        NotificacionSaliente.objects.update(ejecutar_despues=timezone.now())
+        procesar_pendientes()
+        notificacion.refresh_from_db()
+        self.assertEqual((notificacion.estado, notificacion.intentos), ('fallida', 2))
+        self.assertEqual(enviar_mensaje.call_count, 2)
+
+    def test_reclamar_respeta_el_bloqueo_de_otro_worker(self):
+        """Test: Una notificación en proceso solo se retoma cuando caduca su bloqueo"""
+        notificacion = encolar_telegram('Hola')
+        self.assertEqual(len(reclamar()), 1)
+        self.assertEqual(reclamar(), [])
+
+        NotificacionSaliente.objects.update(bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([n.id for n in reclamar()], [notificacion.id])
+
+    def test_enviar_email_de_vista_se_encola(self):
+        """Test: Las funciones enviar_email_* ya no hablan con SMTP"""
+        from .views import enviar_email_registro_pendiente
+
+        asociacion = crear_asociacion(estado='pendiente')
+        enviar_email_registro_pendiente(asociacion)
+        enviar_email_registro_pendiente(asociacion)
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            list(NotificacionSaliente.objects.values_list('clave_idempotencia', flat=True)),
+            [f'email:registro_pendiente:{asociacion.id}']
+        )
+
+
+class _ServidorBotFalso(ThreadingHTTPServer):
+    """API de bots de Telegram falsa: registra las llamadas y devuelve respuestas programadas"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _ManejadorBotFalso)
+        self.llamadas = []
+        self.conexiones = set()
+        self.respuestas = []
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class _ManejadorBotFalso(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_POST(self):
+        datos = json.loads(self.rfile.read(int(self.headers['Content-Length'])) or b'{}')
+        self.server.llamadas.append((self.path.rsplit('/', 1)[-1], datos))
+        self.server.conexiones.add(self.client_address)
+
+        codigo, cuerpo = (
+            self.server.respuestas.pop(0) if self.server.respuestas
+            else (200, {'ok': True, 'result': {'message_id': len(self.server.llamadas)}})
+        )
+        contenido = json.dumps(cuerpo).encode()
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+
+    def log_message(self, *args):
+        pass
+
+
+class TelegramClientTest(SimpleTestCase):
+    """Tests del cliente de Telegram contra un servidor local falso"""
+
+    def setUp(self):
+        self.servidor = _ServidorBotFalso()
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.esperas = []
+        self.cliente = TelegramClient(
+            'TOKEN', api_url=self.servidor.url, dormir=self.esperas.append,
+            limitador=LimitadorEnvios(1000, 0),
+        )
+
+    def tearDown(self):
+        self.cliente.close()
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def test_reutiliza_la_conexion(self):
+        """Test: Varias llamadas viajan por la misma conexion keep-alive"""
+        resultados = self.cliente.enviar_lote(
+            [{'chat_id': 1, 'texto': f'Mensaje {i}'} for i in range(5)]
+        )
+
+        self.assertEqual([r['message_id'] for r in resultados], [1, 2, 3, 4, 5])
+        self.assertEqual(len(self.servidor.conexiones), 1)
+        self.assertEqual(self.servidor.llamadas[0], ('sendMessage', {'chat_id': 1, 'text': 'Mensaje 0'}))
+
+    def test_reintenta_429_con_retry_after(self):
+        """Test: Un 429 se reintenta tras esperar los segundos de retry_after"""
+        self.servidor.respuestas.append((429, {
+            'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 7',
+            'parameters': {'retry_after': 7},
+        }))
+
+        resultado = self.cliente.enviar_mensaje(1, 'Hola', botones=[[{'text': 'Ok', 'callback_data': 'ok'}]])
+
+        self.assertEqual(resultado, {'message_id': 2})
+        self.assertEqual(self.esperas, [7])
+        self.assertEqual(
+            self.servidor.llamadas[1][1]['reply_markup'],
+            {'inline_keyboard': [[{'text': 'Ok', 'callback_data': 'ok'}]]},
+        )
+
+    def test_lote_no_se_corta_si_un_mensaje_falla(self):
+        """Test: Un 400 no se reintenta y el resto del lote se envia igualmente"""
+        self.servidor.respuestas.append((400, {
+            'ok': False, 'error_code': 400, 'description': 'Bad Request: chat not found',
+        }))
+
+        resultados = self.cliente.enviar_lote([
+            {'chat_id': 1, 'texto': 'Falla'},
+            {'chat_id': 2, 'texto': 'Llega'},
+        ])
+
+        self.assertIsInstance(resultados[0], ErrorTelegram)
+        self.assertEqual(resultados[0].codigo, 400)
+        self.assertEqual(resultados[1], {'message_id': 2})
+        self.assertEqual(self.esperas, [])
+
+    def test_limitador_espacia_mensajes_al_mismo_chat(self):
+        """Test: Dos mensajes al mismo chat esperan el intervalo; a otro chat no"""
+        reloj = [100.0]
+        esperas = []
+        limitador = LimitadorEnvios(1000, 1.0, reloj=lambda: reloj[0], dormir=esperas.append)
+
+        limitador.esperar_turno(1)
+        limitador.esperar_turno(2)
+        limitador.esperar_turno(1)
+
+        self.assertEqual(len(esperas), 2)
+        self.assertAlmostEqual(esperas[0], 0.001)
+        self.assertAlmostEqual(esperas[1], 1.0)
+
+
+class WebhookTelegramTest(TestCase):
+    """Tests del webhook de Telegram con procesamiento diferido"""
+
+    def enviar_update(self, update):
+        return self.client.post(
+            reverse('telegram_webhook'), data=json.dumps(update), content_type='application/json'
+        )
+
+    def update_mensaje(self, update_id, chat_id, texto):
+        return {'update_id': update_id, 'message': {'chat': {'id': chat_id}, 'text': texto}}
+
+    def test_responde_sin_procesar(self):
+        """Test: El webhook guarda el update y responde sin llamar a los manejadores"""
+        with patch('myapp.telegram_utils.procesar_update') as procesar_update:
+            response = self.enviar_update(self.update_mensaje(1, 10, '/ayuda'))
+        self.assertEqual(response.status_code, 200)
+        procesar_update.assert_not_called()
+        self.assertEqual(UpdateTelegram.objects.get().estado, 'pendiente')
+
+    def test_update_duplicado_se_ignora(self):
+        """Test: Si Telegram reenvía un update_id no se guarda dos veces"""
+        self.assertEqual(self.enviar_update(self.update_mensaje(1, 10, 'hola')).json()['status'], 'queued')
+        self.assertEqual(self.enviar_update(self.update_mensaje(1, 10, 'hola')).json()['status'], 'duplicate')
+        self.assertEqual(UpdateTelegram.objects.get().chat_id, 10)
+
+    def test_update_sin_update_id(self):
+        """Test: Un cuerpo que no es un update se rechaza"""
+        self.assertEqual(self.enviar_update({'message': {}}).status_code, 400)
+        self.assertFalse(UpdateTelegram.objects.exists())
+
+    @patch('myapp.telegram_utils.enviar_mensaje_telegram', return_value=True)
+    def test_worker_procesa_en_orden_por_chat(self, enviar_mensaje):
+        """Test: Solo se reclama un update por chat y siempre el más antiguo"""
+        for update_id, chat_id in [(1, 10), (2, 10), (3, 20)]:
+            self.enviar_update(self.update_mensaje(update_id, chat_id, '/ayuda'))
+
+        self.assertEqual([u.update_id for u in reclamar_updates()], [1, 3])
+        # Con el 1 en proceso, el 2 (mismo chat) tiene que esperar
+        self.assertEqual(reclamar_updates(), [])
+
+        UpdateTelegram.objects.filter(update_id__in=[1, 3]).update(estado='procesado')
+        self.assertEqual(procesar_updates_pendientes(), {'procesados': 1, 'errores': 0})
+        self.assertEqual(UpdateTelegram.objects.get(update_id=2).estado, 'procesado')
+        enviar_mensaje.assert_called_once()
+
+
+class EstadosConversacionTest(TestCase):
+    """Tests del almacén de estados de las conversaciones del bot"""
+
+    def comprobar_almacen(self, almacen):
+        self.assertIsNone(almacen.obtener(10))
+        self.assertTrue(almacen.guardar(10, 'esperando_nombre', {}))
+
+        estado = almacen.obtener(10)
+        self.assertEqual((estado['estado'], estado['datos']), ('esperando_nombre', {}))
+
+        # Compare-and-set: la segunda escritura con la misma versión pierde
+        self.assertTrue(almacen.guardar(10, 'esperando_email', {'nombre': 'A'}, version=estado['version']))
+        self.assertFalse(almacen.guardar(10, 'esperando_email', {'nombre': 'B'}, version=estado['version']))
+        self.assertEqual(almacen.obtener(10)['datos'], {'nombre': 'A'})
+
+        almacen.limpiar(10)
+        self.assertIsNone(almacen.obtener(10))
+
+    def test_almacen_bd(self):
+        """Test: Guardar, compare-and-set y limpiar en la BD"""
+        self.comprobar_almacen(AlmacenEstadosBD(ttl=60))
+
+    def test_almacen_cache(self):
+        """Test: Guardar, compare-and-set y limpiar en la cache compartida"""
+        caches['compartida'].clear()
+        self.comprobar_almacen(AlmacenEstadosCache(ttl=60))
+
+    def test_estado_caducado(self):
+        """Test: Un estado caducado no se devuelve y el comando lo borra"""
+        almacen = AlmacenEstadosBD(ttl=60)
+        almacen.guardar(10, 'esperando_nombre', {})
+        almacen.guardar(20, 'esperando_nombre', {})
+        EstadoConversacion.objects.filter(chat_id=10).update(expira=timezone.now() - timedelta(seconds=1))
+
+        self.assertIsNone(almacen.obtener(10))
+        call_command('limpiar_estados_conversacion', stdout=StringIO())
+        self.assertEqual(list(EstadoConversacion.objects.values_list('chat_id', flat=True)), [20])
+
+    @patch('myapp.telegram_utils.enviar_mensaje_telegram', return_value=True)
+    def test_mensaje_repetido_no_avanza_dos_pasos(self, enviar_mensaje):
+        """Test: Si dos procesos leen el mismo paso, solo uno lo aplica"""
+        from .telegram_utils import guardar_estado_conversacion, obtener_estado_conversacion, procesar_paso_registro
+
+        guardar_estado_conversacion(10, 'esperando_nombre', {})
+        leido = obtener_estado_conversacion(10)
+        procesar_paso_registro(10, 'Protectora Nueva')
+
+        self.assertFalse(guardar_estado_conversacion(10, 'esperando_email', {}, version=leido['version']))
+        estado = obtener_estado_conversacion(10)
+        self.assertEqual((estado['estado'], estado['datos']), ('esperando_email', {'nombre': 'Protectora Nueva'}))
+
+
+class TelegramPollTest(TestCase):
+    """Tests del comando telegram_poll contra el servidor falso de la API"""
+
+    def setUp(self):
+        self.servidor = _ServidorBotFalso()
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def poll(self):
+        with override_settings(TELEGRAM_API_URL=self.servidor.url):
+            call_command('telegram_poll', '--una-vez', '--hilos', '1', stdout=StringIO())
+
+    @patch('myapp.telegram_utils.enviar_mensaje_telegram', return_value=True)
+    def test_procesa_updates_y_avanza_el_offset(self, enviar_mensaje):
+        """Test: Los updates recibidos pasan por el despacho del webhook y el offset avanza"""
+        self.servidor.respuestas.append((200, {'ok': True, 'result': [
+            {'update_id': 7, 'message': {'chat': {'id': 10}, 'text': '/ayuda'}},
+            {'update_id': 8, 'message': {'chat': {'id': 20}, 'text': '/ayuda'}},
+        ]}))
+        self.poll()
+
+        self.assertEqual(self.servidor.llamadas[0][0], 'getUpdates')
+        self.assertNotIn('offset', self.servidor.llamadas[0][1])
+        self.assertEqual(
+            list(UpdateTelegram.objects.values_list('update_id', 'estado')),
+            [(7, 'procesado'), (8, 'procesado')],
+        )
+        self.assertEqual(enviar_mensaje.call_count, 2)
+
+        # La siguiente ejecución continúa tras el último update guardado
+        self.servidor.respuestas.append((200, {'ok': True, 'result': []}))
+        self.poll()
+        self.assertEqual(self.servidor.llamadas[1][1]['offset'], 9)
+
+    def test_webhook_activo(self):
+        """Test: Con un webhook configurado (409) el comando pide --eliminar-webhook"""
+        self.servidor.respuestas.append((409, {
+            'ok': False, 'error_code': 409,
+            'description': "Conflict: can't use getUpdates method while webhook is active",
+        }))
+        with self.assertRaisesMessage(CommandError, '--eliminar-webhook'):
+            self.poll()
+
+
+class EstadisticasDiariasTest(TestCase):
+    """Tests de la tabla de estadísticas diarias"""
+
+    def setUp(self):
+        self.hoy = timezone.localdate()
+        self.ayer = self.hoy - timedelta(days=1)
+        self.asociacion = crear_asociacion(provincia='Madrid')
+        RegistroAsociacion.objects.filter(pk=self.asociacion.pk).update(
+            fecha_registro=timezone.now() - timedelta(days=1),
+            fecha_aprobacion=timezone.now() - timedelta(days=1),
+        )
+        perro = crear_animal(self.asociacion, nombre='Toby', tipo_de_animal='Perro', provincia='Madrid')
+        gato = crear_animal(self.asociacion, nombre='Misi', tipo_de_animal='Gato', provincia='Madrid')
+        gato.adoptado = True
+        gato.save()
+        CreacionAnimales.objects.filter(pk__in=[perro.pk, gato.pk]).update(
+            fecha_creacion=timezone.now() - timedelta(days=1),
+            fecha_adopcion=timezone.now() - timedelta(days=1),
+        )
+        CreacionAnimales.objects.filter(pk=perro.pk).update(fecha_adopcion=None)
+
+    def test_fecha_adopcion(self):
+        """Test: Marcar y desmarcar como adoptado actualiza fecha_adopcion"""
+        animal = crear_animal(self.asociacion, nombre='Rex')
+        animal.adoptado = True
+        animal.save(update_fields=['adoptado'])
+        animal.refresh_from_db()
+        self.assertIsNotNone(animal.fecha_adopcion)
+
+        animal.adoptado = False
+        animal.save()
+        animal.refresh_from_db()
+        self.assertIsNone(animal.fecha_adopcion)
+
+    def test_actualizacion_incremental(self):
+        """Test: Solo se calculan los días que faltan (y los últimos se recalculan)"""
+        self.assertEqual(actualizar_estadisticas(hasta=self.ayer), 1)
+        self.assertEqual(resumen(self.ayer, self.ayer), {
+            'nuevas_asociaciones': 1, 'asociaciones_aprobadas': 1, 'nuevos_animales': 2, 'adopciones': 1,
+        })
+        self.assertEqual(
+            [(f['tipo_de_animal'], f['nuevos_animales']) for f in ranking('tipo_de_animal', self.ayer, self.ayer)],
+            [('Gato', 1), ('Perro', 1)],
+        )
+
+        # Hoy no hay actividad, pero el día queda marcado como calculado
+        self.assertEqual(actualizar_estadisticas(hasta=self.hoy), DIAS_RECALCULO)
+        self.assertEqual(EstadisticaDiaria.objects.filter(fecha=self.hoy).count(), 1)
+        self.assertEqual(resumen(self.hoy, self.hoy)['nuevos_animales'], 0)
+
+    @patch('myapp.telegram_utils.encolar_notificacion_telegram', return_value=True)
+    def test_resumen_diario_lee_la_tabla(self, encolar):
+        """Test: El resumen de Telegram sale de la tabla de estadísticas"""
+        from .telegram_utils import enviar_estadisticas_diarias
+
+        with CaptureQueriesContext(connection) as consultas:
+            enviar_estadisticas_diarias()
+        self.assertIn('Nuevos animales: 2', encolar.call_args[0][0])
+        self.assertIn('Adopciones: 1', encolar.call_args[0][0])
+
+        # Solo rangos de fechas indexables, ningún __date sobre las columnas
+        for consulta in consultas.captured_queries:
+            self.assertNotIn('cast_date', consulta['sql'].lower())
+            self.assertNotIn('::date', consulta['sql'].lower())
+
+    def test_panel_muestra_actividad(self):
+        """Test: El panel de administración muestra la actividad precalculada"""
+        actualizar_estadisticas(hasta=self.ayer)
+        session = self.client.session
+        session['admin_authenticated'] = True
+        session.save()
+
+        response = self.client.get(reverse('panel_administracion'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['actividad']['totales']['adopciones'], 1)
+        self.assertContains(response, 'Provincias más activas')
+
+
+class PanelAdministracionTest(TestCase):
+    """Tests de los contadores y las listas paginadas del panel de administración"""
+
+    def setUp(self):
+        caches['compartida'].delete(CLAVE_CONTADORES)
+        session = self.client.session
+        session['admin_authenticated'] = True
+        session.save()
+
+    def test_contadores_cacheados_e_invalidados(self):
+        """Test: Los contadores salen de una consulta cacheada que se invalida al cambiar de estado"""
+        with self.captureOnCommitCallbacks(execute=True):
+            asociacion = crear_asociacion('Protectora Uno', estado='pendiente')
+            crear_asociacion('Protectora Dos')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(contar_por_estado(), {'pendiente': 1, 'activa': 1, 'suspendida': 0, 'rechazada': 0})
+        with self.assertNumQueries(0):
+            contar_por_estado()
+
+        # Guardar sin cambiar de estado no invalida
+        with self.captureOnCommitCallbacks(execute=True):
+            asociacion.telefono = '611111111'
+            asociacion.save()
+        self.assertIsNotNone(caches['compartida'].get(CLAVE_CONTADORES))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            asociacion.estado = 'activa'
+            asociacion.save()
+        self.assertEqual(contar_por_estado()['activa'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            asociacion.delete()
+        self.assertEqual(contar_por_estado()['activa'], 1)
+
+    def test_panel_consultas_constantes(self):
+        """Test: El número de consultas del panel no depende de las asociaciones"""
+        for i in range(3):
+            asociacion = crear_asociacion(f'Protectora {i}')
+            crear_animal(asociacion, nombre=f'Animal {i}')
+
+        with CaptureQueriesContext(connection) as antes:
+            response = self.client.get(reverse('panel_administracion'))
+        self.assertContains(response, 'Protectora 2')
+
+        for i in range(3, 6):
+            crear_asociacion(f'Protectora {i}', estado='suspendida')
+        caches['compartida'].delete(CLAVE_CONTADORES)
+        with CaptureQueriesContext(connection) as despues:
+            response = self.client.get(reverse('panel_administracion'))
+        self.assertEqual(len(despues), len(antes))
+        self.assertEqual(response.context['stats']['total_count'], 6)
+
+    def test_api_paginas_siguientes(self):
+        """Test: La API devuelve las filas de la página pedida"""
+        for i in range(3):
+            crear_asociacion(f'Protectora {i}', estado='rechazada')
+        self.assertTrue(listar_asociaciones('rechazada', por_pagina=2)['tiene_siguiente'])
+
+        with patch('myapp.views.listar_asociaciones', lambda estado, pagina: listar_asociaciones(estado, pagina, por_pagina=2)):
+            datos = self.client.get(reverse('api_asociaciones_admin'), {'estado': 'rechazada', 'pagina': 2}).json()
+        self.assertTrue(datos['success'])
+        self.assertFalse(datos['tiene_siguiente'])
+        self.assertIn('Protectora 0', datos['html'])
+        self.assertNotIn('Protectora 2', datos['html'])
+
+        response = self.client.get(reverse('api_asociaciones_admin'), {'estado': 'borrada'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SitemapTest(TestCase):
+    """Tests del índice de sitemaps y sus partes"""
+
+    def setUp(self):
+        cache.clear()
+        self.asociacion = crear_asociacion()
+        # bulk_create no lanza signals: no queda ninguna invalidación pendiente
+        self.animales = CreacionAnimales.objects.bulk_create([CreacionAnimales(
+            asociacion=self.asociacion, nombre=f'Animal {i}', tipo_de_animal='Perro', raza='Mestizo',
+            email='animal@test.com', telefono='600000000', poblacion='Madrid',
+            provincia='Madrid', codigo_postal='28001', descripcion='Prueba', visible=True,
+        ) for i in range(5)])
+
+    def contenido(self, response):
+        return b''.join(response.streaming_content if response.streaming else [response.content]).decode()
+
+    @patch.object(sitemap, 'URLS_POR_SITEMAP', 4)
+    def test_indice_y_partes(self):
+        """Test: El índice enlaza partes de URLS_POR_SITEMAP URLs como máximo"""
+        indice = self.client.get(reverse('sitemap_xml')).content.decode()
+        # 3 páginas fijas + 5 animales = 8 URLs
+        self.assertIn('/sitemap-2.xml', indice)
+        self.assertNotIn('/sitemap-3.xml', indice)
+
+        partes = [self.contenido(self.client.get(reverse('sitemap_parte_xml', args=[n]))) for n in (1, 2)]
+        self.assertEqual([parte.count('<url>') for parte in partes], [4, 4])
+        self.assertEqual(''.join(partes).count('/ver_animal/'), 5)
+        self.assertEqual(self.client.get(reverse('sitemap_parte_xml', args=[3])).status_code, 404)
+
+    def test_cache_y_revalidacion(self):
+        """Test: La parte se sirve de cache, admite 304 y se invalida al cambiar un animal"""
+        url = reverse('sitemap_parte_xml', args=[1])
+        primera = self.client.get(url)
+        self.assertTrue(primera.streaming)
+        self.assertIn('/ver_animal/', self.contenido(primera))
+        etag = primera['ETag']
+        self.assertTrue(primera.has_header('Last-Modified'))
+
+        with self.assertNumQueries(0):
+            segunda = self.client.get(url)
+        self.assertFalse(segunda.streaming)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.animales[0].adoptado = True
+            self.animales[0].save()
+        tercera = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(tercera.status_code, 200)
+        self.assertNotIn(f'/ver_animal/{self.animales[0].id}/', self.contenido(tercera))
+
+
+class PoblarAnimalesOfflineTest(TestCase):
+    """Tests del modo --offline de poblar_animales"""
+
+    def poblar(self, **opciones):
+        call_command('poblar_animales', offline=True, stdout=StringIO(), **opciones)
+
+    def test_datos_sinteticos(self):
+        """Test: Crea asociaciones, animales, imágenes e índice en lotes"""
+        with CaptureQueriesContext(connection) as consultas:
+            self.poblar(count=50, asociaciones=5, lote=20)
+        # Inserciones por lotes, no por fila
+        self.assertLess(len(consultas), 40)
+
+        self.assertEqual(RegistroAsociacion.objects.count(), 5)
+        self.assertEqual(CreacionAnimales.objects.count(), 50)
+        self.assertEqual(ImagenAnimal.objects.filter(es_principal=True).count(), 50)
+        self.assertTrue(TokenBusquedaAnimal.objects.exists())
+
+        # Lo que haría save(): visibilidad según la asociación y fecha de adopción
+        for animal in CreacionAnimales.objects.select_related('asociacion'):
+            self.assertEqual(animal.visible, animal.asociacion.estado in ('activa', 'suspendida'))
+            self.assertEqual(animal.adoptado, animal.fecha_adopcion is not None)
+        self.assertGreater(CreacionAnimales.objects.dates('fecha_creacion', 'day').count(), 1)
+
+    def test_misma_semilla_mismos_datos(self):
+        """Test: La misma semilla genera los mismos datos (nombres, fechas y tokens) aunque la BD no esté vacía"""
+        campos_asociacion = ('nombre', 'email', 'estado', 'fecha_registro', 'token_gestion')
+        campos_animal = ('nombre', 'tipo_de_animal', 'raza', 'descripcion', 'adoptado', 'fecha_creacion', 'fecha_adopcion')
+
+        def datos():
+            return (
+                list(RegistroAsociacion.objects.order_by('id').values_list(*campos_asociacion)),
+                list(CreacionAnimales.objects.order_by('id').values_list(*campos_animal)),
+            )
+
+        self.poblar(count=10, asociaciones=2)
+        primeros = datos()
+        CreacionAnimales.objects.all().delete()
+        RegistroAsociacion.objects.all().delete()
+        crear_asociacion('Ya existente')
+        self.poblar(count=10, asociaciones=2)
+        RegistroAsociacion.objects.filter(nombre='Ya existente').delete()
+
+        self.assertEqual(primeros, datos())
+        # Volver a cargar la misma semilla chocaría con los nombres únicos
+        with self.assertRaises(CommandError):
+            self.poblar(count=10, asociaciones=2)
+
+
+class BenchmarkTest(TestCase):
+    """Tests de las mediciones del benchmark"""
+
+    def test_percentil(self):
+        self.assertEqual(benchmark.percentil([4, 1, 3, 2, 5], 50), 3)
+        self.assertAlmostEqual(benchmark.percentil([1, 2, 3, 4, 5], 95), 4.8)
+        self.assertEqual(benchmark.percentil([], 50), 0.0)
+
+    def test_escenarios_en_proceso(self):
+        """Test: Todos los escenarios responden sin errores sobre datos sintéticos"""
+        # crear_animal necesita una asociación activa con sesión
+        crear_asociacion('Protectora Benchmark')
+        call_command('poblar_animales', offline=True, count=30, asociaciones=3, stdout=StringIO())
+        contexto = benchmark.preparar_contexto()
+
+        for nombre in benchmark.ESCENARIOS:
+            resultado = benchmark.medir_escenario(nombre, contexto, repeticiones=2, calentamiento=1)
+            self.assertEqual(resultado['errores'], 0, nombre)
+            self.assertEqual(resultado['peticiones'], 2)
+            self.assertGreater(resultado['bytes'], 0, nombre)
+            self.assertIn('consultas', resultado)
+        self.assertTrue(CreacionAnimales.objects.filter(nombre__startswith='Benchmark').exists())
+
+
+class BenchmarkCachesTest(TransactionTestCase):
+    """El benchmark en proceso no toca las caches configuradas"""
+
+    @patch('myapp.management.commands.benchmark.teardown_test_environment')
+    @patch('myapp.management.commands.benchmark.setup_test_environment')
+    def test_no_cambia_la_generacion_real(self, *_):
+        """Test: Sembrar y crear animales no invalida la cache real"""
+        crear_asociacion('Protectora Benchmark')
+        # on_commit se ejecuta al momento: sin aislar, la generación subiría
+        generacion = obtener_generacion()
+        cache.set('clave_real', 'valor')
+
+        # La BD temporal del comando es la del propio test
+        with patch.object(connection.creation, 'create_test_db'), \
+                patch.object(connection.creation, 'destroy_test_db'):
+            call_command(
+                'benchmark', '--animales', '20', '--escenarios', 'inicio', 'crear_animal',
+                '--repeticiones', '1', stdout=StringIO(),
+            )
+
+        self.assertTrue(CreacionAnimales.objects.filter(nombre__startswith='Benchmark').exists())
+        self.assertEqual(obtener_generacion(), generacion)
+        self.assertEqual(cache.get('clave_real'), 'valor')
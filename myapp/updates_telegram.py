@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# myapp/updates_telegram.py
+"""
+Cola de updates del bot de Telegram
+
+telegram_webhook ya no procesa el update dentro de la peticion (escrituras
+en la BD, emails, varias llamadas a la API de Telegram...). Si tardaba,
+Telegram daba el envio por fallido y lo repetia, y el mismo boton se
+procesaba dos veces. Ahora:
+
+1. El webhook valida el update, lo guarda en UpdateTelegram y responde 200.
+   update_id es unico, asi que un reenvio de Telegram se descarta.
+2. El comando procesar_updates_telegram los procesa con procesar_update()
+   (el mismo despacho de siempre), en orden de update_id dentro de cada chat:
+   solo se reclama el update mas antiguo pendiente de un chat y nunca si
+   ese chat tiene otro update en proceso.
+
+Sin URL publica (local, staging) el comando telegram_poll sustituye al
+webhook: recibe los updates con getUpdates y los pasa por esta misma cola.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils import timezone
+
+from .models import UpdateTelegram
+
+logger = logging.getLogger(__name__)
+
+# Tiempo que un update queda reservado para el worker que lo procesa
+DURACION_BLOQUEO = 120
+
+# Un update que ha tumbado al worker tantas veces no se vuelve a intentar
+MAX_INTENTOS = 3
+
+LOTE_POR_DEFECTO = 20
+
+# Los updates procesados se borran pasados estos dias
+DIAS_CONSERVACION = 7
+
+
+def extraer_chat_id(datos):
+    """Chat al que pertenece un update (None si no tiene)"""
+    for clave in ('message', 'edited_message', 'channel_post'):
+        if clave in datos:
+            return (datos[clave].get('chat') or {}).get('id')
+    if 'callback_query' in datos:
+        return ((datos['callback_query'].get('message') or {}).get('chat') or {}).get('id')
+    return None
+
+
+def guardar_update(datos):
+    """
+    Guarda un update para procesarlo despues.
+
+    Returns:
+        bool: True si es nuevo, False si ya se habia recibido (reenvio)
+    """
+    try:
+        with transaction.atomic():
+            UpdateTelegram.objects.create(
+                update_id=datos['update_id'],
+                chat_id=extraer_chat_id(datos),
+                datos=datos,
+            )
+    except IntegrityError:
+        logger.info(f"Update {datos['update_id']} duplicado, se ignora")
+        return False
+    return True
+
+
+# ==================== WORKER ====================
+
+def _reclamables(ahora):
+    """Updates que se pueden reclamar sin romper el orden de su chat"""
+    disponible = Q(estado='pendiente') | Q(estado='en_proceso', bloqueado_hasta__lt=ahora)
+    # Del mismo chat: uno anterior sin terminar o uno en proceso por otro worker
+    anterior = UpdateTelegram.objects.filter(
+        chat_id=OuterRef('chat_id'),
+        update_id__lt=OuterRef('update_id'),
+        estado__in=('pendiente', 'en_proceso'),
+    )
+    ocupado = UpdateTelegram.objects.filter(
+        chat_id=OuterRef('chat_id'),
+        estado='en_proceso',
+        bloqueado_hasta__gte=ahora,
+    ).exclude(pk=OuterRef('pk'))
+    return (
+        UpdateTelegram.objects
+        .filter(disponible)
+        .filter(Q(chat_id__isnull=True) | (~Exists(anterior) & ~Exists(ocupado)))
+    )
+
+
+def reclamar(lote=LOTE_POR_DEFECTO):
+    """Reserva hasta `lote` updates (como mucho uno por chat) y los devuelve"""
+    ahora = timezone.now()
+    candidatos = list(
+        _reclamables(ahora).order_by('update_id').values_list('id', flat=True)[:lote]
+    )
+
+    reclamados = []
+    for update_pk in candidatos:
+        # Si otro worker lo reclamo entre medias, el UPDATE no toca ninguna fila
+        if _reclamables(ahora).filter(pk=update_pk).update(
+            estado='en_proceso',
+            bloqueado_hasta=ahora + timedelta(seconds=DURACION_BLOQUEO),
+        ):
+            reclamados.append(update_pk)
+
+    return list(UpdateTelegram.objects.filter(pk__in=reclamados).order_by('update_id'))
+
+
+def procesar(update):
+    """Procesa un update ya reclamado y registra el resultado"""
+    from .telegram_utils import procesar_update
+
+    if update.intentos >= MAX_INTENTOS:
+        # Los workers anteriores murieron procesandolo: no insistir
+        update.estado = 'error'
+        update.ultimo_error = f"Abandonado tras {update.intentos} intentos sin terminar"
+        logger.error(f"Update {update.update_id}: {update.ultimo_error}")
+    else:
+        update.intentos += 1
+        update.save(update_fields=['intentos'])
+        try:
+            respuesta = procesar_update(update.datos)
+        except Exception as e:
+            # Los manejadores ya habran enviado mensajes: reintentar podria duplicarlos
+            update.estado = 'error'
+            update.ultimo_error = f"{type(e).__name__}: {e}"[:2000]
+            logger.error(f"Error procesando update {update.update_id}: {update.ultimo_error}", exc_info=True)
+        else:
+            if respuesta.status_code < 500:
+                update.estado = 'procesado'
+                update.ultimo_error = ''
+            else:
+                update.estado = 'error'
+                update.ultimo_error = respuesta.content.decode('utf-8', errors='replace')[:2000]
+
+    update.bloqueado_hasta = None
+    update.fecha_proceso = timezone.now()
+    update.save(update_fields=['estado', 'ultimo_error', 'bloqueado_hasta', 'fecha_proceso'])
+    return update.estado == 'procesado'
+
+
+def _procesar_en_hilo(update):
+    try:
+        return procesar(update)
+    finally:
+        # Cada hilo del executor abre su propia conexion: no dejarla colgada
+        connection.close()
+
+
+def procesar_pendientes(lote=LOTE_POR_DEFECTO, executor=None):
+    """
+    Reclama y procesa un lote de updates.
+
+    Con `executor` (un ThreadPoolExecutor) cada update va a un hilo: como se
+    reclama como mucho uno por chat, los chats se atienden en paralelo sin
+    romper el orden dentro de cada uno.
+
+    Returns:
+        dict: {'procesados': n, 'errores': n} del lote
+    """
+    updates = reclamar(lote)
+    if executor is None:
+        correctos = [procesar(update) for update in updates]
+    else:
+        correctos = list(executor.map(_procesar_en_hilo, updates))
+    return {'procesados': correctos.count(True), 'errores': correctos.count(False)}
+
+
+def ultimo_update_id():
+    """Mayor update_id recibido (para continuar el long polling donde se dejo)"""
+    return UpdateTelegram.objects.aggregate(ultimo=Max('update_id'))['ultimo']
+
+
+def purgar_procesados(dias=DIAS_CONSERVACION):
+    """Borra los updates procesados hace mas de `dias` dias"""
+    limite = timezone.now() - timedelta(days=dias)
+    borrados, _ = UpdateTelegram.objects.filter(estado='procesado', fecha_proceso__lt=limite).delete()
+    return borrados
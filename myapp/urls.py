@@ -11,9 +11,11 @@ urlpatterns = [
     # SEO - robots.txt y sitemap.xml
     path('robots.txt', views.robots_txt, name='robots_txt'),
     path('sitemap.xml', views.sitemap_xml, name='sitemap_xml'),
+    path('sitemap-<int:parte>.xml', views.sitemap_parte_xml, name='sitemap_parte_xml'),
 
     # URLs existentes
     path('', views.Inicio, name='inicio'),
+    path('api/animales/feed/', views.api_feed_animales, name='api_feed_animales'),
     path('registro/', views.registro_asociacion, name='registro_asociacion'),
     path('registro_exitoso/', views.registro_exitoso_view, name='registro_exitoso'),
     path('validar-nombre-asociacion/', views.validar_nombre_asociacion, name='validar_nombre_asociacion'),
@@ -24,6 +26,9 @@ urlpatterns = [
     path('recuperar-password/', views.solicitar_reset_password, name='solicitar_reset_password'),
     path('reset-password/<str:token>/', views.reset_password, name='reset_password'),
     path('crear_animal/', views.crear_animal, name='crear_animal'),
+    path('api/subidas/firmar/', views.firmar_subida_medios, name='firmar_subida_medios'),
+    path('api/subidas/registrar/', views.registrar_subida_medios, name='registrar_subida_medios'),
+    path('api/subidas/<str:tarea_id>/', views.estado_subida_medios, name='estado_subida_medios'),
     path('mis_animales/', views.mis_animales, name='mis_animales'),
     path('ver_animal/<int:animal_id>/', views.ver_animal, name='ver_animal'),
     path('vista_animal/<int:animal_id>/', views.vista_animal, name='vista_animal'),
@@ -33,6 +38,7 @@ urlpatterns = [
     path('mis-favoritos/', views.mis_favoritos, name='mis_favoritos'),
     path('obtener-animales-favoritos/', views.obtener_animales_favoritos, name='obtener_animales_favoritos'),
     path('buscador-avanzado/', views.buscador_avanzado, name='buscador_avanzado'),
+    path('api/buscador/', views.api_buscador, name='api_buscador'),
     path('resultados-busqueda/', views.resultados_busqueda, name='resultados_busqueda'),
     path('acerca/', views.acerca, name='acerca'),
     
@@ -50,6 +56,7 @@ urlpatterns = [
 
     # Panel de administración principal
     path('admin/panel/', views.panel_administracion, name='panel_administracion'),
+    path('admin/api/asociaciones/', views.api_asociaciones_admin, name='api_asociaciones_admin'),
     
     # Acciones de aprobación/rechazo
     path('admin/aprobar/<str:token>/', views.aprobar_asociacion, name='aprobar_asociacion'),
@@ -1,19 +1,24 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.contrib.auth.hashers import check_password, make_password
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.core.mail import send_mail, EmailMultiAlternatives
+from django.core.mail import send_mail
 from django.contrib.auth.decorators import login_required
 from functools import wraps
 from .forms import RegistroAsociacionForm, LoginForm, CreacionAnimalesForm
 from .models import RegistroAsociacion, CreacionAnimales
-from django.http import JsonResponse, HttpResponse, HttpResponseForbidden
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, Http404, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt, csrf_protect
-from django.views.decorators.http import require_POST, require_GET
+from django.views.decorators.http import require_POST, require_GET, condition
 from django.middleware.csrf import get_token
 from django.utils import timezone
 from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import transaction
 import json
+from datetime import timedelta
 from .telegram_utils import (
     enviar_notificacion_nueva_asociacion,
     enviar_notificacion_aprobacion,
@@ -23,7 +28,21 @@ from .telegram_utils import (
     enviar_notificacion_reactivacion,
     enviar_notificacion_eliminacion
 )
-from .cloudinary_storage import cloudinary_storage
+from . import estadisticas, sitemap
+from .panel_admin import ORDEN_POR_ESTADO, contar_por_estado, listar_asociaciones
+from .media_storage import programar_borrado
+from .subida_medios import encolar_subidas, obtener_estado_subida
+from .subida_directa import SubidaNoValida, firmar_subidas, registrar_subidas
+from .notificaciones import encolar_email
+from .busqueda import POR_PAGINA_BUSQUEDA, buscar, limpiar_filtros_busqueda
+from .indice_busqueda import POR_PAGINA_RESULTADOS, buscar_coincidencias, construir_terminos
+from .paginacion import (
+    CursorInvalido,
+    TAMANO_PAGINA_FEED,
+    aplicar_filtros,
+    limpiar_filtros,
+    obtener_pagina_feed,
+)
 
 def session_login_required(view_func):
     """Decorador actualizado que verifica sesión Y estado de la asociación"""
@@ -327,18 +346,14 @@ def enviar_email_reset_password(asociacion, token, request):
     </html>
     """
 
-    try:
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=f"Haz clic en el siguiente enlace para restablecer tu contraseña: {reset_url}",
-            from_email=None,
-            to=[asociacion.email]
-        )
-        email.attach_alternative(mensaje_html, "text/html")
-        email.send(fail_silently=False)
-        print(f"Email de reset de contraseña enviado a: {asociacion.email}")
-    except Exception as e:
-        print(f"Error enviando email de reset de contraseña: {e}")
+    # Se encola: lo envía el worker procesar_notificaciones (con reintentos)
+    encolar_email(
+        asunto=subject,
+        texto=f"Haz clic en el siguiente enlace para restablecer tu contraseña: {reset_url}",
+        destinatarios=[asociacion.email],
+        html=mensaje_html,
+        clave=f"email:reset_password:{asociacion.id}:{token}",
+    )
 
 
 # ==================== VISTAS ADMINISTRATIVAS ====================
@@ -729,18 +744,14 @@ def enviar_email_aprobacion(asociacion):
     </html>
     """
     
-    try:
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=f"Su asociación {asociacion.nombre} ha sido aprobada. Ya puede acceder al sistema.",
-            from_email=None,
-            to=[asociacion.email]
-        )
-        email.attach_alternative(mensaje_html, "text/html")
-        email.send(fail_silently=False)
-        print(f"Email de aprobación enviado a: {asociacion.email}")
-    except Exception as e:
-        print(f"Error enviando email de aprobación: {e}")
+    # Se encola: lo envía el worker procesar_notificaciones (con reintentos)
+    encolar_email(
+        asunto=subject,
+        texto=f"Su asociación {asociacion.nombre} ha sido aprobada. Ya puede acceder al sistema.",
+        destinatarios=[asociacion.email],
+        html=mensaje_html,
+        clave=f"email:aprobacion:{asociacion.id}:{asociacion.fecha_aprobacion.isoformat()}",
+    )
 
 
 def enviar_email_rechazo(asociacion, motivo):
@@ -780,18 +791,14 @@ def enviar_email_rechazo(asociacion, motivo):
     </html>
     """
     
-    try:
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=f"Su solicitud para {asociacion.nombre} no fue aprobada. Motivo: {motivo}",
-            from_email=None,
-            to=[asociacion.email]
-        )
-        email.attach_alternative(mensaje_html, "text/html")
-        email.send(fail_silently=False)
-        print(f"[OK] Email de rechazo enviado a: {asociacion.email}")
-    except Exception as e:
-        print(f"[ERROR] Error enviando email de rechazo: {e}")
+    # Se encola: lo envía el worker procesar_notificaciones (con reintentos)
+    encolar_email(
+        asunto=subject,
+        texto=f"Su solicitud para {asociacion.nombre} no fue aprobada. Motivo: {motivo}",
+        destinatarios=[asociacion.email],
+        html=mensaje_html,
+        clave=f"email:rechazo:{asociacion.id}:{asociacion.token_aprobacion}",
+    )
 
 @csrf_protect
 @admin_login_required
@@ -1532,18 +1539,14 @@ def enviar_email_registro_pendiente(asociacion):
     </html>
     """
     
-    try:
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=f"Su registro para {asociacion.nombre} está en revisión.",
-            from_email=None,
-            to=[asociacion.email]
-        )
-        email.attach_alternative(mensaje_html, "text/html")
-        email.send(fail_silently=False)
-        print(f"[OK] Email de confirmación enviado a: {asociacion.email}")
-    except Exception as e:
-        print(f"[ERROR] Error enviando email de confirmación: {e}")
+    # Se encola: lo envía el worker procesar_notificaciones (con reintentos)
+    encolar_email(
+        asunto=subject,
+        texto=f"Su registro para {asociacion.nombre} está en revisión.",
+        destinatarios=[asociacion.email],
+        html=mensaje_html,
+        clave=f"email:registro_pendiente:{asociacion.id}",
+    )
 
 def enviar_email_admin_nueva_asociacion(asociacion, request):
     """Envía email al admin con la nueva asociación para revisar"""
@@ -1627,18 +1630,14 @@ def enviar_email_admin_nueva_asociacion(asociacion, request):
     </html>
     """
 
-    try:
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=f"Nueva asociación registrada: {asociacion.nombre}. Token: {asociacion.token_aprobacion}",
-            from_email=None,
-            to=['conectamoscorazones@gmail.com']
-        )
-        email.attach_alternative(mensaje_html, "text/html")
-        email.send(fail_silently=False)
-        print(f"[OK] Email de revisión enviado para: {asociacion.nombre}")
-    except Exception as e:
-        print(f"[ERROR] Error enviando email de revisión: {e}")
+    # Se encola: lo envía el worker procesar_notificaciones (con reintentos)
+    encolar_email(
+        asunto=subject,
+        texto=f"Nueva asociación registrada: {asociacion.nombre}. Token: {asociacion.token_aprobacion}",
+        destinatarios=['conectamoscorazones@gmail.com'],
+        html=mensaje_html,
+        clave=f"email:admin_nueva_asociacion:{asociacion.id}",
+    )
 
 def login_view(request):
     """Vista de login actualizada para manejar estados pendientes y rechazados"""
@@ -1736,53 +1735,9 @@ def logout_view(request):
 
 
 def Inicio(request):
-    """Vista de inicio con sistema de caché optimizado"""
-    from django.core.cache import cache
-
-    # Intentar obtener animales del caché (serializados como diccionarios)
-    cache_key = 'inicio_animales_v2'  # Nueva versión del caché con diccionarios
-    animales_data = cache.get(cache_key)
-
-    if animales_data is None:
-        # No está en caché, consultar BD
-        animales_queryset = CreacionAnimales.objects.filter(
-            asociacion__estado__in=['activa', 'suspendida']
-        ).select_related('asociacion').prefetch_related('imagenes')
-
-        # Serializar a diccionarios (más seguro y eficiente que cachear objetos ORM)
-        animales_data = []
-        for animal in animales_queryset:
-            animales_data.append({
-                'id': animal.id,
-                'nombre': animal.nombre,
-                'tipo_de_animal': animal.tipo_de_animal,
-                'raza': animal.raza or '',
-                'color': animal.color or '',
-                'tamano': animal.tamano or '',
-                'email': animal.email,
-                'telefono': animal.telefono,
-                'poblacion': animal.poblacion or '',
-                'provincia': animal.provincia or '',
-                'descripcion': animal.descripcion or '',
-                # Pre-calcular get_primera_imagen() para evitar queries adicionales
-                'primera_imagen': animal.get_primera_imagen(),
-                'asociacion_nombre': animal.asociacion.nombre if animal.asociacion else '',
-            })
-
-        # Guardar diccionarios en caché (más seguro que objetos ORM)
-        cache.set(cache_key, animales_data, timeout=300)
-
-    # Convertir diccionarios a objetos simples para compatibilidad con template
-    # Esto permite usar animal.id en lugar de animal['id'] en el template
-    class AnimalData:
-        def __init__(self, data):
-            for key, value in data.items():
-                setattr(self, key, value)
-
-        def get_primera_imagen(self):
-            return self.primera_imagen
-
-    animales = [AnimalData(data) for data in animales_data]
+    """Vista de inicio: solo renderiza la primera página del feed (paginación por cursor)"""
+    # La primera página se cachea por separado; el resto se pide a api_feed_animales
+    pagina_inicial = obtener_pagina_feed()
 
     # NOTA: El caché se invalida automáticamente cuando:
     # - Se crea un animal nuevo
@@ -1817,15 +1772,16 @@ def Inicio(request):
                 return render(request, 'index.html', {
                     'asociacion': asociacion,
                     'logueado': True,
-                    'animales': animales,
+                    'pagina_inicial': pagina_inicial,
                     'mis_animales': mis_animales,
-                    'login_error': login_error
+                    'login_error': login_error,
+                    'subida_directa': settings.MEDIA_SUBIDA_DIRECTA,
                 })
             else:
                 # Asociación suspendida o eliminada, limpiar sesión
                 response = render(request, 'index.html', {
                     'logueado': False,
-                    'animales': animales,
+                    'pagina_inicial': pagina_inicial,
                     'mis_animales': None,
                     'login_error': login_error
                 })
@@ -1837,12 +1793,31 @@ def Inicio(request):
 
     return render(request, 'index.html', {
         'logueado': False,
-        'animales': animales,
+        'pagina_inicial': pagina_inicial,
         'mis_animales': None,
         'login_error': login_error
     })
 
 
+@require_GET
+def api_feed_animales(request):
+    """API JSON del feed de inicio: devuelve la página siguiente al cursor recibido"""
+    filtros = limpiar_filtros(request.GET)
+    cursor = request.GET.get('cursor') or None
+
+    try:
+        limite = int(request.GET.get('limite', TAMANO_PAGINA_FEED))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Parámetro limite no válido'}, status=400)
+
+    try:
+        pagina = obtener_pagina_feed(filtros, cursor=cursor, limite=limite)
+    except CursorInvalido:
+        return JsonResponse({'success': False, 'error': 'Cursor no válido'}, status=400)
+
+    return JsonResponse({'success': True, **pagina})
+
+
 # Alias para compatibilidad
 def inicio(request):
     """Alias de Inicio para compatibilidad con URLs"""
@@ -1882,58 +1857,25 @@ def crear_animal(request):
             # Guardar el animal primero para poder asociar las imágenes y videos
             animal.save()
 
-            # Variables para almacenar URLs legacy (evitar múltiples saves)
-            primera_imagen_url = None
-            primer_video_url = None
-
-            # SUBIR MÚLTIPLES IMÁGENES A CLOUDINARY
-            imagenes_files = request.FILES.getlist('imagenes')
-            if imagenes_files:
-                from .models import ImagenAnimal
-                for idx, imagen_file in enumerate(imagenes_files[:10]):  # Máximo 10 imágenes
-                    imagen_url = cloudinary_storage.upload_image(imagen_file)
-                    if imagen_url:
-                        ImagenAnimal.objects.create(
-                            animal=animal,
-                            imagen=imagen_url,
-                            orden=idx,
-                            es_principal=(idx == 0)  # Primera imagen es principal
-                        )
-                        # Guardar URL de la primera imagen para el campo legacy
-                        if idx == 0:
-                            primera_imagen_url = imagen_url
-
-            # SUBIR MÚLTIPLES VIDEOS A CLOUDINARY
-            videos_files = request.FILES.getlist('videos')
-            if videos_files:
-                from .models import VideoAnimal
-                for idx, video_file in enumerate(videos_files[:5]):  # Máximo 5 videos
-                    video_url = cloudinary_storage.upload_video(video_file)
-                    if video_url:
-                        VideoAnimal.objects.create(
-                            animal=animal,
-                            video=video_url,
-                            orden=idx
-                        )
-                        # Guardar URL del primer video para el campo legacy
-                        if idx == 0:
-                            primer_video_url = video_url
-
-            # OPTIMIZACIÓN: Una sola llamada a save() para campos legacy
-            # Esto reduce las invalidaciones de caché de 3 a 2 veces
-            if primera_imagen_url or primer_video_url:
-                if primera_imagen_url:
-                    animal.imagen = primera_imagen_url
-                if primer_video_url:
-                    animal.video = primer_video_url
-                animal.save()  # Solo una invalidación adicional
+            # SUBIR IMÁGENES Y VIDEOS A CLOUDINARY EN SEGUNDO PLANO
+            # La primera imagen es la principal; las filas ImagenAnimal/VideoAnimal
+            # y los campos legacy se rellenan a medida que terminan las subidas
+            tarea_subida = encolar_subidas(
+                animal,
+                imagenes=request.FILES.getlist('imagenes'),
+                videos=request.FILES.getlist('videos'),
+                primera_principal=True,
+            )
 
             # OPCIONAL: Notificar nuevos animales por Telegram
             # from .telegram_utils import enviar_notificacion_nuevo_animal
             # enviar_notificacion_nuevo_animal(animal)
 
             if es_ajax:
-                return JsonResponse({'success': True, 'message': 'Animal creado exitosamente'})
+                respuesta = {'success': True, 'message': 'Animal creado exitosamente', 'animal_id': animal.id}
+                if tarea_subida:
+                    respuesta['subida_url'] = reverse('estado_subida_medios', args=[tarea_subida])
+                return JsonResponse(respuesta)
             return redirect('mis_animales')
         else:
             print("Errores del formulario:", form.errors)
@@ -1952,13 +1894,89 @@ def crear_animal(request):
     })
 
 
+@require_GET
+def estado_subida_medios(request, tarea_id):
+    """API JSON con el progreso de las subidas de imágenes/videos de un animal"""
+    estado = obtener_estado_subida(tarea_id)
+    if estado is None:
+        return JsonResponse({'error': 'Tarea no encontrada'}, status=404)
+
+    # Solo la asociación propietaria puede consultar sus subidas
+    if str(estado['asociacion_id']) != request.COOKIES.get('asociacion_id'):
+        return JsonResponse({'error': 'No tienes permisos para consultar esta tarea'}, status=403)
+
+    archivos = estado.get('archivos', [])
+    return JsonResponse({
+        'estado': estado['estado'],
+        'total': estado['total'],
+        'completadas': estado['completadas'],
+        'fallidas': estado['fallidas'],
+        'animal_id': estado['animal_id'],
+        # Progreso en bytes, total y de cada archivo (los videos van por trozos)
+        'bytes_total': sum(archivo['tamano'] for archivo in archivos),
+        'bytes_subidos': sum(archivo['subidos'] for archivo in archivos),
+        'archivos': archivos,
+    })
+
+
+def _animal_de_la_asociacion(request, animal_id):
+    """Animal de la asociación logueada o None (subidas directas)"""
+    return CreacionAnimales.objects.filter(
+        id=animal_id, asociacion_id=request.COOKIES.get('asociacion_id')
+    ).first()
+
+
+@require_POST
+@session_login_required
+def firmar_subida_medios(request):
+    """API JSON: parámetros firmados para subir imágenes/videos directamente a Cloudinary"""
+    if not settings.MEDIA_SUBIDA_DIRECTA:
+        raise Http404("Subida directa desactivada")
+    try:
+        data = json.loads(request.body)
+        animal = _animal_de_la_asociacion(request, int(data.get('animal_id')))
+        cantidad = int(data.get('cantidad', 1))
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Petición no válida'}, status=400)
+
+    if animal is None:
+        return JsonResponse({'error': 'No tienes permisos para subir archivos a este animal'}, status=403)
+
+    try:
+        firmas = firmar_subidas(animal, data.get('tipo'), cantidad)
+    except SubidaNoValida as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'success': True, 'firmas': firmas})
+
+
+@require_POST
+@session_login_required
+def registrar_subida_medios(request):
+    """API JSON: registra las imágenes/videos ya subidos directamente a Cloudinary"""
+    if not settings.MEDIA_SUBIDA_DIRECTA:
+        raise Http404("Subida directa desactivada")
+    try:
+        data = json.loads(request.body)
+        animal = _animal_de_la_asociacion(request, int(data.get('animal_id')))
+        subidas = [subida for subida in data.get('subidas', []) if isinstance(subida, dict)]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Petición no válida'}, status=400)
+
+    if animal is None:
+        return JsonResponse({'error': 'No tienes permisos para subir archivos a este animal'}, status=403)
+
+    resultado = registrar_subidas(animal, subidas)
+    return JsonResponse({'success': not resultado['rechazadas'], **resultado})
+
+
 def vista_animal(request, animal_id):
     """Vista de animal actualizada que verifica estado de la asociación"""
     try:
+        # prefetch: el template recorre y cuenta imágenes/videos varias veces
         animal = get_object_or_404(
-            CreacionAnimales.objects.select_related('asociacion'), 
+            CreacionAnimales.objects.select_related('asociacion').prefetch_related('imagenes', 'videos'),
             id=animal_id,
-            asociacion__estado__in=['activa', 'suspendida']  # Solo mostrar si no está eliminada
+            visible=True  # Solo mostrar si su asociación no está eliminada
         )
         return render(request, 'vista_animal.html', {'animal': animal})
     except:
@@ -1979,7 +1997,9 @@ def mis_animales(request):
         return redirect('login')
     
     asociacion_id = request.COOKIES.get('asociacion_id')
-    mis_animales = CreacionAnimales.objects.filter(asociacion_id=asociacion_id)
+    mis_animales = CreacionAnimales.objects.filter(
+        asociacion_id=asociacion_id
+    ).prefetch_related('imagenes', 'videos')
     
     return render(request, 'mis_animales.html', {
         'mis_animales': mis_animales,
@@ -2029,77 +2049,37 @@ def editar_animal(request, animal_id):
         animal.codigo_postal = request.POST.get('codigo_postal')
         animal.descripcion = request.POST.get('descripcion')
 
-        # MANEJAR ELIMINACIÓN DE IMÁGENES
-        imagenes_a_eliminar = request.POST.getlist('eliminar_imagenes')
-        if imagenes_a_eliminar:
-            from .models import ImagenAnimal
-            for imagen_id in imagenes_a_eliminar:
-                try:
-                    imagen = ImagenAnimal.objects.get(id=imagen_id, animal=animal)
-                    # Eliminar de Cloudinary
-                    if imagen.imagen:
-                        cloudinary_storage.delete_file(imagen.imagen)
-                    imagen.delete()
-                except ImagenAnimal.DoesNotExist:
-                    pass
-
-        # MANEJAR ELIMINACIÓN DE VIDEOS
-        videos_a_eliminar = request.POST.getlist('eliminar_videos')
-        if videos_a_eliminar:
-            from .models import VideoAnimal
-            for video_id in videos_a_eliminar:
-                try:
-                    video = VideoAnimal.objects.get(id=video_id, animal=animal)
-                    # Eliminar de Cloudinary
-                    if video.video:
-                        cloudinary_storage.delete_file(video.video)
-                    video.delete()
-                except VideoAnimal.DoesNotExist:
-                    pass
-
-        # SUBIR NUEVAS IMÁGENES
-        imagenes_files = request.FILES.getlist('imagenes')
-        if imagenes_files:
-            from .models import ImagenAnimal
-            # Obtener el orden máximo actual
-            max_orden = ImagenAnimal.objects.filter(animal=animal).count()
-            for idx, imagen_file in enumerate(imagenes_files[:10]):
-                imagen_url = cloudinary_storage.upload_image(imagen_file)
-                if imagen_url:
-                    ImagenAnimal.objects.create(
-                        animal=animal,
-                        imagen=imagen_url,
-                        orden=max_orden + idx,
-                        es_principal=False
-                    )
-                    # Actualizar la imagen principal si no existe
-                    if not animal.imagen:
-                        animal.imagen = imagen_url
-
-        # SUBIR NUEVOS VIDEOS
-        videos_files = request.FILES.getlist('videos')
-        if videos_files:
-            from .models import VideoAnimal
-            # Obtener el orden máximo actual
-            max_orden = VideoAnimal.objects.filter(animal=animal).count()
-            for idx, video_file in enumerate(videos_files[:5]):
-                video_url = cloudinary_storage.upload_video(video_file)
-                if video_url:
-                    VideoAnimal.objects.create(
-                        animal=animal,
-                        video=video_url,
-                        orden=max_orden + idx
-                    )
-                    # Actualizar el video principal si no existe
-                    if not animal.video:
-                        animal.video = video_url
-
-        animal.save()
+        # MANEJAR ELIMINACIÓN DE IMÁGENES Y VIDEOS
+        # Las filas se borran juntas y los archivos del almacén en una llamada por tipo
+        imagenes_a_eliminar = [i for i in request.POST.getlist('eliminar_imagenes') if i.isdigit()]
+        videos_a_eliminar = [i for i in request.POST.getlist('eliminar_videos') if i.isdigit()]
+
+        # Los archivos se borran del almacén (y las subidas empiezan) solo si
+        # se confirman las filas y el animal
+        with transaction.atomic():
+            if imagenes_a_eliminar or videos_a_eliminar:
+                imagenes = list(animal.imagenes.filter(id__in=imagenes_a_eliminar))
+                videos = list(animal.videos.filter(id__in=videos_a_eliminar))
+                programar_borrado(imagenes=imagenes, videos=videos)
+                animal.imagenes.filter(id__in=[imagen.id for imagen in imagenes]).delete()
+                animal.videos.filter(id__in=[video.id for video in videos]).delete()
+
+            animal.save()
+
+            # SUBIR NUEVAS IMÁGENES Y VIDEOS EN SEGUNDO PLANO (detrás de los existentes)
+            encolar_subidas(
+                animal,
+                imagenes=request.FILES.getlist('imagenes'),
+                videos=request.FILES.getlist('videos'),
+                orden_imagenes=animal.imagenes.count(),
+                orden_videos=animal.videos.count(),
+            )
         return redirect('mis_animales')
     
     return render(request, 'editar_animal.html', {
         'animal': animal,
-        'asociacion': asociacion
+        'asociacion': asociacion,
+        'subida_directa': settings.MEDIA_SUBIDA_DIRECTA,
     })
 
 
@@ -2118,13 +2098,16 @@ def eliminar_animal(request, animal_id):
         return HttpResponseForbidden("No tienes permisos para eliminar este animal")
 
     if request.method == 'POST':
-        # Eliminar archivos de Cloudinary antes de eliminar el animal
-        if animal.imagen:
-            cloudinary_storage.delete_file(animal.imagen)
-        if animal.video:
-            cloudinary_storage.delete_file(animal.video)
-
-        animal.delete()
+        # Eliminar del almacén todas sus imágenes, miniaturas y videos (y los
+        # campos legacy) cuando se confirme el borrado: una llamada por tipo
+        with transaction.atomic():
+            programar_borrado(
+                imagenes=animal.imagenes.all(),
+                videos=animal.videos.all(),
+                urls_imagenes=[animal.imagen],
+                urls_videos=[animal.video],
+            )
+            animal.delete()
         return redirect('mis_animales')
     
     return render(request, 'confirmar_eliminar.html', {
@@ -2162,8 +2145,8 @@ def mis_favoritos(request):
     """Vista de favoritos actualizada que filtra asociaciones eliminadas"""
     # Solo animales de asociaciones activas y suspendidas
     animales = CreacionAnimales.objects.filter(
-        asociacion__estado__in=['activa', 'suspendida']
-    ).select_related('asociacion').order_by('-id')
+        visible=True
+    ).select_related('asociacion').order_by('-fecha_creacion', '-id')
     
     context = {
         'animales': animales,
@@ -2181,7 +2164,7 @@ def obtener_animales_favoritos(request):
             ids_favoritos = data.get('favoritos', [])
             
             # Filtrar animales por los IDs favoritos
-            animales_favoritos = CreacionAnimales.objects.filter(id__in=ids_favoritos)
+            animales_favoritos = CreacionAnimales.objects.filter(id__in=ids_favoritos, visible=True)
             
             # Convertir a lista de diccionarios
             animales_data = []
@@ -2218,104 +2201,83 @@ def obtener_animales_favoritos(request):
 
 def buscador_avanzado(request):
     """
-    Buscador avanzado con sistema de caché optimizado
+    Buscador avanzado: solo envía la primera página y los contadores de facetas.
+    El resto se pide a api_buscador según cambian los filtros.
     """
-    from django.core.cache import cache
-
     try:
-        # Intentar obtener datos del caché (diccionarios serializados)
-        cache_key = 'buscador_animales_v2'  # Nueva versión con diccionarios
-        animales_list = cache.get(cache_key)
-
-        if animales_list is None:
-            # No está en caché, consultar BD
-            animales_queryset = CreacionAnimales.objects.filter(
-                asociacion__estado__in=['activa', 'suspendida'],
-                adoptado=False
-            ).select_related('asociacion').prefetch_related('imagenes')
-
-            # Convertir a diccionarios y cachear (más eficiente que cachear objetos ORM)
-            animales_list = []
-            for animal in animales_queryset:
-                # Determinar categoría del animal
-                tipo_lower = animal.tipo_de_animal.lower()
-                if 'perro' in tipo_lower:
-                    categoria = 'perro'
-                elif 'gato' in tipo_lower:
-                    categoria = 'gato'
-                else:
-                    categoria = 'otros'
-
-                animales_list.append({
-                    'id': animal.id,
-                    'nombre': animal.nombre,
-                    'tipo_de_animal': animal.tipo_de_animal,
-                    'raza': animal.raza or 'Sin especificar',
-                    'color': animal.color or 'Sin especificar',
-                    'provincia': animal.provincia or 'Sin especificar',
-                    'poblacion': animal.poblacion or 'Sin especificar',
-                    'categoria': categoria,
-                    'descripcion': animal.descripcion[:100] + '...' if len(animal.descripcion or '') > 100 else animal.descripcion,
-                    'imagen_url': animal.imagen.url if animal.imagen else None,
-                    'asociacion_nombre': animal.asociacion.nombre
-                })
-
-            # Guardar diccionarios en caché (más seguro que objetos ORM)
-            cache.set(cache_key, animales_list, timeout=300)
-        
-        # Preparar datos para JavaScript
-        datos_filtros = {
-            'animales': animales_list,
-            'total_animales': len(animales_list)
-        }
-        
-        # Convertir a JSON para el template
-        datos_filtros_json = json.dumps(datos_filtros, ensure_ascii=False)
-        
-        context = {
-            'datos_filtros': datos_filtros_json,
-            'total_animales': len(animales_list),
-            'page_title': 'Buscador Avanzado - Adopta'
-        }
-        
-        return render(request, 'buscador_avanzado.html', context)
-        
+        # La página arranca con la categoría "otros" seleccionada
+        busqueda_inicial = buscar({'categoria': 'otros'})
     except Exception as e:
-        # Context de fallback en caso de error
-        context = {
-            'datos_filtros': '{"animales": [], "total_animales": 0}',
-            'total_animales': 0,
-            'page_title': 'Buscador Avanzado - Adopta'
+        print(f"Error al calcular la búsqueda inicial: {e}")
+        busqueda_inicial = {
+            'total': 0, 'pagina': 1, 'por_pagina': 0, 'paginas': 0,
+            'animales': [], 'facetas': {},
         }
-        return render(request, 'buscador_avanzado.html', context)
+
+    context = {
+        'busqueda_inicial': busqueda_inicial,
+        'total_animales': busqueda_inicial['total'],
+        'page_title': 'Buscador Avanzado - Adopta'
+    }
+
+    return render(request, 'buscador_avanzado.html', context)
+
+
+@require_GET
+def api_buscador(request):
+    """API JSON del buscador: resultados paginados y contadores por faceta"""
+    filtros = limpiar_filtros_busqueda(request.GET)
+
+    try:
+        pagina = int(request.GET.get('pagina', 1))
+        por_pagina = int(request.GET.get('por_pagina', POR_PAGINA_BUSQUEDA))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Parámetros de paginación no válidos'}, status=400)
+
+    return JsonResponse({'success': True, **buscar(filtros, pagina=pagina, por_pagina=por_pagina)})
 
 
 def resultados_busqueda(request):
-    """Resultados de búsqueda actualizados que filtran asociaciones eliminadas"""
-    raza = request.GET.get('raza', '')
-    ubicacion = request.GET.get('ubicacion', '')
-    color = request.GET.get('color', '')
-    tipo = request.GET.get('tipo', '')
-    
+    """
+    Resultados de búsqueda con el índice de texto (sin tildes ni mayúsculas).
+
+    Acepta texto libre (q) y los filtros del buscador avanzado; los
+    resultados se ordenan por relevancia y se paginan.
+    """
+    q = request.GET.get('q', '').strip()
+    raza = request.GET.get('raza', '').strip()
+    ubicacion = request.GET.get('ubicacion', '').strip()
+    color = request.GET.get('color', '').strip()
+    tipo = request.GET.get('tipo', '').strip()
+    tipo_animal = request.GET.get('tipo_animal', '').strip()
+
     # Solo animales de asociaciones activas y suspendidas
-    animales = CreacionAnimales.objects.filter(
-        asociacion__estado__in=['activa', 'suspendida']
-    ).select_related('asociacion')
-    
-    # Aplicar filtros
-    if raza:
-        animales = animales.filter(raza__icontains=raza)
-    if ubicacion:
-        animales = animales.filter(provincia__icontains=ubicacion)
-    if color:
-        animales = animales.filter(color__icontains=color)
-    if tipo:
-        animales = animales.filter(tipo_de_animal__icontains=tipo)
-    
-    total_resultados = animales.count()
-    
+    animales = CreacionAnimales.objects.filter(visible=True)
+
+    # "Otros" es todo lo que no es perro ni gato: no se puede buscar por token
+    campos = {'raza': raza, 'ubicacion': ubicacion, 'color': color, 'tipo': tipo_animal}
+    if tipo.lower() == 'otros':
+        animales = aplicar_filtros(animales, {'categoria': 'otros'})
+    elif tipo:
+        campos['tipo'] = f"{tipo} {tipo_animal}"
+
+    terminos = construir_terminos(q, campos)
+    if terminos:
+        resultados = buscar_coincidencias(terminos, animales)
+    else:
+        resultados = animales.order_by('-fecha_creacion', '-id').values('id')
+
+    pagina = Paginator(resultados, POR_PAGINA_RESULTADOS).get_page(request.GET.get('page'))
+    ids_pagina = [fila.get('animal_id', fila.get('id')) for fila in pagina.object_list]
+    animales_por_id = CreacionAnimales.objects.select_related('asociacion').in_bulk(ids_pagina)
+    animales_pagina = [animales_por_id[animal_id] for animal_id in ids_pagina if animal_id in animales_por_id]
+
+    total_resultados = pagina.paginator.count
+
     # Crear mensaje de búsqueda
     filtros_aplicados = []
+    if q:
+        filtros_aplicados.append(f"texto: {q}")
     if raza:
         filtros_aplicados.append(f"raza: {raza}")
     if ubicacion:
@@ -2324,21 +2286,32 @@ def resultados_busqueda(request):
         filtros_aplicados.append(f"color: {color}")
     if tipo:
         filtros_aplicados.append(f"tipo: {tipo}")
-    
+    if tipo_animal:
+        filtros_aplicados.append(f"tipo de animal: {tipo_animal}")
+
     mensaje_busqueda = f"Resultados para: {', '.join(filtros_aplicados)}" if filtros_aplicados else "Todos los animales disponibles"
-    
+
+    # Parámetros actuales sin la página, para los enlaces de paginación
+    parametros = request.GET.copy()
+    parametros.pop('page', None)
+
     context = {
-        'animales': animales,
+        'animales': animales_pagina,
+        'pagina': pagina,
+        'parametros_busqueda': parametros.urlencode(),
         'total_resultados': total_resultados,
         'mensaje_busqueda': mensaje_busqueda,
+        'filtros_aplicados': filtros_aplicados,
         'filtros': {
+            'q': q,
             'raza': raza,
             'ubicacion': ubicacion,
             'color': color,
             'tipo': tipo,
+            'tipo_animal': tipo_animal,
         }
     }
-    
+
     return render(request, 'resultados_busqueda.html', context)
 
 
@@ -2351,31 +2324,80 @@ def acerca(request):
 @admin_login_required
 def panel_administracion(request):
     """Panel de administración moderno para gestionar asociaciones"""
-    
-    # Obtener asociaciones por estado
-    pendientes = RegistroAsociacion.objects.filter(estado='pendiente').order_by('-fecha_registro')
-    activas = RegistroAsociacion.objects.filter(estado='activa').order_by('-fecha_aprobacion')
-    suspendidas = RegistroAsociacion.objects.filter(estado='suspendida').order_by('-fecha_modificacion_estado')
-    rechazadas = RegistroAsociacion.objects.filter(estado='rechazada').order_by('-fecha_rechazo')
-    
-    # Preparar datos para el template
+
+    # Contadores de un solo GROUP BY (cacheado) y primera página de cada lista;
+    # el resto de páginas se piden a api_asociaciones_admin
+    contadores = contar_por_estado()
+
     context = {
-        'pendientes': pendientes,
-        'activas': activas,
-        'suspendidas': suspendidas,
-        'rechazadas': rechazadas,
+        'pendientes': listar_asociaciones('pendiente'),
+        'activas': listar_asociaciones('activa'),
+        'suspendidas': listar_asociaciones('suspendida'),
+        'rechazadas': listar_asociaciones('rechazada'),
         'stats': {
-            'pendientes_count': pendientes.count(),
-            'activas_count': activas.count(),
-            'suspendidas_count': suspendidas.count(),
-            'rechazadas_count': rechazadas.count(),
-            'total_count': pendientes.count() + activas.count() + suspendidas.count() + rechazadas.count(),
-        }
+            'pendientes_count': contadores['pendiente'],
+            'activas_count': contadores['activa'],
+            'suspendidas_count': contadores['suspendida'],
+            'rechazadas_count': contadores['rechazada'],
+            'total_count': sum(contadores[estado] for estado in ORDEN_POR_ESTADO),
+        },
+        'actividad': obtener_actividad_reciente(),
     }
     
     return render(request, 'admin_panel.html', context)
 
 
+@require_GET
+@admin_login_required
+def api_asociaciones_admin(request):
+    """API JSON del panel: filas HTML de la página pedida de una lista de asociaciones"""
+    estado = request.GET.get('estado')
+    if estado not in ORDEN_POR_ESTADO:
+        return JsonResponse({'success': False, 'error': 'Estado no válido'}, status=400)
+
+    try:
+        pagina = int(request.GET.get('pagina', 1))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Parámetro pagina no válido'}, status=400)
+
+    resultado = listar_asociaciones(estado, pagina)
+    html = render_to_string('admin_panel_filas.html', {
+        'asociaciones': resultado['asociaciones'],
+        'estado': estado,
+    }, request=request)
+
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'pagina': resultado['pagina'],
+        'tiene_siguiente': resultado['tiene_siguiente'],
+    })
+
+
+# Días que muestra el resumen de actividad del panel
+DIAS_ACTIVIDAD_PANEL = 30
+
+
+def obtener_actividad_reciente(dias=DIAS_ACTIVIDAD_PANEL):
+    """Actividad de los últimos días leída de la tabla de estadísticas diarias"""
+    hasta = estadisticas.ultima_fecha_calculada()
+    if hasta is None:
+        return None
+    desde = hasta - timedelta(days=dias - 1)
+    serie = estadisticas.serie_diaria(desde, hasta)
+    maximo = max((dia['nuevos_animales'] for dia in serie), default=0) or 1
+    for dia in serie:
+        dia['porcentaje'] = round(dia['nuevos_animales'] * 100 / maximo)
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'totales': estadisticas.resumen(desde, hasta),
+        'serie': serie,
+        'provincias': estadisticas.ranking('provincia', desde, hasta, limite=5),
+        'tipos': estadisticas.ranking('tipo_de_animal', desde, hasta, limite=5),
+    }
+
+
 # ==================== VISTAS SEO ====================
 
 def robots_txt(request):
@@ -2385,17 +2407,32 @@ def robots_txt(request):
     }, content_type='text/plain')
 
 
+def _base_url(request):
+    return f"{request.scheme}://{request.get_host()}"
+
+
+def _sitemap_etag(request, parte=0):
+    return sitemap.calcular_etag(_base_url(request), parte)
+
+
+def _sitemap_last_modified(request, parte=0):
+    return sitemap.obtener_resumen()['fecha']
+
+
+@condition(etag_func=_sitemap_etag, last_modified_func=_sitemap_last_modified)
 def sitemap_xml(request):
-    """Vista para generar el sitemap.xml dinámicamente"""
-    # Solo incluir animales de asociaciones activas que no estén adoptados
-    animales = CreacionAnimales.objects.filter(
-        asociacion__estado='activa',
-        adoptado=False
-    ).select_related('asociacion')
+    """Índice de sitemaps: enlaza las partes de URLS_POR_SITEMAP URLs"""
+    return HttpResponse(sitemap.generar_indice(_base_url(request)), content_type='application/xml')
 
-    base_url = f"{request.scheme}://{request.get_host()}"
 
-    return render(request, 'sitemap.xml', {
-        'animales': animales,
-        'base_url': base_url
-    }, content_type='application/xml')
\ No newline at end of file
+@condition(etag_func=_sitemap_etag, last_modified_func=_sitemap_last_modified)
+def sitemap_parte_xml(request, parte):
+    """Una parte del sitemap: desde cache o generada en streaming"""
+    if not 1 <= parte <= sitemap.numero_de_partes(sitemap.obtener_resumen()):
+        raise Http404("Parte de sitemap inexistente")
+
+    base_url = _base_url(request)
+    contenido = sitemap.obtener_parte_cacheada(base_url, parte)
+    if contenido is not None:
+        return HttpResponse(contenido, content_type='application/xml')
+    return StreamingHttpResponse(sitemap.generar_parte(base_url, parte), content_type='application/xml')
\ No newline at end of file
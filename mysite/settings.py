@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 from django.core.exceptions import ImproperlyConfigured
 
@@ -69,6 +70,18 @@ CSRF_TRUSTED_ORIGINS = [
     'http://127.0.0.1:8000',
 ]
 
+# Cliente de la API de Telegram (ver myapp/telegram_client.py)
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+# Límites de Telegram: ~30 mensajes/s en total y 1 mensaje/s por chat
+TELEGRAM_MENSAJES_POR_SEGUNDO = int(os.environ.get('TELEGRAM_MENSAJES_POR_SEGUNDO', 30))
+TELEGRAM_INTERVALO_CHAT = float(os.environ.get('TELEGRAM_INTERVALO_CHAT', 1.0))
+# Estados de las conversaciones del bot (ver myapp/estados_conversacion.py)
+TELEGRAM_ESTADOS_BACKEND = os.environ.get(
+    'TELEGRAM_ESTADOS_BACKEND', 'myapp.estados_conversacion.AlmacenEstadosBD'
+)
+# Una conversación sin mensajes durante este tiempo (segundos) se descarta
+TELEGRAM_ESTADOS_TTL = int(os.environ.get('TELEGRAM_ESTADOS_TTL', 3600))
+
 
 # Application definition
 
@@ -97,6 +110,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'myapp.middleware.InvalidacionCacheMiddleware',  # Una sola invalidación de caché por petición
 ]
 
 # Solo activar browser reload en desarrollo local
@@ -202,18 +216,57 @@ LOGIN_REDIRECT_URL = ''
 LOGOUT_REDIRECT_URL = 'login'
 
 # ==================== CONFIGURACIÓN DE CACHÉ ====================
-# Sistema de caché usando la base de datos existente (SQLite/PostgreSQL)
+# Caché en dos niveles (myapp/cache_backends.py):
+# - L1: memoria de cada worker de gunicorn (LRU, TTL corto, sin I/O ni unpickle)
+# - L2: caché compartida entre workers (Redis si REDIS_URL está definida,
+#   si no ficheros en CACHE_DIR); ya no compite con la base de datos
 # Se invalida automáticamente cuando se crean/editan/eliminan animales
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
-        'LOCATION': 'app_cache_table',  # Nombre de la tabla de caché
+# (incrementando la generación de myapp/cache_animales.py, no clave a clave)
+# Con varios contenedores (web + workers de docker-compose.yml) la L2 tiene
+# que ser la misma para todos: Redis (el servicio redis de docker-compose) o
+# un CACHE_DIR en un volumen montado en todos ellos. La carpeta temporal por
+# defecto solo sirve para un único contenedor o para desarrollo.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHE_COMPARTIDA = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'TIMEOUT': 300,
+    }
+else:
+    CACHE_COMPARTIDA = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'animales_cache')),
         'TIMEOUT': 300,  # 5 minutos por defecto
         'OPTIONS': {
             'MAX_ENTRIES': 1000,  # Máximo 1000 entradas en caché
             'CULL_FREQUENCY': 3,  # Eliminar 1/3 de las entradas cuando se alcance MAX_ENTRIES
         }
     }
+    if not DEBUG and not os.environ.get('CACHE_DIR'):
+        import warnings
+        warnings.warn(
+            "Caché compartida en una carpeta temporal local. Si hay varios contenedores "
+            "define REDIS_URL (o un CACHE_DIR compartido) para que las invalidaciones se vean en todos.",
+            RuntimeWarning
+        )
+
+CACHES = {
+    'default': {
+        'BACKEND': 'myapp.cache_backends.CacheDosNiveles',
+        'LOCATION': 'animales-l1',
+        'TIMEOUT': 300,  # 5 minutos por defecto
+        'OPTIONS': {
+            'L2': 'compartida',
+            'L1_MAX_ENTRIES': 500,  # Entradas en memoria por worker
+            'L1_TIMEOUT': 30,  # Segundos máximos en memoria antes de volver a L2
+            # El contador de generación siempre se lee de L2 para que una
+            # invalidación en un worker se vea al instante en los demás
+            'L1_EXCLUIR': ['animales_generacion'],
+        }
+    },
+    'compartida': CACHE_COMPARTIDA,
 }
 
 # Configuración segura de email (Gmail)
@@ -257,6 +310,37 @@ CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME', 'dfg7cdvlo')
 CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY', '884186126363959')
 CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET', 'FtUCkSSA5bBBQn6ms229maPwE4E')
 
+# Backblaze B2 (API S3), alternativa a Cloudinary
+BACKBLAZE_ENDPOINT = os.environ.get('BACKBLAZE_ENDPOINT', 's3.eu-central-003.backblazeb2.com')
+BACKBLAZE_REGION = os.environ.get('BACKBLAZE_REGION', 'eu-central-003')
+BACKBLAZE_BUCKET_NAME = os.environ.get('BACKBLAZE_BUCKET_NAME', 'asociacionanimales')
+BACKBLAZE_KEY_ID = os.environ.get('BACKBLAZE_KEY_ID', '')
+BACKBLAZE_APPLICATION_KEY = os.environ.get('BACKBLAZE_APPLICATION_KEY', '')
+
+# Dónde se guardan las imágenes y videos de los animales (ver myapp/media_storage.py):
+# myapp.cloudinary_storage.CloudinaryStorage, myapp.backblaze_storage.BackblazeStorage
+# o myapp.media_storage.LocalMediaStorage (MEDIA_ROOT, sin red)
+MEDIA_STORAGE_BACKEND = os.environ.get('MEDIA_STORAGE_BACKEND', 'myapp.cloudinary_storage.CloudinaryStorage')
+
+# Subida de imágenes/videos de animales en segundo plano (ver myapp/subida_medios.py)
+# Número máximo de subidas simultáneas a Cloudinary por proceso
+MEDIA_UPLOAD_WORKERS = int(os.environ.get('MEDIA_UPLOAD_WORKERS', 4))
+# False = subir dentro de la petición (útil en tests o para depurar)
+MEDIA_UPLOAD_BACKGROUND = os.environ.get('MEDIA_UPLOAD_BACKGROUND', 'True') == 'True'
+# True = el navegador sube los archivos directamente a Cloudinary con una firma
+# del servidor y los workers no reciben los bytes (ver myapp/subida_directa.py).
+# Solo con MEDIA_STORAGE_BACKEND de Cloudinary (lo comprueba myapp/checks.py)
+MEDIA_SUBIDA_DIRECTA = os.environ.get('MEDIA_SUBIDA_DIRECTA', 'False') == 'True'
+
+# Derivados WebP de las fotos antes de subirlas (ver myapp/imagenes.py)
+# Lado mayor de la imagen que se sube (px)
+IMAGEN_LADO_MAXIMO = int(os.environ.get('IMAGEN_LADO_MAXIMO', 1600))
+# Lado de la miniatura cuadrada de las tarjetas (px)
+IMAGEN_LADO_MINIATURA = int(os.environ.get('IMAGEN_LADO_MINIATURA', 480))
+IMAGEN_CALIDAD_WEBP = int(os.environ.get('IMAGEN_CALIDAD_WEBP', 80))
+# Fotos con más píxeles se rechazan antes de decodificarlas
+IMAGEN_MAX_PIXELES = int(os.environ.get('IMAGEN_MAX_PIXELES', 40_000_000))
+
 CSRF_TRUSTED_ORIGINS = [
     'https://*.ngrok-free.app',
 ]
@@ -335,11 +419,41 @@ LOGGING = {
             'level': 'DEBUG' if DEBUG else 'INFO',
             'propagate': False,
         },
+        'myapp.telegram_client': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         'myapp.signals': {
             'handlers': ['console', 'cache_file'],
             'level': 'INFO',
             'propagate': False,
         },
+        'myapp.cache_animales': {
+            'handlers': ['console', 'cache_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'myapp.subida_medios': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'myapp.media_storage': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'myapp.medios_huerfanos': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'myapp.subida_directa': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         'django.request': {
             'handlers': ['console', 'file'],
             'level': 'DEBUG' if DEBUG else 'INFO',
@@ -9,6 +9,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 django.setup()
 
 from myapp.cloudinary_storage import cloudinary_storage
+from PIL import Image
 import io
 
 def test_cloudinary_connection():
@@ -18,15 +19,16 @@ def test_cloudinary_connection():
     print("API Key: 884186126363959\n")
 
     try:
-        # Crear un archivo de prueba
+        # Crear una imagen de prueba (1x1 px)
         print("Subiendo imagen de prueba...")
-        test_content = b"Test image from Django - Asociaciones de Animales"
-        test_file = io.BytesIO(test_content)
-        test_file.name = "test.txt"
-        test_file.content_type = "text/plain"
+        test_file = io.BytesIO()
+        Image.new('RGB', (1, 1), 'white').save(test_file, 'PNG')
+        test_file.seek(0)
+        test_file.name = "test.png"
 
-        # Subir archivo de prueba como raw (no es una imagen real)
-        url = cloudinary_storage.upload_file(test_file, folder='animales/fotos', resource_type='raw')
+        # Subir la imagen de prueba a animales/fotos
+        archivo = cloudinary_storage.subir(test_file, 'fotos')
+        url = archivo.url if archivo else None
 
         if url:
             print("OK - Archivo subido exitosamente a Cloudinary!")